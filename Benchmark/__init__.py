@@ -0,0 +1,4 @@
+"""
+离线基准测试
+使用本地模拟的OpenAI兼容服务代替真实大模型，测量 /generate/ppt、/generate/word 的吞吐和延迟
+"""
@@ -0,0 +1,72 @@
+"""
+基准测试脚本共用的工具函数：分位数、结果保存和版本信息
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(ROOT_DIR, "Data", "benchmarks")
+
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    """最近秩法分位数（q 取 0~100）"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def percent_change(new: Optional[float], old: Optional[float]) -> Optional[float]:
+    """相对变化百分比，缺少数据时返回None"""
+    if new is None or not old:
+        return None
+    return 100 * (new - old) / old
+
+
+def format_number(value: Optional[float], digits: int = 3) -> str:
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def default_output_path(prefix: str) -> str:
+    """默认结果路径 Data/benchmarks/<prefix>-<时间>.json"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    return os.path.join(RESULTS_DIR, f"{prefix}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+
+def write_report(path: str, args: Dict[str, Any], scenarios: List[Dict[str, Any]]):
+    """保存结果JSON，附带运行环境信息"""
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y%m%d-%H%M%S"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": args,
+        },
+        "scenarios": scenarios,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def load_scenarios(path: str) -> Dict[str, Dict[str, Any]]:
+    """读取之前保存的结果，按场景名索引"""
+    with open(path, "r", encoding="utf-8") as f:
+        return {item["name"]: item for item in json.load(f)["scenarios"]}
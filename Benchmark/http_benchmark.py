@@ -0,0 +1,432 @@
+"""
+HTTP基准测试：在本地模拟大模型的情况下测量 /generate/ppt、/generate/word 的吞吐和延迟
+
+每个场景（PPT的 模板×页数 组合，或Word的题目数量）都会启动一个新的服务进程，
+以指定并发发送请求，记录：
+- 每秒请求数、延迟分位数（p50/p90/p95/p99）、失败数
+- 服务进程的CPU时间和峰值内存（RSS）
+- 服务 /metrics 中各阶段耗时的近期分位数，以及提示词命中前缀缓存的比例
+
+结果保存为JSON，可用 --compare 与之前的结果对比。
+
+用法:
+    python Benchmark/http_benchmark.py --designs 1,5 --slides 4,16 --questions 5,50 \\
+        --requests 40 --concurrency 8 --latency 1.0
+    python Benchmark/http_benchmark.py --kinds ppt --compare Data/benchmarks/http-20250101-120000.json
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Benchmark.common import (
+    BENCHMARK_DIR,
+    ROOT_DIR,
+    default_output_path,
+    format_number,
+    load_scenarios,
+    percent_change,
+    percentile,
+    write_report,
+)
+
+_HAS_PSUTIL = importlib.util.find_spec("psutil") is not None
+_QUANTILE_LINE = re.compile(
+    r'^\w+_stage_duration_seconds_recent\{pipeline="(\w+)",stage="(\w+)",quantile="([\d.]+)"\} (\S+)$'
+)
+_PROMPT_TOKENS_LINE = re.compile(r"^\w+_llm_(prompt|cached_prompt)_tokens_total\{[^}]*\} (\S+)$")
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"进程启动失败（退出码 {process.returncode}），请查看日志")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"等待 {url} 就绪超时")
+
+
+def _stop(process: subprocess.Popen):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def summarize_latencies(latencies: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(latencies)
+    if not values:
+        return {}
+    return {
+        "min": values[0],
+        "mean": sum(values) / len(values),
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": values[-1],
+    }
+
+
+class ProcessSampler:
+    """
+    后台采样服务进程的CPU时间和内存
+
+    优先使用psutil（可选依赖）；没有psutil时在Linux上读取 /proc，其他平台返回None。
+    """
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._process = None
+        if _HAS_PSUTIL:
+            import psutil
+
+            self._process = psutil.Process(pid)
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self._process is not None:
+            times = self._process.cpu_times()
+            return times.user + times.system
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            # utime、stime 为第14、15个字段（去掉pid和comm后的下标11、12）
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+    def rss(self) -> Optional[int]:
+        if self._process is not None:
+            return self._process.memory_info().rss
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                rss = self.rss()
+            except Exception:
+                return
+            if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+                self.peak_rss = rss
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def parse_stage_quantiles(metrics_text: str) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """从 /metrics 中提取各阶段耗时的近期分位数：{pipeline: {stage: {"p50": 秒, ...}}}"""
+    stages: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for line in metrics_text.splitlines():
+        match = _QUANTILE_LINE.match(line)
+        if match:
+            pipeline, stage, quantile, value = match.groups()
+            key = f"p{int(round(float(quantile) * 100))}"
+            stages.setdefault(pipeline, {}).setdefault(stage, {})[key] = float(value)
+    return stages
+
+
+def parse_prompt_cache_ratio(metrics_text: str) -> Optional[float]:
+    """从 /metrics 中计算提示词token命中前缀缓存的比例（各后端合计），没有用量数据时返回None"""
+    totals = {"prompt": 0.0, "cached_prompt": 0.0}
+    for line in metrics_text.splitlines():
+        match = _PROMPT_TOKENS_LINE.match(line)
+        if match:
+            totals[match.group(1)] += float(match.group(2))
+    return totals["cached_prompt"] / totals["prompt"] if totals["prompt"] else None
+
+
+def build_payloads(scenario: Dict[str, Any], count: int, user_id: str, args) -> List[Dict[str, Any]]:
+    """每个请求的内容都不同，避免请求合并和缓存命中"""
+    payloads = []
+    for i in range(count):
+        if scenario["kind"] == "ppt":
+            payloads.append(
+                {
+                    "userId": user_id,
+                    "content": f"基準測試主題 #{scenario['name']}-{i}",
+                    "expected_slides": scenario["slides"],
+                    "design_number": scenario["design"],
+                    "custom_filename": f"bench_{i}",
+                    "generation_mode": args.generation_mode,
+                    "return_file": args.return_file,
+                    "persist": not args.return_file,
+                }
+            )
+        else:
+            payloads.append(
+                {
+                    "userId": user_id,
+                    "learning_content": f"基準測試學習內容 #{scenario['name']}-{i}",
+                    "user_requirements": f"[bench:questions={scenario['questions']}]",
+                    "custom_filename": f"bench_{i}",
+                    "generation_mode": args.word_generation_mode,
+                    "return_file": args.return_file,
+                    "persist": not args.return_file,
+                }
+            )
+    return payloads
+
+
+async def drive_load(
+    base_url: str, endpoint: str, payloads: List[Dict[str, Any]], concurrency: int, timeout: float
+) -> Dict[str, Any]:
+    """以固定并发发送全部请求，返回耗时、成功数和错误样例"""
+    queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+    latencies: List[float] = []
+    errors: List[str] = []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+
+        async def _worker():
+            while True:
+                try:
+                    payload = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                try:
+                    response = await client.post(endpoint, json=payload)
+                    elapsed = time.perf_counter() - started
+                    if response.status_code == 200:
+                        latencies.append(elapsed)
+                    else:
+                        errors.append(f"HTTP {response.status_code}: {response.text[:200]}")
+                except httpx.HTTPError as e:
+                    errors.append(f"{type(e).__name__}: {e}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return {"wall_seconds": wall, "latencies": latencies, "errors": errors}
+
+
+def run_scenario(scenario: Dict[str, Any], args, llm_base_url: str, log_file) -> Dict[str, Any]:
+    """启动新的服务进程并执行一个场景"""
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    command = [
+        sys.executable, os.path.join(BENCHMARK_DIR, "serve_app.py"),
+        "--port", str(port), "--llm-base-url", llm_base_url, "--quiet",
+    ]
+    if args.generation_mode:
+        command += ["--generation-mode", args.generation_mode]
+    if args.word_generation_mode:
+        command += ["--word-generation-mode", args.word_generation_mode]
+    if args.keep_rate_limit:
+        command.append("--keep-rate-limit")
+
+    user_id = f"benchmark-{os.getpid()}-{scenario['name']}"
+    server = subprocess.Popen(command, stdout=log_file, stderr=subprocess.STDOUT, cwd=ROOT_DIR)
+    try:
+        _wait_until_ready(f"{base_url}/metrics", server)
+        endpoint = f"/generate/{scenario['kind']}"
+
+        if args.warmup:
+            warmup = build_payloads({**scenario, "name": scenario["name"] + "-warmup"}, args.warmup, user_id, args)
+            asyncio.run(drive_load(base_url, endpoint, warmup, min(args.concurrency, args.warmup), args.timeout))
+
+        sampler = ProcessSampler(server.pid)
+        cpu_before = sampler.cpu_seconds()
+        sampler.start()
+        result = asyncio.run(
+            drive_load(
+                base_url, endpoint, build_payloads(scenario, args.requests, user_id, args),
+                args.concurrency, args.timeout,
+            )
+        )
+        sampler.stop()
+        cpu_after = sampler.cpu_seconds()
+        metrics_text = httpx.get(f"{base_url}/metrics", timeout=10).text
+        stages = parse_stage_quantiles(metrics_text)
+        prompt_cache_ratio = parse_prompt_cache_ratio(metrics_text)
+    finally:
+        _stop(server)
+        if not args.keep_output:
+            shutil.rmtree(os.path.join(ROOT_DIR, "Output", user_id), ignore_errors=True)
+
+    ok = len(result["latencies"])
+    cpu_seconds = cpu_after - cpu_before if cpu_before is not None and cpu_after is not None else None
+    return {
+        **scenario,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "ok": ok,
+        "errors": len(result["errors"]),
+        "error_samples": result["errors"][:5],
+        "wall_seconds": result["wall_seconds"],
+        "requests_per_second": ok / result["wall_seconds"] if result["wall_seconds"] else None,
+        "latency_seconds": summarize_latencies(result["latencies"]),
+        "server_cpu_seconds": cpu_seconds,
+        "server_cpu_percent": 100 * cpu_seconds / result["wall_seconds"] if cpu_seconds is not None else None,
+        "server_peak_rss_mb": sampler.peak_rss / (1024 * 1024) if sampler.peak_rss else None,
+        "stages": stages.get(scenario["kind"], {}),
+        "prompt_cache_ratio": prompt_cache_ratio,
+    }
+
+
+def build_scenarios(args) -> List[Dict[str, Any]]:
+    scenarios = []
+    if "ppt" in args.kinds:
+        for design in args.designs:
+            for slides in args.slides:
+                scenarios.append(
+                    {"name": f"ppt-d{design}-s{slides}", "kind": "ppt", "design": design, "slides": slides}
+                )
+    if "word" in args.kinds:
+        for questions in args.questions:
+            scenarios.append({"name": f"word-q{questions}", "kind": "word", "questions": questions})
+    return scenarios
+
+
+def _percent(ratio: Optional[float]) -> Optional[float]:
+    return None if ratio is None else 100 * ratio
+
+
+def print_scenario(result: Dict[str, Any]):
+    latency = result["latency_seconds"]
+    print(
+        f"  {result['name']:<18} ok={result['ok']}/{result['requests']} "
+        f"rps={format_number(result['requests_per_second'], 2)} "
+        f"p50={format_number(latency.get('p50'))}s p95={format_number(latency.get('p95'))}s p99={format_number(latency.get('p99'))}s "
+        f"cpu={format_number(result['server_cpu_percent'], 1)}% rss={format_number(result['server_peak_rss_mb'], 1)}MB "
+        f"prefix_cache={format_number(_percent(result.get('prompt_cache_ratio')), 1)}%"
+    )
+    for sample in result["error_samples"]:
+        print(f"    ❌ {sample}")
+
+
+def print_comparison(results: List[Dict[str, Any]], baseline_path: str):
+    """按场景名与基准结果对比吞吐和p95延迟"""
+    baseline = load_scenarios(baseline_path)
+
+    def _change(new, old) -> str:
+        change = percent_change(new, old)
+        return "-" if change is None else f"{change:+.1f}%"
+
+    print(f"\n📊 与 {baseline_path} 对比:")
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None:
+            print(f"  {result['name']:<18} （基准中没有该场景）")
+            continue
+        print(
+            f"  {result['name']:<18} rps {format_number(old['requests_per_second'], 2)} → "
+            f"{format_number(result['requests_per_second'], 2)} ({_change(result['requests_per_second'], old['requests_per_second'])})  "
+            f"p95 {format_number(old['latency_seconds'].get('p95'))}s → {format_number(result['latency_seconds'].get('p95'))}s "
+            f"({_change(result['latency_seconds'].get('p95'), old['latency_seconds'].get('p95'))})"
+        )
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(item) for item in text.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="PPT/Word生成接口的离线HTTP基准测试")
+    parser.add_argument("--kinds", default="ppt,word", help="测试的接口，逗号分隔: ppt,word")
+    parser.add_argument("--designs", type=_int_list, default=[1], help="PPT模板编号，逗号分隔")
+    parser.add_argument("--slides", type=_int_list, default=[4, 16], help="PPT页数，逗号分隔")
+    parser.add_argument("--questions", type=_int_list, default=[5, 50], help="Word选择题数量，逗号分隔")
+    parser.add_argument("--requests", type=int, default=40, help="每个场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=8, help="并发请求数")
+    parser.add_argument("--warmup", type=int, default=2, help="每个场景正式计时前的预热请求数")
+    parser.add_argument("--generation-mode", choices=("single", "stream", "outline"), default=None, help="PPT生成模式")
+    parser.add_argument("--word-generation-mode", choices=("single", "parallel"), default=None, help="Word生成模式")
+    parser.add_argument("--return-file", action="store_true", help="使用 return_file=true 直接返回文件")
+    parser.add_argument("--keep-rate-limit", action="store_true", help="保留服务的RPM/TPM限流配置")
+    parser.add_argument("--timeout", type=float, default=300.0, help="单个请求超时（秒）")
+    parser.add_argument("--latency", type=float, default=1.0, help="模拟大模型的响应耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.1, help="模拟耗时的随机波动比例")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="模拟流式首个片段的等待时间（秒）")
+    parser.add_argument("--output", default=None, help="结果JSON路径，默认 Data/benchmarks/http-<时间>.json")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果JSON对比")
+    parser.add_argument("--keep-output", action="store_true", help="保留生成的文件（默认测试结束后删除）")
+    args = parser.parse_args(argv)
+    args.kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = build_scenarios(args)
+    if not scenarios:
+        print("没有需要执行的场景")
+        return
+
+    output_path = args.output or default_output_path("http")
+    log_path = os.path.splitext(output_path)[0] + ".log"
+
+    mock_port = _free_port()
+    mock_command = [
+        sys.executable, os.path.join(BENCHMARK_DIR, "mock_openai_server.py"),
+        "--port", str(mock_port), "--latency", str(args.latency), "--jitter", str(args.jitter),
+        "--first-token-latency", str(args.first_token_latency),
+    ]
+    results = []
+    with open(log_path, "w", encoding="utf-8") as log_file:
+        mock = subprocess.Popen(mock_command, stdout=log_file, stderr=subprocess.STDOUT)
+        try:
+            _wait_until_ready(f"http://127.0.0.1:{mock_port}/health", mock)
+            print(f"🚀 共 {len(scenarios)} 个场景，每个 {args.requests} 个请求，并发 {args.concurrency}，模拟耗时 {args.latency}s")
+            for scenario in scenarios:
+                result = run_scenario(scenario, args, f"http://127.0.0.1:{mock_port}/v1", log_file)
+                results.append(result)
+                print_scenario(result)
+        finally:
+            _stop(mock)
+
+    write_report(
+        output_path, {k: v for k, v in vars(args).items() if k not in ("output", "compare")}, results
+    )
+    print(f"✅ 结果已保存: {output_path}（服务日志: {log_path}）")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
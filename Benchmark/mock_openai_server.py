@@ -0,0 +1,241 @@
+"""
+模拟的OpenAI兼容服务（仅用于基准测试）
+
+实现 POST /v1/chat/completions（流式与非流式），根据提示词判断是PPT还是Word请求，
+返回符合 PPT_Prompt.py / Word_Prompt.py 中JSON格式的固定内容：
+- PPT页数取自提示词中的“期望嘅幻燈片數量”；outline模式的章节请求按“本次需要生成嘅幻燈片”返回对应页数
+- Word选择题数量取自用户要求中的 [bench:questions=N] 标记（默认5题）
+- 长内容的分块摘要请求返回纯文本摘要（长度约为原块的十分之一）
+
+响应延迟可配置：非流式请求等待 latency 秒后一次性返回；流式请求等待 first_token_latency 秒后
+在剩余时间内均匀地分段发送。
+
+模拟服务商的前缀缓存：系统消息与之前的请求相同时，usage.prompt_tokens_details.cached_tokens
+报告系统消息的token数；流式请求带 stream_options.include_usage 时在最后一个片段返回 usage。
+
+用法:
+    python Benchmark/mock_openai_server.py --port 18080 --latency 2.0 --jitter 0.2
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+_SLIDES_PATTERN = re.compile(r"期望嘅幻燈片數量：(\d+)頁")
+_QUESTIONS_PATTERN = re.compile(r"\[bench:questions=(\d+)\]")
+_SECTION_PATTERN = re.compile(r"本次需要生成嘅幻燈片：(\d+)頁")
+_DIGEST_MARKER = "長篇教學資料嘅其中一部分"
+
+# 与PPT提示词中的三种内容类型对应，轮流使用
+_PPT_CONTENT_TYPES = ("bullet_list", "paragraph", "title_paragraph")
+
+
+def _content_slide(i: int) -> Dict[str, Any]:
+    content_type = _PPT_CONTENT_TYPES[(i - 1) % len(_PPT_CONTENT_TYPES)]
+    if content_type == "bullet_list":
+        content: Any = [f"第{i}部分要點{j}：說明文字用於填充版面。" for j in range(1, 5)]
+    elif content_type == "paragraph":
+        content = "呢係一段完整嘅文字描述，用於模擬模型輸出嘅段落內容。" * 3
+    else:
+        content = {"subtitle": f"小標題{i}", "text": "呢係小標題下嘅詳細說明文字。" * 2}
+    return {
+        "type": "content",
+        "title": f"第{i}部分標題",
+        "content_type": content_type,
+        "content": content,
+        "has_image": i % 2 == 0,
+    }
+
+
+def build_ppt_content(expected_slides: int) -> Dict[str, Any]:
+    """生成一份PPT JSON：1页标题页 + (expected_slides - 1) 页内容页"""
+    slides: List[Dict[str, Any]] = [
+        {"type": "title", "title": "基準測試演示文稿", "subtitle": "模擬生成嘅內容"}
+    ]
+    slides += [_content_slide(i) for i in range(1, max(1, expected_slides))]
+    return {"title": "基準測試演示文稿", "filename": "benchmark", "slides": slides}
+
+
+def build_ppt_section_content(section_slides: int) -> Dict[str, Any]:
+    """生成outline模式章节请求的JSON：section_slides 页内容页"""
+    return {"slides": [_content_slide(i) for i in range(1, section_slides + 1)]}
+
+
+def build_word_content(questions: int) -> Dict[str, Any]:
+    """生成一份Word JSON，包含 questions 道选择题和 questions // 2 道简答题"""
+    return {
+        "theme": "基準測試工作紙",
+        "topic": "模擬主題",
+        "learning_focus": "學習重點內容",
+        "learning_outcome": "學習成果描述",
+        "teaching_suggestions": [f"教學建議{i}：分組討論並完成練習。" for i in range(1, 5)],
+        "worksheet_title": "基準測試工作表",
+        "quiz_data": [f"學習內容片段{i}：公式 $E = mc^2$ 嘅應用。" for i in range(1, 6)],
+        "answer": "綜合答案或者總結性內容",
+        "summary": "知識點摘要：概念、定義同公式 $E = mc^2$。",
+        "multiple_choice": [
+            {
+                "q": f"選擇題題目{i}",
+                "choices": ["選項A", "選項B", "選項C", "選項D"],
+                "correct": [i % 4],
+            }
+            for i in range(1, questions + 1)
+        ],
+        "short_answer_questions": [
+            {"q": f"簡答題題目{i}", "a": ["答案要點1", "答案要點2", "答案要點3"]}
+            for i in range(1, questions // 2 + 1)
+        ],
+        "filename": "benchmark",
+    }
+
+
+def build_content(messages: List[Dict[str, Any]]) -> str:
+    """根据提示词生成对应的JSON文本"""
+    prompt = "\n".join(str(m.get("content", "")) for m in messages)
+    if _DIGEST_MARKER in prompt:
+        return "- 知識點摘要：" + "重點內容。" * max(1, len(prompt) // 50)
+    section_match = _SECTION_PATTERN.search(prompt)
+    slides_match = _SLIDES_PATTERN.search(prompt)
+    if section_match:
+        data = build_ppt_section_content(int(section_match.group(1)))
+    elif slides_match:
+        data = build_ppt_content(int(slides_match.group(1)))
+    else:
+        questions_match = _QUESTIONS_PATTERN.search(prompt)
+        data = build_word_content(int(questions_match.group(1)) if questions_match else 5)
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _usage(messages: List[Dict[str, Any]], content: str, cached_tokens: int = 0) -> Dict[str, Any]:
+    prompt_tokens = int(sum(len(str(m.get("content", ""))) for m in messages) / 1.5)
+    completion_tokens = int(len(content) / 1.5)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": min(cached_tokens, prompt_tokens)},
+    }
+
+
+def create_app(
+    latency: float = 1.0,
+    jitter: float = 0.0,
+    first_token_latency: float = 0.3,
+    chunk_chars: int = 40,
+) -> FastAPI:
+    """
+    创建模拟服务
+
+    Args:
+        latency (float): 每个请求的总耗时（秒）
+        jitter (float): 耗时的随机波动比例，如0.2表示在 ±20% 内均匀分布
+        first_token_latency (float): 流式请求发送首个片段前的等待时间（秒），不超过总耗时
+        chunk_chars (int): 流式请求每个片段的字符数
+    """
+    app = FastAPI()
+    stats = {"requests": 0, "stream_requests": 0}
+    seen_prefixes = set()
+
+    def _cached_tokens(messages: List[Dict[str, Any]]) -> int:
+        """系统消息之前出现过时视为命中前缀缓存"""
+        if not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = str(messages[0].get("content", ""))
+        if prefix in seen_prefixes:
+            return int(len(prefix) / 1.5)
+        seen_prefixes.add(prefix)
+        return 0
+
+    def _total_latency() -> float:
+        return max(0.0, latency * (1 + random.uniform(-jitter, jitter)))
+
+    @app.get("/health")
+    async def health():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        content = build_content(messages)
+        usage = _usage(messages, content, _cached_tokens(messages))
+        model = body.get("model", "mock")
+        created = int(time.time())
+        total_latency = _total_latency()
+        stats["requests"] += 1
+
+        if not body.get("stream"):
+            await asyncio.sleep(total_latency)
+            return {
+                "id": f"mock-{stats['requests']}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+
+        stats["stream_requests"] += 1
+        pieces = [content[i:i + chunk_chars] for i in range(0, len(content), chunk_chars)]
+        first_delay = min(first_token_latency, total_latency)
+        interval = (total_latency - first_delay) / max(1, len(pieces) - 1)
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def _chunk(delta: Dict[str, Any], finish_reason=None, final_usage=None) -> str:
+            chunk = {
+                "id": f"mock-{stats['requests']}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [] if final_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            if final_usage:
+                chunk["usage"] = final_usage
+            return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+        async def _events():
+            await asyncio.sleep(first_delay)
+            for i, piece in enumerate(pieces):
+                if i:
+                    await asyncio.sleep(interval)
+                yield _chunk({"content": piece})
+            yield _chunk({}, "stop")
+            if include_usage:
+                yield _chunk({}, final_usage=usage)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟的OpenAI兼容服务（基准测试用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=1.0, help="每个请求的总耗时（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="耗时随机波动比例")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="流式首个片段的等待时间（秒）")
+    parser.add_argument("--chunk-chars", type=int, default=40, help="流式每个片段的字符数")
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.jitter, args.first_token_latency, args.chunk_chars)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
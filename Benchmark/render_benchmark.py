@@ -0,0 +1,331 @@
+"""
+渲染引擎微基准测试：不经过HTTP和大模型，单独测量 create_presentation / create_word_document
+
+- PPT：全部设计模板 × 不同页数，阶段为 template_load（从内存模板创建Presentation）、
+  slide_add（Slides.add_slide）、text_fill（选择布局并填充标题、正文和目录，不含add_slide）、save
+- Word：不同选择题数量，阶段为 template_load（含docxtpl在render开始时才进行的docx解析）、
+  render（jinja填充，不含docx解析）、save
+
+每个场景先预热一次，再重复 --repeat 次取各阶段耗时的中位数；另外在 tracemalloc 下单独运行一次，
+记录各阶段的净增内存和峰值内存（tracemalloc会显著拖慢运行，因此不与计时混在一起）。
+结果保存为JSON，--compare 对比之前的结果，总耗时变慢超过 --threshold 时标记为回退。
+
+用法:
+    python Benchmark/render_benchmark.py
+    python Benchmark/render_benchmark.py --designs 1,2 --slides 4,50 --questions 5,500 --repeat 3
+    python Benchmark/render_benchmark.py --compare Data/benchmarks/render-20250101-120000.json --fail-on-regression
+"""
+import argparse
+import contextlib
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Benchmark.common import (
+    default_output_path,
+    format_number,
+    load_scenarios,
+    percent_change,
+    write_report,
+)
+from Benchmark.mock_openai_server import build_ppt_content, build_word_content
+from docxtpl import DocxTemplate
+from pptx.presentation import Presentation as PresentationObject
+from pptx.slide import Slides
+
+from FileRequestServer.config import LOGGING_CONFIG, PPT_CONFIG
+from FileRequestServer.template_registry import template_registry
+from PPTGenProject import PPT_Gen_functions
+from WordGenProject import Word_Gen_functions
+
+_MISSING = object()
+
+PPT_STAGES = ("template_load", "slide_add", "text_fill", "save")
+WORD_STAGES = ("template_load", "render", "save")
+
+
+class _Frame:
+    """一个进行中的阶段调用"""
+
+    __slots__ = ("before", "max_peak", "child_seconds", "child_bytes")
+
+    def __init__(self, before: int):
+        self.before = before
+        self.max_peak = before
+        self.child_seconds = 0.0
+        self.child_bytes = 0
+
+
+class StageProbe:
+    """
+    临时替换渲染过程中的关键函数，累计每个阶段的耗时，开启 tracemalloc 时同时记录内存
+
+    阶段可以嵌套（如 slide_add 发生在 text_fill 的函数内部），每个阶段只计入独占的耗时和净增内存；
+    峰值内存为单次调用期间（含子阶段）相对调用开始时的最大增量，多次调用时取最大值。
+    """
+
+    def __init__(self, track_memory: bool = False):
+        self.track_memory = track_memory
+        self.seconds: Dict[str, float] = {}
+        self.net_bytes: Dict[str, int] = {}
+        self.peak_bytes: Dict[str, int] = {}
+        self._patches: List[tuple] = []
+        self._frames: List[_Frame] = []
+
+    def _capture_peak(self) -> int:
+        """读取并重置 tracemalloc 的峰值，同时计入所有进行中的阶段"""
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        for frame in self._frames:
+            frame.max_peak = max(frame.max_peak, peak)
+        return peak
+
+    def _record(self, stage: str, func: Callable, *args, **kwargs):
+        before = 0
+        if self.track_memory:
+            self._capture_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        frame = _Frame(before)
+        self._frames.append(frame)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            allocated = 0
+            if self.track_memory:
+                self._capture_peak()
+                allocated = tracemalloc.get_traced_memory()[0] - before
+            self._frames.pop()
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed - frame.child_seconds
+            self.net_bytes[stage] = self.net_bytes.get(stage, 0) + allocated - frame.child_bytes
+            self.peak_bytes[stage] = max(self.peak_bytes.get(stage, 0), frame.max_peak - before)
+            if self._frames:
+                self._frames[-1].child_seconds += elapsed
+                self._frames[-1].child_bytes += allocated
+
+    def patch(self, owner: Any, name: str, stage: str):
+        """替换 owner（模块、类或实例）上的 name，退出时恢复"""
+        original = getattr(owner, name)
+        probe = self
+
+        def _wrapper(*args, **kwargs):
+            return probe._record(stage, original, *args, **kwargs)
+
+        self._patches.append((owner, name, vars(owner).get(name, _MISSING)))
+        setattr(owner, name, _wrapper)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, own_value in reversed(self._patches):
+            if own_value is _MISSING:
+                # 原本是类上的方法（如单例实例），删除实例属性即可恢复
+                delattr(owner, name)
+            else:
+                setattr(owner, name, own_value)
+        self._patches.clear()
+
+
+def _run(render: Callable[[], Any], probe: StageProbe) -> Dict[str, Any]:
+    """执行一次渲染；开启内存统计时在 tracemalloc 下运行"""
+    with probe:
+        if probe.track_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            render()
+        finally:
+            total = time.perf_counter() - started
+            if probe.track_memory:
+                total_peak = probe._capture_peak()
+                tracemalloc.stop()
+    result = {"seconds": dict(probe.seconds), "total_seconds": total}
+    if probe.track_memory:
+        result["net_bytes"] = dict(probe.net_bytes)
+        result["stage_peak_bytes"] = dict(probe.peak_bytes)
+        result["peak_bytes"] = max([total_peak, *probe.peak_bytes.values()])
+    return result
+
+
+def _run_ppt(ppt_data: Dict[str, Any], design: int, seed: int, track_memory: bool) -> Dict[str, Any]:
+    random.seed(seed)  # 随机布局可复现
+    probe = StageProbe(track_memory)
+    probe.patch(PPT_Gen_functions, "open_presentation_template", "template_load")
+    for name in ("create_title_slide", "create_content_slide", "create_table_of_contents_slide"):
+        probe.patch(PPT_Gen_functions, name, "text_fill")
+    probe.patch(Slides, "add_slide", "slide_add")
+    probe.patch(PresentationObject, "save", "save")
+    return _run(
+        lambda: PPT_Gen_functions.create_presentation(ppt_data, design, "render_benchmark", in_memory=True),
+        probe,
+    )
+
+
+def _run_word(context: Dict[str, Any], track_memory: bool) -> Dict[str, Any]:
+    probe = StageProbe(track_memory)
+    probe.patch(template_registry, "open_docx_template", "template_load")
+    # docxtpl 在 render 开始时才解析docx
+    probe.patch(DocxTemplate, "init_docx", "template_load")
+    probe.patch(DocxTemplate, "render", "render")
+    probe.patch(DocxTemplate, "save", "save")
+    return _run(
+        lambda: Word_Gen_functions.create_word_document(context, "render_benchmark", in_memory=True),
+        probe,
+    )
+
+
+def _summarize(runs: List[Dict[str, Any]], memory_run: Dict[str, Any], stages, items: int) -> Dict[str, Any]:
+    totals = [run["total_seconds"] for run in runs]
+    total_median = statistics.median(totals)
+    return {
+        "stages": {
+            stage: {
+                "median_ms": 1000 * statistics.median(run["seconds"].get(stage, 0.0) for run in runs),
+                "net_alloc_kb": memory_run["net_bytes"].get(stage, 0) / 1024,
+                "peak_alloc_kb": memory_run["stage_peak_bytes"].get(stage, 0) / 1024,
+            }
+            for stage in stages
+        },
+        # 各阶段之外的耗时（目录生成、文件名处理、进度上报等）
+        "other_ms": 1000 * statistics.median(
+            run["total_seconds"] - sum(run["seconds"].values()) for run in runs
+        ),
+        "total_ms": {
+            "median": 1000 * total_median,
+            "min": 1000 * min(totals),
+            "max": 1000 * max(totals),
+        },
+        "per_item_ms": 1000 * total_median / max(1, items),
+        "peak_alloc_kb": memory_run["peak_bytes"] / 1024,
+    }
+
+
+def benchmark_ppt(design: int, slides: int, repeat: int, seed: int) -> Dict[str, Any]:
+    ppt_data = build_ppt_content(slides)
+    _run_ppt(ppt_data, design, seed, False)  # 预热：加载模板文件和布局索引
+    runs = [_run_ppt(ppt_data, design, seed, False) for _ in range(repeat)]
+    memory_run = _run_ppt(ppt_data, design, seed, True)
+    return {
+        "name": f"ppt-d{design}-s{slides}",
+        "kind": "ppt",
+        "design": design,
+        "slides": slides,
+        **_summarize(runs, memory_run, PPT_STAGES, slides),
+    }
+
+
+def benchmark_word(questions: int, repeat: int) -> Dict[str, Any]:
+    context = Word_Gen_functions.prepare_template_context(build_word_content(questions))
+    _run_word(context, False)
+    runs = [_run_word(context, False) for _ in range(repeat)]
+    memory_run = _run_word(context, True)
+    return {
+        "name": f"word-q{questions}",
+        "kind": "word",
+        "questions": questions,
+        **_summarize(runs, memory_run, WORD_STAGES, questions),
+    }
+
+
+def print_result(result: Dict[str, Any]):
+    stages = "  ".join(
+        f"{stage}={format_number(values['median_ms'], 1)}ms"
+        f"(净增{format_number(values['net_alloc_kb'], 0)}KB/峰值{format_number(values['peak_alloc_kb'], 0)}KB)"
+        for stage, values in result["stages"].items()
+    )
+    print(
+        f"  {result['name']:<14} total={format_number(result['total_ms']['median'], 1)}ms "
+        f"({format_number(result['per_item_ms'], 2)}ms/项) peak={format_number(result['peak_alloc_kb'] / 1024, 1)}MB  {stages}"
+    )
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, threshold: float) -> List[str]:
+    """与之前的结果对比总耗时中位数，返回变慢超过阈值的场景名"""
+    baseline = load_scenarios(baseline_path)
+    regressions = []
+    print(f"\n📊 与 {baseline_path} 对比（阈值 {threshold:+.0f}%）:")
+    for result in results:
+        old = baseline.get(result["name"])
+        if old is None:
+            print(f"  {result['name']:<14} （基准中没有该场景）")
+            continue
+        change = percent_change(result["total_ms"]["median"], old["total_ms"]["median"])
+        slower = change is not None and change > threshold
+        if slower:
+            regressions.append(result["name"])
+        print(
+            f"  {'⚠️' if slower else '  '} {result['name']:<14} "
+            f"{format_number(old['total_ms']['median'], 1)}ms → {format_number(result['total_ms']['median'], 1)}ms "
+            f"({'-' if change is None else f'{change:+.1f}%'})"
+        )
+    return regressions
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(item) for item in text.split(",") if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="create_presentation / create_word_document 渲染微基准测试")
+    parser.add_argument("--kinds", default="ppt,word", help="测试的渲染器，逗号分隔: ppt,word")
+    parser.add_argument("--designs", type=_int_list, default=list(PPT_CONFIG["available_designs"]), help="PPT模板编号")
+    parser.add_argument("--slides", type=_int_list, default=[4, 10, 25, 50, 100], help="PPT页数")
+    parser.add_argument("--questions", type=_int_list, default=[5, 20, 50, 100, 200, 500], help="Word选择题数量")
+    parser.add_argument("--repeat", type=int, default=5, help="每个场景的计时次数（取中位数）")
+    parser.add_argument("--seed", type=int, default=0, help="随机布局的种子")
+    parser.add_argument("--output", default=None, help="结果JSON路径，默认 Data/benchmarks/render-<时间>.json")
+    parser.add_argument("--compare", default=None, help="与之前保存的结果JSON对比")
+    parser.add_argument("--threshold", type=float, default=10.0, help="总耗时变慢超过该百分比视为回退")
+    parser.add_argument("--fail-on-regression", action="store_true", help="存在回退时以非零状态码退出")
+    args = parser.parse_args(argv)
+    args.kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    return args
+
+
+def main(argv=None) -> Optional[int]:
+    args = parse_args(argv)
+    LOGGING_CONFIG["show_progress"] = False
+    LOGGING_CONFIG["show_debug_info"] = False
+
+    results = []
+    # 渲染函数中的进度输出不计入结果，也不刷屏
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        if "ppt" in args.kinds:
+            print(f"🚀 PPT: 模板 {args.designs} × 页数 {args.slides}，每个场景 {args.repeat} 次")
+            for design in args.designs:
+                for slides in args.slides:
+                    with contextlib.redirect_stdout(devnull):
+                        result = benchmark_ppt(design, slides, args.repeat, args.seed)
+                    results.append(result)
+                    print_result(result)
+        if "word" in args.kinds:
+            print(f"🚀 Word: 选择题数量 {args.questions}，每个场景 {args.repeat} 次")
+            for questions in args.questions:
+                with contextlib.redirect_stdout(devnull):
+                    result = benchmark_word(questions, args.repeat)
+                results.append(result)
+                print_result(result)
+
+    output_path = args.output or default_output_path("render")
+    write_report(
+        output_path, {k: v for k, v in vars(args).items() if k not in ("output", "compare")}, results
+    )
+    print(f"✅ 结果已保存: {output_path}")
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"❌ 以下场景变慢超过 {args.threshold}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
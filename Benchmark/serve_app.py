@@ -0,0 +1,69 @@
+"""
+以基准测试配置启动FastAPI服务（由 http_benchmark.py 在子进程中调用）
+
+在导入 server_main 之前修改配置：
+- 大模型地址指向模拟服务
+- 关闭LLM响应缓存（否则重复请求不会到达模型）
+- 默认关闭RPM/TPM限流（模拟服务没有额度限制，自适应并发仍然生效）
+- 任务队列使用临时的SQLite文件，不会恢复真实环境中未完成的任务
+
+用法:
+    python Benchmark/serve_app.py --port 18000 --llm-base-url http://127.0.0.1:18080/v1
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+sys.path.append(os.path.dirname(ROOT_DIR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="以基准测试配置启动FastAPI服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18000)
+    parser.add_argument("--llm-base-url", required=True, help="模拟OpenAI服务地址，如 http://127.0.0.1:18080/v1")
+    parser.add_argument("--generation-mode", choices=("single", "stream", "outline"), default=None)
+    parser.add_argument("--word-generation-mode", choices=("single", "parallel"), default=None)
+    parser.add_argument("--enable-cache", action="store_true", help="保留LLM响应缓存")
+    parser.add_argument("--keep-rate-limit", action="store_true", help="保留RPM/TPM限流配置")
+    parser.add_argument("--quiet", action="store_true", help="关闭生成过程的进度输出")
+    args = parser.parse_args()
+
+    from FileRequestServer.config import (
+        JOB_CONFIG,
+        LLM_CACHE_CONFIG,
+        LLM_RATE_LIMIT_CONFIG,
+        LOGGING_CONFIG,
+        OPENAI_CONFIG,
+        PPT_CONFIG,
+        WORD_CONFIG,
+    )
+
+    OPENAI_CONFIG["base_url"] = args.llm_base_url
+    OPENAI_CONFIG["api_key"] = "benchmark"
+    if not args.enable_cache:
+        LLM_CACHE_CONFIG["enabled"] = False
+    if not args.keep_rate_limit:
+        LLM_RATE_LIMIT_CONFIG["requests_per_minute"] = 0
+        LLM_RATE_LIMIT_CONFIG["tokens_per_minute"] = 0
+    if args.generation_mode:
+        PPT_CONFIG["generation_mode"] = args.generation_mode
+    if args.word_generation_mode:
+        WORD_CONFIG["generation_mode"] = args.word_generation_mode
+    if args.quiet:
+        LOGGING_CONFIG["show_progress"] = False
+        LOGGING_CONFIG["show_ai_content"] = False
+        LOGGING_CONFIG["show_ai_response"] = False
+    JOB_CONFIG["db_path"] = os.path.join(tempfile.mkdtemp(prefix="aifilegen-bench-"), "jobs.sqlite3")
+
+    import uvicorn
+    from AIFileGenerator.FileRequestServer.server_main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -12,11 +12,119 @@ OPENAI_CONFIG = {
     "model_path": "moonshot-v1-32k",
 }
 
+# LLM客户端连接池配置（进程内共享同一个客户端，复用TCP/TLS连接）
+LLM_CLIENT_CONFIG = {
+    "max_connections": 100,  # 连接池最大连接数
+    "max_keepalive_connections": 20,  # 保持活跃的空闲连接数
+    "keepalive_expiry": 30.0,  # 空闲连接保持时间（秒）
+    "http2": False,  # 启用HTTP/2（需要安装 h2 库）
+    "timeout": 120.0,  # 单次请求超时（秒）
+    # 流式请求发送 stream_options.include_usage，在最后一个片段中取得 usage（后端不支持时关闭）
+    "stream_include_usage": True,
+}
+
+# LLM响应缓存配置（按完整消息+模型+参数的哈希缓存，内存LRU + 磁盘两级）
+LLM_CACHE_CONFIG = {
+    "enabled": True,
+    "memory_max_bytes": 64 * 1024 * 1024,  # 内存层容量上限（字节）
+    "disk_enabled": True,
+    "disk_dir": os.path.join(os.path.dirname(__file__), "..", "Data", "llm_cache"),
+    "disk_max_bytes": 1024 * 1024 * 1024,  # 磁盘层容量上限（字节），超出时删除最旧的条目
+    "ttl_seconds": 7 * 24 * 3600,  # 缓存有效期（秒）
+}
+
+# LLM多后端路由配置
+# OPENAI_CONFIG 为主后端；backends 中可追加其他OpenAI兼容后端（如自建的Ollama/vLLM），
+# 每次调用按滚动EWMA耗时、错误率、权重和当前负载选择最优的健康后端
+LLM_ROUTER_CONFIG = {
+    "primary_weight": 1.0,  # 主后端权重，越大越优先
+    "backends": [
+        # {
+        #     "name": "ollama",
+        #     "base_url": "http://10.120.47.138:11434/v1",
+        #     "api_key": "dummy_key",
+        #     "model_path": "qwen2.5-32b",
+        #     "weight": 0.5,
+        #     "max_concurrency": 4,  # 该后端的并发上限
+        #     "rate_limit": {"requests_per_minute": 0, "tokens_per_minute": 0},  # 覆盖 LLM_RATE_LIMIT_CONFIG
+        # },
+    ],
+    "ewma_alpha": 0.2,  # EWMA平滑系数，越大越看重最近的调用
+    "error_threshold": 0.5,  # 错误率EWMA达到该值时暂停使用该后端
+    "cooldown_seconds": 30,  # 暂停时长（秒），期满后重新参与路由
+}
+
+# LLM上游限流配置（主后端；PPT与Word共用额度，超出时排队等待而不是失败）
+LLM_RATE_LIMIT_CONFIG = {
+    "enabled": True,
+    "requests_per_minute": 200,  # 每分钟请求数上限，0表示不限制
+    "tokens_per_minute": 1_000_000,  # 每分钟token数上限（按估算值预扣，拿到usage后修正），0表示不限制
+    "initial_concurrency": 8,  # 初始并发上限
+    "min_concurrency": 1,
+    "max_concurrency": 64,
+    "latency_target_seconds": 90.0,  # 单次调用耗时超过该值时不再增加并发
+    "first_token_target_seconds": 20.0,  # 流式调用按首个token的耗时判断，超过该值时不再增加并发
+    "decrease_factor": 0.5,  # 遇到429时并发上限的缩减比例
+    "default_completion_tokens": 1024,  # 未指定max_tokens时预扣的输出token数
+}
+
+# Token预算配置：本地估算提示词token数，按期望的输出规模确定 max_tokens，并用响应中的 usage 校准估算
+TOKEN_BUDGET_CONFIG = {
+    "enabled": True,  # 为False时不设置 max_tokens（使用模型默认值），也不检查上下文窗口
+    # 各模型的上下文窗口（token）；未列出的模型按名称中的 "-32k" 等后缀推断，都没有时使用默认值
+    "context_windows": {},
+    "default_context_window": 32768,
+    "context_reserve_tokens": 256,  # 为消息格式等开销预留的token数
+    "cjk_chars_per_token": 1.5,  # 非ASCII字符（中文等）每个token对应的字符数（初始值，运行中按实际usage校准）
+    "ascii_chars_per_token": 4.0,  # ASCII字符每个token对应的字符数
+    "message_overhead_tokens": 4,  # 每条消息的格式开销
+    "min_output_tokens": 256,  # 上下文窗口剩余的输出空间少于该值时拒绝请求
+    "max_output_tokens": 16384,  # 单次调用的 max_tokens 上限
+    "safety_margin": 1.3,  # max_tokens = 期望输出 × 安全余量
+    "truncation_growth": 1.5,  # 输出被截断（finish_reason=length）后重试时 max_tokens 的放大倍数
+    "calibration_alpha": 0.2,  # 校准系数的EWMA平滑系数
+    "calibration_bounds": (0.5, 3.0),  # 校准系数（实际 / 估算）的取值范围
+    # 各类输出的期望token数 = 固定部分 + 每单位 × 单位数（初始值，运行中按实际usage校准）
+    "output_profiles": {
+        "ppt": (200, 250),  # 单位：页
+        "ppt_outline": (150, 80),  # 单位：页
+        "ppt_section": (50, 250),  # 单位：页
+        "word": (1500, 200),  # 单位：题
+        "word_summary": (1200, 0),
+        "word_multiple_choice": (100, 150),  # 单位：题
+        "word_short_answer_questions": (100, 180),  # 单位：题
+        "word_quiz_data": (300, 0),
+        "word_teaching_suggestions": (600, 0),
+    },
+}
+
+# LLM调用重试与对冲配置
+LLM_RETRY_CONFIG = {
+    "max_attempts": 4,  # 单次调用最多尝试次数（含首次），仅对429、5xx、超时、连接错误和JSON格式错误重试
+    "base_delay": 1.0,  # 指数退避的基础等待时间（秒），实际等待在 [0, base_delay * 2^n] 间随机
+    "max_delay": 30.0,  # 单次退避等待上限（秒）
+    # 对冲请求：调用超过近期耗时p95仍未返回时再发出一个相同请求，取先返回有效结果的那个
+    "hedge_enabled": False,
+    "hedge_percentile": 95,
+    "hedge_min_samples": 20,  # 样本数不足时使用 hedge_default_delay
+    "hedge_default_delay": 60.0,
+    "hedge_min_delay": 2.0,
+    "latency_window": 200,  # 每类调用保留的最近耗时样本数
+}
+
 # Word文档生成默认配置
 WORD_CONFIG = {
     "default_template": "hkedu_template_docxtpl.docx",  # 默认模板文件名
     "template_folder": "WordGenProject",  # 模板文件夹
     "output_folder": "Output",  # 输出文件夹
+    # 生成模式: "single" 一次调用生成全部内容; "parallel" 先生成摘要，再并发生成选择题、简答题、
+    # 学习内容片段和教学建议（适合题目较多的工作表，总耗时约为最慢的组成部分）
+    "generation_mode": "single",
+    # 估算输出规模（max_tokens）用：用户要求中找不到题目数量时假设的题数；
+    # quiz_data 照搬学习内容，按学习内容token数的一定比例计入期望输出
+    "default_question_count": 9,
+    "quiz_content_ratio": 0.3,
+    "quiz_max_tokens": 3000,
 }
 
 # PPT生成默认配置
@@ -30,6 +138,11 @@ PPT_CONFIG = {
     "use_random_layouts": True,
     "auto_detect_layouts": True,  # 自动检测模板中的可用布局
     "available_content_layouts": [1, 2, 3, 4, 7, 8, 9],
+    # 生成模式: "single" 等待完整响应后渲染; "stream" 流式接收并边收边渲染幻灯片;
+    # "outline" 先生成大纲，再按章节并发生成各页内容（适合页数较多的演示文稿）
+    "generation_mode": "stream",
+    "outline_section_slides": 3,  # outline模式下每次LLM调用生成的内容页数
+    "outline_max_concurrency": 8,  # outline模式下同一演示文稿同时进行的章节调用数
 }
 
 # 文件路径配置 (合并)
@@ -44,12 +157,79 @@ PATHS = {
     "ppt_template_path_format": os.path.join(os.path.dirname(__file__),"..",  "Designs", "Design-{}.pptx"),
 }
 
+# 输出文件配置
+OUTPUT_CONFIG = {
+    # 目标文件已存在时: "version" 另存为带版本号的文件名(test_v2.pptx); "overwrite" 原子替换旧文件
+    "on_conflict": "version",
+}
+
+# 模板缓存配置（模板文件内容常驻内存，每次请求从内存创建新的Presentation/DocxTemplate）
+TEMPLATE_CONFIG = {
+    "preload_on_startup": True,  # 服务启动时预加载全部PPT设计模板和Word模板
+    "check_mtime": True,  # 每次取用时检查文件修改时间，模板被替换后自动重新读取
+}
+
+# 异步任务队列配置
+JOB_CONFIG = {
+    # 任务状态持久化的SQLite文件（服务重启后未完成的任务会重新入队）
+    "db_path": os.path.join(os.path.dirname(__file__), "..", "Data", "jobs.sqlite3"),
+    "max_workers": 4,  # 同时执行的生成任务数量
+    "max_queue_size": 10000,  # 排队任务上限，超出时拒绝提交
+    "max_attempts": 3,  # 任务最多开始执行的次数；重启时已达上限的未完成任务标记为失败，不再重新排队
+    "progress_history_jobs": 1000,  # 内存中保留进度事件的已结束任务数量
+    "sse_keepalive_seconds": 15,  # SSE进度推送无新事件时的心跳间隔（秒）
+}
+
+# 批量生成配置
+BATCH_CONFIG = {
+    "max_items": 100,  # 单次批量请求最多包含的条目数
+    "max_concurrency": 8,  # 同一批量请求内同时生成的条目数
+}
+
+# 文件下载配置
+DOWNLOAD_CONFIG = {
+    "metadata_cache_entries": 10000,  # 内存中缓存ETag等元数据的文件数量上限
+    "cache_control": "private, no-cache",  # 客户端可缓存，但每次使用前需用ETag重新验证（命中时返回304）
+}
+
+# 指标配置（/metrics 以Prometheus文本格式导出）
+METRICS_CONFIG = {
+    "prefix": "aifilegen",  # 指标名前缀
+    # 耗时直方图的桶上界（秒），覆盖从模板渲染的毫秒级到LLM调用的分钟级
+    "buckets": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+    "quantile_window": 1000,  # 计算近期分位数时每个序列保留的样本数
+    "quantiles": (0.5, 0.95, 0.99),
+}
+
+# 长学习内容的分块摘要（map-reduce）配置
+# 估算token数超过阈值的 learning_content / content 先按标题分块、并发摘要，再用拼接后的提要代替原文写入提示词；
+# 每块的摘要调用只包含该块内容，经LLM响应缓存按块缓存，修改后重新提交时只有改动的块需要重新摘要
+CONTENT_DIGEST_CONFIG = {
+    "enabled": True,
+    "max_input_tokens": 16000,  # 输入估算token数超过该值时启用分块摘要（moonshot-v1-32k 需为提示词其余部分和输出预留空间）
+    "chunk_tokens": 4000,  # 每块的目标token数，分块优先落在标题处
+    "summary_max_tokens": 1000,  # 每块摘要的输出上限
+    "max_concurrency": 8,  # 同一输入同时进行的分块摘要调用数
+    "max_rounds": 3,  # 提要仍超过阈值时继续归约的最大轮数
+}
+
+# 简繁转换配置（模型输出解析后转换字符串值）
+TEXT_CONVERSION_CONFIG = {
+    "default_variant": "s2hk",  # 请求未指定时的目标变体："s2hk" 香港繁体 | "s2tw" 台湾繁体 | "none" 不转换
+}
+
 # 日志配置 (合并，保留常用项)
 LOGGING_CONFIG = {
-    "show_debug_info": False,
+    "show_debug_info": False,  # 为True时日志级别降为DEBUG
     "show_ai_content": True,  # Word用
     "show_gpt_content": False,  # PPT用
+    "show_ai_response": False,  # 为True时以INFO级别记录AI原始响应（截断后），否则仅在DEBUG级别下采样记录
     "show_progress": True,
+    "level": "INFO",  # 日志级别
+    "format": "json",  # 输出格式："json"（每行一个JSON对象）或 "text"（便于命令行阅读）
+    "max_field_chars": 500,  # 单个字段（含消息）的最大字符数，超出部分截断
+    "payload_sample_rate": 0.05,  # DEBUG级别下AI原始响应等大段内容的采样比例（0~1）
+    "queue_size": 10000,  # 异步日志队列容量，写出跟不上时丢弃新日志并计数
 }
 
 # 环境变量覆盖（如果存在）
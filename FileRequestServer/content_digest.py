@@ -0,0 +1,244 @@
+"""
+长学习内容的分块摘要（map-reduce）模块
+learning_content / content 的估算token数超过 CONTENT_DIGEST_CONFIG["max_input_tokens"] 时，
+先压缩成提要再写入生成提示词，避免超出模型上下文、拖慢生成：
+
+1. 按标题（Markdown标题、"1." / "一、" / "第一章" 等编号开头的行）切分章节，只有同一个顶层标题下的
+   相邻章节才会合并成不超过 chunk_tokens 的块；超长的章节优先在空行、换行、句号处细分。
+   块边界只取决于所在顶层章节的内容，修改某一节不会移动其他顶层章节的块边界
+2. 各块并发调用模型生成摘要（map）。固定的摘要要求放在系统消息中（可命中服务商的前缀缓存），
+   用户消息只包含块内容本身，不含块序号等位置信息，因此修改后重新提交时，
+   未改动的块命中LLM响应缓存，只有改动的块需要重新摘要
+3. 按原顺序拼接各块摘要作为提要（reduce）；提要仍超过阈值时对提要重复上述过程
+"""
+import asyncio
+import math
+import re
+from typing import List, Optional
+
+from FileRequestServer.config import CONTENT_DIGEST_CONFIG, LOGGING_CONFIG, TOKEN_BUDGET_CONFIG
+from FileRequestServer.llm_gateway import achat_completion, run_sync
+from FileRequestServer.llm_limiter import estimate_text_tokens
+from FileRequestServer.metrics import stage_timer
+from FileRequestServer.progress import report_progress
+from FileRequestServer.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# 章节标题：Markdown标题、"1." / "1.2 " / "一、" / "第一章" 等编号开头的行、整行加粗
+_HEADING_PATTERN = re.compile(
+    r"^[ \t]*(?:"
+    r"#{1,6}[ \t]"
+    r"|\d+(?:\.\d+)*[.、．)][ \t]*\S"
+    r"|\d+(?:\.\d+)+[ \t]"
+    r"|[一二三四五六七八九十百]+[、.．]"
+    r"|第[一二三四五六七八九十百\d]+[章節节部課课講讲]"
+    r"|\*\*[^*\n]+\*\*[ \t]*$"
+    r")",
+    re.MULTILINE,
+)
+# 各类标题的层级（数值越小层级越高），用于确定合并章节时的顶层标题
+_CHAPTER_HEADING = re.compile(r"[ \t]*第[一二三四五六七八九十百\d]+[章節节部課课講讲]")
+_MARKDOWN_HEADING = re.compile(r"[ \t]*(#{1,6})[ \t]")
+_CHINESE_NUMBER_HEADING = re.compile(r"[ \t]*[一二三四五六七八九十百]+[、.．]")
+_NUMBER_HEADING = re.compile(r"[ \t]*(\d+(?:\.\d+)*)[.、．) \t]")
+# 细分超长章节时依次尝试的切分点
+_SPLIT_SEPARATORS = ("\n\n", "\n", "。", ". ")
+
+
+# 分块摘要的系统提示词（所有块相同）
+_CHUNK_SUMMARY_SYSTEM_PROMPT = """
+用戶會提供一份長篇教學資料嘅其中一部分，請整理成精簡嘅知識點摘要，供之後生成教學材料使用。
+
+要求：
+1. 保留原文嘅章節標題、關鍵概念、定義、公式、數據、例子同結論，刪去重複同鋪墊內容
+2. 公式保持原有寫法（包括LaTeX），唔好改寫符號
+3. 保持原文語言，唔好翻譯，唔好加入原文冇嘅內容
+4. 用條列形式輸出純文字，唔好輸出JSON或者額外說明
+"""
+
+
+def needs_digest(text: Optional[str]) -> bool:
+    """内容的估算token数是否超过阈值"""
+    return (
+        bool(CONTENT_DIGEST_CONFIG["enabled"] and text)
+        and estimate_text_tokens(text) > CONTENT_DIGEST_CONFIG["max_input_tokens"]
+    )
+
+
+def split_sections(text: str) -> List[str]:
+    """按标题切分章节，标题归入其后的章节；第一个标题之前的内容单独成为一节"""
+    starts = [match.start() for match in _HEADING_PATTERN.finditer(text) if match.start() > 0]
+    bounds = [0, *starts, len(text)]
+    return [text[start:end] for start, end in zip(bounds, bounds[1:]) if text[start:end].strip()]
+
+
+def _split_oversized(section: str, max_chars: int) -> List[str]:
+    """
+    把超过 max_chars 的章节细分成长度相近的几段（避免只比上限多几个字时切出很小的尾块），
+    切分点优先选空行、换行、句号，都找不到时按字符数硬切
+    """
+    pieces = []
+    while len(section) > max_chars:
+        target = math.ceil(len(section) / math.ceil(len(section) / max_chars))
+        window = section[:target]
+        cut = target
+        for separator in _SPLIT_SEPARATORS:
+            position = window.rfind(separator)
+            # 切分点太靠前会产生过小的块，换下一种分隔符
+            if position > target // 2:
+                cut = position + len(separator)
+                break
+        pieces.append(section[:cut])
+        section = section[cut:]
+    pieces.append(section)
+    return pieces
+
+
+def _heading_rank(section: str) -> Optional[int]:
+    """章节开头标题的层级：第X章 < Markdown标题（按#数） < 一、 < 1. / 1.2（按层数） < 加粗行；不以标题开头时返回None"""
+    if not _HEADING_PATTERN.match(section):
+        return None
+    if _CHAPTER_HEADING.match(section):
+        return 0
+    match = _MARKDOWN_HEADING.match(section)
+    if match:
+        return len(match.group(1))
+    if _CHINESE_NUMBER_HEADING.match(section):
+        return 7
+    match = _NUMBER_HEADING.match(section)
+    if match:
+        return 8 + match.group(1).count(".")
+    return 20
+
+
+def _group_sections(sections: List[str]) -> List[List[str]]:
+    """按顶层标题（全文层级最高的标题）把章节分组，第一个顶层标题之前的内容单独成组"""
+    ranks = [_heading_rank(section) for section in sections]
+    top_rank = min((rank for rank in ranks if rank is not None), default=None)
+    groups: List[List[str]] = []
+    for section, rank in zip(sections, ranks):
+        if not groups or (rank is not None and rank == top_rank):
+            groups.append([])
+        groups[-1].append(section)
+    return groups
+
+
+def split_chunks(text: str, chunk_tokens: Optional[int] = None) -> List[str]:
+    """
+    把内容切分成估算token数不超过 chunk_tokens 的块，块边界优先落在标题处。
+    只在同一个顶层章节内合并相邻的小节，块边界不会跨顶层章节传递，
+    修改某一节后其他顶层章节切出的块保持不变，仍能命中LLM响应缓存
+    """
+    chunk_tokens = chunk_tokens or CONTENT_DIGEST_CONFIG["chunk_tokens"]
+    # 按中文的折算比例换算字符数（中文比英文更密，按它切分不会超出预算）
+    max_chars = max(1, int(chunk_tokens * TOKEN_BUDGET_CONFIG["cjk_chars_per_token"]))
+    chunks: List[str] = []
+    for group in _group_sections(split_sections(text)):
+        current = ""
+        for section in group:
+            for piece in _split_oversized(section, max_chars):
+                if current and len(current) + len(piece) > max_chars:
+                    chunks.append(current)
+                    current = ""
+                current += piece
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+async def _summarize_chunk(
+    chunk: str,
+    use_cache: bool,
+    model: Optional[str],
+    base_url: Optional[str],
+    api_key: Optional[str],
+) -> str:
+    response = await achat_completion(
+        [
+            {"role": "system", "content": _CHUNK_SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": chunk},
+        ],
+        model=model,
+        base_url=base_url,
+        api_key=api_key,
+        use_cache=use_cache,
+        temperature=0.3,
+        max_tokens=CONTENT_DIGEST_CONFIG["summary_max_tokens"],
+    )
+    content = (response.choices[0].message.content or "").strip()
+    if not content:
+        raise ValueError("分块摘要为空")
+    return content
+
+
+async def digest_content_async(
+    text: str,
+    use_cache: bool = True,
+    pipeline: str = "word",
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> str:
+    """
+    返回长内容分块摘要后的提要；未超过阈值时原样返回
+
+    Args:
+        text (str): 学习内容或PPT主题内容
+        use_cache (bool): 是否读取LLM响应缓存（分块摘要按块缓存）
+        pipeline (str): 记录耗时指标所属的流程，"word" 或 "ppt"
+        model, base_url, api_key: 摘要调用使用的模型和后端，默认使用 OPENAI_CONFIG
+
+    Returns:
+        str: 提要或原文
+    """
+    if not needs_digest(text):
+        return text
+    original_tokens = estimate_text_tokens(text)
+    semaphore = asyncio.Semaphore(max(1, CONTENT_DIGEST_CONFIG["max_concurrency"]))
+
+    async def _run(chunk: str) -> str:
+        async with semaphore:
+            return await _summarize_chunk(chunk, use_cache, model, base_url, api_key)
+
+    rounds = 0
+    with stage_timer(pipeline, "digest"):
+        while rounds < max(1, CONTENT_DIGEST_CONFIG["max_rounds"]):
+            rounds += 1
+            chunks = split_chunks(text)
+            tasks = [asyncio.ensure_future(_run(chunk)) for chunk in chunks]
+            try:
+                summaries = await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+            text = "\n\n".join(summaries)
+            report_progress("digest_round", round=rounds, chunks=len(chunks))
+            if not needs_digest(text):
+                break
+
+    digest_tokens = estimate_text_tokens(text)
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info(
+            "📚 长内容已分块摘要",
+            original_tokens=original_tokens,
+            digest_tokens=digest_tokens,
+            rounds=rounds,
+        )
+    report_progress("digest_ready", original_tokens=original_tokens, digest_tokens=digest_tokens)
+    return text
+
+
+def digest_content(
+    text: str,
+    use_cache: bool = True,
+    pipeline: str = "word",
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+) -> str:
+    """digest_content_async 的同步版本（在LLM网关事件循环上执行）；未超过阈值时不切换线程直接返回"""
+    if not needs_digest(text):
+        return text
+    return run_sync(digest_content_async(text, use_cache, pipeline, model, base_url, api_key))
@@ -0,0 +1,86 @@
+"""
+下载文件元数据缓存
+缓存文件的内容哈希（强ETag）、大小、修改时间和MIME类型，文件未变化时下载请求只需一次stat
+"""
+import hashlib
+import os
+import stat
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from FileRequestServer.config import DOWNLOAD_CONFIG
+from FileRequestServer.generated_file import media_type_for
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class FileMetadata(NamedTuple):
+    etag: str  # 带引号的强ETag（内容SHA-256）
+    media_type: str
+    stat_result: os.stat_result
+
+
+def _make_etag(digest: str) -> str:
+    return f'"{digest[:32]}"'
+
+
+def _hash_file(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class FileMetadataCache:
+    """按路径缓存元数据，以 (mtime_ns, size) 判断文件是否被修改，超出容量时淘汰最久未用的条目"""
+
+    def __init__(self, max_entries: int = DOWNLOAD_CONFIG["metadata_cache_entries"]):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], FileMetadata]]" = OrderedDict()
+
+    def get(self, path: str) -> Optional[FileMetadata]:
+        """获取文件元数据，文件不存在（或不是普通文件）时返回None"""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(stat_result.st_mode):
+            return None
+        version = (stat_result.st_mtime_ns, stat_result.st_size)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(path)
+                return entry[1]._replace(stat_result=stat_result)
+
+        # 文件是新的或已被修改，重新计算内容哈希
+        metadata = FileMetadata(_make_etag(_hash_file(path)), media_type_for(path), stat_result)
+        self._store(path, version, metadata)
+        return metadata
+
+    def prime(self, path: str, data: bytes):
+        """写入文件后直接用内存中的内容登记哈希，避免首次下载时再读一遍文件"""
+        try:
+            stat_result = os.stat(path)
+        except OSError:
+            return
+        if stat_result.st_size != len(data):
+            return
+        metadata = FileMetadata(
+            _make_etag(hashlib.sha256(data).hexdigest()), media_type_for(path), stat_result
+        )
+        self._store(path, (stat_result.st_mtime_ns, stat_result.st_size), metadata)
+
+    def _store(self, path: str, version: Tuple[int, int], metadata: FileMetadata):
+        with self._lock:
+            self._entries[path] = (version, metadata)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# 进程内共享的元数据缓存
+file_metadata_cache = FileMetadataCache()
@@ -0,0 +1,91 @@
+"""
+内存中的生成结果
+PPT/Word渲染后保存到BytesIO，由调用方决定直接返回给客户端还是写入磁盘
+"""
+import itertools
+import os
+import uuid
+from typing import NamedTuple, Optional
+
+from FileRequestServer.config import OUTPUT_CONFIG
+
+# 生成文件的MIME类型
+MEDIA_TYPES = {
+    ".pptx": "application/vnd.openxmlformats-officedocument.presentationml.presentation",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".txt": "text/plain; charset=utf-8",
+}
+
+
+def media_type_for(filename: str) -> str:
+    """根据扩展名获取MIME类型，未知类型返回 application/octet-stream"""
+    return MEDIA_TYPES.get(os.path.splitext(filename)[1].lower(), "application/octet-stream")
+
+
+class GeneratedFile(NamedTuple):
+    """渲染完成的文件：文件名（含扩展名）和文件内容"""
+
+    filename: str
+    data: bytes
+
+    @property
+    def media_type(self) -> str:
+        return media_type_for(self.filename)
+
+    def renamed(self, custom_filename: Optional[str]) -> "GeneratedFile":
+        """使用自定义文件名（不含扩展名），为空时保持原名"""
+        if not custom_filename:
+            return self
+        return self._replace(filename=custom_filename + os.path.splitext(self.filename)[1])
+
+    def save(self, directory: str, on_conflict: Optional[str] = None) -> str:
+        """
+        写入目录并返回文件绝对路径
+
+        先写入同目录下唯一命名的临时文件，再用 os.replace 原子地发布，
+        并发写入同名文件时不会互相覆盖出半个文件。
+
+        Args:
+            directory (str): 目标目录
+            on_conflict (Optional[str]): 目标文件已存在时的处理方式，默认取 OUTPUT_CONFIG["on_conflict"]
+                - "version": 使用带版本号的新文件名（如 test_v2.pptx），已有文件保持不变
+                - "overwrite": 原子地替换已有文件
+        """
+        on_conflict = on_conflict or OUTPUT_CONFIG["on_conflict"]
+        directory = os.path.abspath(directory)
+        os.makedirs(directory, exist_ok=True)
+
+        tmp_path = os.path.join(directory, f".{self.filename}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(self.data)
+
+        reserved = False
+        try:
+            if on_conflict == "overwrite":
+                full_path = os.path.join(directory, self.filename)
+            else:
+                full_path = _reserve_versioned_path(directory, self.filename)
+                reserved = True
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            if reserved:
+                os.remove(full_path)
+            raise
+        return full_path
+
+
+def _reserve_versioned_path(directory: str, filename: str) -> str:
+    """以独占方式创建占位文件来预留一个未被使用的文件名：name.ext, name_v2.ext, name_v3.ext ..."""
+    stem, ext = os.path.splitext(filename)
+    for version in itertools.count(1):
+        candidate = filename if version == 1 else f"{stem}_v{version}{ext}"
+        full_path = os.path.join(directory, candidate)
+        try:
+            fd = os.open(full_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return full_path
+    raise AssertionError("unreachable")
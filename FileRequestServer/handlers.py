@@ -2,19 +2,40 @@
 共享的API处理函数模块
 将核心业务逻辑从路由定义中分离出来，便于复用
 """
-import asyncio
-import sys
+import json
 import os
 from functools import wraps
-from fastapi import HTTPException
+from urllib.parse import quote
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
 
-from AIFileGenerator.FileRequestServer.models import GeneratePPTRequest, GenerateWordRequest
+from AIFileGenerator.FileRequestServer.models import (
+    GenerateBatchRequest,
+    GeneratePPTRequest,
+    GenerateWordRequest,
+)
 from AIFileGenerator.FileRequestServer.services import (
     download_file_service,
-    generate_ppt_service,
-    generate_word_service,
+    generate_batch_service_async,
+    generate_ppt_file_service_async,
+    generate_ppt_service_async,
+    generate_word_file_service_async,
+    generate_word_service_async,
     mock_generate_file_service,
+    save_to_user_dir,
 )
+from FileRequestServer.config import BATCH_CONFIG, JOB_CONFIG
+from FileRequestServer.generated_file import GeneratedFile
+from FileRequestServer.jobs import JobManager, JobStore, QueueFullError
+from FileRequestServer.metrics import metrics_registry
+from FileRequestServer.progress import TERMINAL_STAGES, progress_broker
+from FileRequestServer.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# 请求摘要中超过该长度的文本字段只记录字符数（如 learning_content 常有数KB）
+_SUMMARY_TEXT_CHARS = 80
 
 
 def copy_docs_to_wrapper(handler_func):
@@ -27,6 +48,79 @@ def copy_docs_to_wrapper(handler_func):
     return decorator
 
 
+def _request_summary(request) -> dict:
+    """请求参数摘要，用于日志：长文本字段替换为字符数"""
+    summary = {}
+    for key, value in request.model_dump().items():
+        if isinstance(value, str) and len(value) > _SUMMARY_TEXT_CHARS:
+            summary[f"{key}_chars"] = len(value)
+        else:
+            summary[key] = value
+    return summary
+
+
+def _build_file_result(result_path: str, userId: str) -> dict:
+    """构建文件生成结果"""
+    return {
+        "fullPath": result_path,
+        "userId": userId,
+        "filename": result_path.split(os.sep)[-1],
+    }
+
+
+def _content_disposition(filename: str) -> str:
+    """构建附件下载头，非ASCII文件名按 RFC 5987 编码"""
+    quoted = quote(filename)
+    if quoted == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename*=utf-8''{quoted}"
+
+
+def _build_file_response(generated: GeneratedFile, request) -> Response:
+    """直接返回文件内容；需要持久化时在响应发送完成后再写入用户目录"""
+    background = (
+        BackgroundTask(save_to_user_dir, generated, request.userId)
+        if request.persist
+        else None
+    )
+    return Response(
+        content=generated.data,
+        media_type=generated.media_type,
+        headers={"Content-Disposition": _content_disposition(generated.filename)},
+        background=background,
+    )
+
+
+async def _run_ppt_job(payload: dict) -> dict:
+    """后台任务：生成PPT文件"""
+    request = GeneratePPTRequest(**payload)
+    result_path = await generate_ppt_service_async(request)
+    return _build_file_result(result_path, request.userId)
+
+
+async def _run_word_job(payload: dict) -> dict:
+    """后台任务：生成Word文档"""
+    request = GenerateWordRequest(**payload)
+    result_path = await generate_word_service_async(request)
+    return _build_file_result(result_path, request.userId)
+
+
+# 进程内唯一的任务队列，由server_main在应用启动/关闭时启停
+job_manager = JobManager(
+    JobStore(JOB_CONFIG["db_path"]),
+    runners={"ppt": _run_ppt_job, "word": _run_word_job},
+)
+
+
+def _collect_job_metrics():
+    stats = job_manager.stats()
+    yield ("jobs_queued", "gauge", "排队等待执行的后台任务数", [({}, stats["queued"])])
+    yield ("job_workers", "gauge", "后台任务worker数量", [({}, stats["workers"])])
+
+
+metrics_registry.register_collector(_collect_job_metrics)
+
+
 async def handle_mock_test(request: GeneratePPTRequest):
     """
     模拟生成文件接口，测试使用
@@ -34,21 +128,17 @@ async def handle_mock_test(request: GeneratePPTRequest):
     直接生成PPT文件并返回完成结果。
     FastAPI会自动处理并发请求，但生成过程本身是同步的。
     """
-    print(f"handle_mock_test called with request: {request}")
+    logger.info("handle_mock_test", request=_request_summary(request))
     try:
         result_path = await mock_generate_file_service(request)
-        print(f"Mock File生成成功，路径: {result_path}")
+        logger.info("Mock File生成成功", path=result_path)
         return {
             "success": "True",
             "message": "Mock File生成成功",
-            "data": {
-                "fullPath": result_path,
-                "userId": request.userId,
-                "filename": result_path.split(os.sep)[-1],
-            },
+            "data": _build_file_result(result_path, request.userId),
         }
     except Exception as e:
-        print(f"Mock PPT生成失败: {e}", file=sys.stderr)
+        logger.error("Mock PPT生成失败", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=f"Mock PPT生成失败: {str(e)}")
 
 
@@ -57,7 +147,9 @@ async def handle_ppt_generation(request: GeneratePPTRequest):
     生成PPT文件接口
 
     直接生成PPT文件并返回完成结果。
-    FastAPI会自动处理并发请求，但生成过程本身是同步的。
+    大模型调用通过共享的LLM网关异步等待，只有PPT渲染在线程池中执行。
+    设置 return_file=true 时PPT在内存中渲染并直接作为响应体返回，省去写盘和再次调用 /download；
+    此时 persist 控制是否在响应发送后把文件保存到用户目录。
 
     Args:
         request (GeneratePPTRequest): PPT生成请求参数，包含用户ID、内容等信息
@@ -69,6 +161,7 @@ async def handle_ppt_generation(request: GeneratePPTRequest):
             - fullPath (str): 生成文件的完整路径
             - userId (str): 用户ID
             - filename (str): 生成的文件名
+        Response: return_file=true 时为 .pptx 文件内容（Content-Disposition: attachment）
 
     Raises:
         HTTPException: 当PPT生成失败时抛出500错误
@@ -90,21 +183,21 @@ async def handle_ppt_generation(request: GeneratePPTRequest):
             "filename": "file.pptx"
         }
     """
-    print(f"handle_ppt_generation called with request: {request}")
+    logger.info("handle_ppt_generation", request=_request_summary(request))
     try:
-        result_path = await asyncio.to_thread(generate_ppt_service, request)
-        print(f"PPT生成成功，路径: {result_path}")
+        if request.return_file:
+            generated = await generate_ppt_file_service_async(request)
+            logger.info("PPT生成成功，直接返回", filename=generated.filename, size=len(generated.data))
+            return _build_file_response(generated, request)
+        result_path = await generate_ppt_service_async(request)
+        logger.info("PPT生成成功", path=result_path)
         return {
             "success": True,
             "message": "PPT生成成功",
-            "data": {
-                "fullPath": result_path,
-                "userId": request.userId,
-                "filename": result_path.split(os.sep)[-1],
-            },
+            "data": _build_file_result(result_path, request.userId),
         }
     except Exception as e:
-        print(f"PPT生成失败: {e}", file=sys.stderr)
+        logger.error("PPT生成失败", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=f"PPT生成失败: {str(e)}")
 
 
@@ -113,7 +206,8 @@ async def handle_word_generation(request: GenerateWordRequest):
     生成Word文档接口
 
     直接生成Word文档并返回完成结果。
-    FastAPI会自动处理并发请求，但生成过程本身是同步的。
+    大模型调用通过共享的LLM网关异步等待，只有模板渲染在线程池中执行。
+    return_file / persist 的用法同 :func:`handle_ppt_generation`。
 
     Args:
         request (GenerateWordRequest): Word文档生成请求参数，包含用户ID、内容等信息
@@ -125,6 +219,7 @@ async def handle_word_generation(request: GenerateWordRequest):
             - fullPath (str): 生成文件的完整路径
             - userId (str): 用户ID
             - filename (str): 生成的文件名
+        Response: return_file=true 时为 .docx 文件内容（Content-Disposition: attachment）
 
     Raises:
         HTTPException: 当Word文档生成失败时抛出500错误
@@ -146,31 +241,308 @@ async def handle_word_generation(request: GenerateWordRequest):
             "filename": "file.docx"
         }
     """
-    print(f"handle_word_generation called with request: {request}")
+    logger.info("handle_word_generation", request=_request_summary(request))
     try:
-        result_path = await asyncio.to_thread(generate_word_service, request)
-        print(f"Word生成成功，路径: {result_path}")
+        if request.return_file:
+            generated = await generate_word_file_service_async(request)
+            logger.info("Word生成成功，直接返回", filename=generated.filename, size=len(generated.data))
+            return _build_file_response(generated, request)
+        result_path = await generate_word_service_async(request)
+        logger.info("Word生成成功", path=result_path)
         return {
             "success": True,
             "message": "Word生成成功",
-            "data": {
-                "fullPath": result_path,
-                "userId": request.userId,
-                "filename": result_path.split(os.sep)[-1],
-            },
+            "data": _build_file_result(result_path, request.userId),
         }
     except Exception as e:
-        print(f"Word生成失败: {e}", file=sys.stderr)
+        logger.error("Word生成失败", error=str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=f"Word生成失败: {str(e)}")
 
 
-async def handle_file_download(userID: str = "666", filename: str = "test.pptx"):
+async def handle_batch_generation(request: GenerateBatchRequest):
+    """
+    批量生成接口
+
+    一次提交多个PPT/Word生成请求，服务端以有限并发同时生成，返回每个条目的结果。
+    设置 as_job=true 时每个条目提交为后台任务，立即返回各自的任务ID，之后通过 /jobs/{task_id} 查询。
+
+    Args:
+        request (GenerateBatchRequest): 批量请求
+            - ppt_requests (List[GeneratePPTRequest]): PPT生成请求列表
+            - word_requests (List[GenerateWordRequest]): Word生成请求列表
+            - as_job (bool): 是否以后台任务方式提交
+
+    Returns:
+        dict: 批量生成结果
+            - success (bool): 固定为True，单个条目的成败见 results
+            - message (str): 成功数量统计
+            - data.results (list): 按 PPT条目、Word条目 顺序排列，每项包含
+                kind, index (在各自列表中的序号), success, data 或 error
+
+    Raises:
+        HTTPException: 条目数量为0或超过 BATCH_CONFIG["max_items"] 时抛出400错误
+
+    Example:
+        POST /generate/batch
+        {
+            "ppt_requests": [{"userId": "user123", "content": "第一课"}, ...],
+            "word_requests": [{"userId": "user123", "learning_content": "第一课"}, ...]
+        }
+
+        Response:
+        {
+            "success": true,
+            "message": "批量生成完成: 成功 2/2",
+            "data": {
+                "results": [
+                    {"kind": "ppt", "index": 0, "success": true, "data": {"fullPath": "...", "userId": "user123", "filename": "..."}},
+                    {"kind": "word", "index": 0, "success": true, "data": {...}}
+                ]
+            }
+        }
+    """
+    total = len(request.ppt_requests) + len(request.word_requests)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="批量请求不能为空")
+    if total > BATCH_CONFIG["max_items"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"批量请求条目过多: {total}，上限 {BATCH_CONFIG['max_items']}",
+        )
+
+    results = []
+    if request.as_job:
+        items = [("ppt", item) for item in request.ppt_requests]
+        items += [("word", item) for item in request.word_requests]
+        counters = {"ppt": 0, "word": 0}
+        for kind, item in items:
+            result = {"kind": kind, "index": counters[kind]}
+            counters[kind] += 1
+            try:
+                task_id = await job_manager.submit(kind, item.model_dump())
+                result.update(success=True, data={"task_id": task_id, "status": "queued"})
+            except QueueFullError as e:
+                result.update(success=False, error=f"任务队列已满，请稍后重试: {str(e)}")
+            results.append(result)
+    else:
+        counters = {"ppt": 0, "word": 0}
+        for kind, item, outcome in await generate_batch_service_async(request):
+            result = {"kind": kind, "index": counters[kind]}
+            counters[kind] += 1
+            if isinstance(outcome, Exception):
+                result.update(success=False, error=str(outcome))
+            else:
+                result.update(success=True, data=_build_file_result(outcome, item.userId))
+            results.append(result)
+
+    succeeded = sum(1 for result in results if result["success"])
+    action = "提交" if request.as_job else "生成"
+    return {
+        "success": True,
+        "message": f"批量{action}完成: 成功 {succeeded}/{total}",
+        "data": {"results": results},
+    }
+
+
+async def _submit_job(kind: str, request) -> str:
+    """提交后台任务，队列已满时返回503"""
+    try:
+        return await job_manager.submit(kind, request.model_dump())
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=f"任务队列已满，请稍后重试: {str(e)}")
+
+
+async def handle_ppt_job_submission(request: GeneratePPTRequest):
+    """
+    提交PPT生成任务接口（异步）
+
+    请求立即返回202和任务ID，PPT在后台工作池中生成，
+    之后通过 GET /jobs/{task_id} 查询任务状态，完成后再调用 /download 下载文件。
+
+    Args:
+        request (GeneratePPTRequest): PPT生成请求参数
+
+    Returns:
+        dict: 任务提交结果
+            - success (bool): 固定为True
+            - message (str): 任务提交确认消息
+            - data.task_id (str): 唯一任务标识符
+            - data.status (str): 任务状态，固定为"queued"
+
+    Raises:
+        HTTPException: 当任务队列已满时抛出503错误
+
+    Example:
+        POST /generate/ppt/async
+        {
+            "userId": "user123",
+            "content": "PPT内容",
+            ...
+        }
+
+        Response (202):
+        {
+            "success": true,
+            "message": "PPT任务已提交，正在后台处理",
+            "data": {"task_id": "uuid-string", "status": "queued"}
+        }
+    """
+    task_id = await _submit_job("ppt", request)
+    return {
+        "success": True,
+        "message": "PPT任务已提交，正在后台处理",
+        "data": {"task_id": task_id, "status": "queued"},
+    }
+
+
+async def handle_word_job_submission(request: GenerateWordRequest):
+    """
+    提交Word文档生成任务接口（异步）
+
+    请求立即返回202和任务ID，Word文档在后台工作池中生成，
+    之后通过 GET /jobs/{task_id} 查询任务状态，完成后再调用 /download 下载文件。
+
+    Args:
+        request (GenerateWordRequest): Word文档生成请求参数
+
+    Returns:
+        dict: 任务提交结果，格式同 :func:`handle_ppt_job_submission`
+
+    Raises:
+        HTTPException: 当任务队列已满时抛出503错误
+    """
+    task_id = await _submit_job("word", request)
+    return {
+        "success": True,
+        "message": "Word任务已提交，正在后台处理",
+        "data": {"task_id": task_id, "status": "queued"},
+    }
+
+
+async def handle_job_status(task_id: str):
+    """
+    查询任务状态接口
+
+    根据任务ID查询后台任务的执行状态和结果信息，任务状态保存在SQLite中，服务重启后仍可查询。
+
+    Args:
+        task_id (str): 任务的唯一标识符，由提交接口返回
+
+    Returns:
+        dict: 任务状态信息
+            - status (str): 任务状态 ("queued" | "processing" | "completed" | "failed")
+            - message (str): 状态描述信息
+            - result (dict | None): 完成后包含 fullPath、userId、filename
+
+    Raises:
+        HTTPException: 当任务ID不存在时抛出404错误
+
+    Example:
+        GET /jobs/uuid-string
+
+        Response (completed):
+        {
+            "success": true,
+            "data": {
+                "task_id": "uuid-string",
+                "kind": "ppt",
+                "status": "completed",
+                "message": "文件生成成功",
+                "result": {"fullPath": "/path/to/file.pptx", "userId": "user123", "filename": "file.pptx"},
+                ...
+            }
+        }
+    """
+    job = await job_manager.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    job.pop("payload", None)
+    return {"success": True, "data": job}
+
+
+def _format_sse(event: dict) -> str:
+    """将进度事件格式化为SSE消息"""
+    return f"event: {event['stage']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+
+async def _job_event_stream(job: dict):
+    task_id = job["task_id"]
+    if not progress_broker.has_events(task_id) and job["status"] in TERMINAL_STAGES:
+        # 服务重启前结束的任务（或事件已过期），只推送最终状态
+        yield _format_sse(
+            {
+                "task_id": task_id,
+                "stage": job["status"],
+                "time": job["updated_at"],
+                "message": job["message"],
+                "result": job["result"],
+            }
+        )
+        return
+
+    async for event in progress_broker.subscribe(
+        task_id, keepalive=JOB_CONFIG["sse_keepalive_seconds"]
+    ):
+        if event is None:
+            yield ": keep-alive\n\n"
+        else:
+            yield _format_sse(event)
+
+
+async def handle_job_events(task_id: str):
+    """
+    任务进度推送接口（Server-Sent Events）
+
+    提交异步任务后订阅该接口，服务端按阶段实时推送事件，任务完成或失败后自动关闭连接，
+    前端无需轮询 GET /jobs/{task_id}。连接建立时会先回放该任务已发生的事件。
+
+    事件阶段 (event字段):
+        queued, processing, llm_started, tokens_received (流式生成时按字符数节流),
+        llm_finished, parsed, slide_rendered (PPT每页一次), saved, completed, failed
+
+    Args:
+        task_id (str): 任务的唯一标识符，由提交接口返回
+
+    Returns:
+        StreamingResponse: text/event-stream 响应
+
+    Raises:
+        HTTPException: 当任务ID不存在时抛出404错误
+
+    Example:
+        GET /jobs/uuid-string/events
+
+        Response:
+        event: queued
+        data: {"task_id": "uuid-string", "stage": "queued", "time": 1730000000.0}
+
+        event: slide_rendered
+        data: {"task_id": "uuid-string", "stage": "slide_rendered", "time": 1730000003.2, "slide": 1, "title": "主標題"}
+        ...
+    """
+    job = await job_manager.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return StreamingResponse(
+        _job_event_stream(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def handle_file_download(
+    request: Request, userID: str = "666", filename: str = "test.pptx"
+):
     """
     文件下载接口（带默认参数）
 
     下载用户生成的文件，支持通过查询参数指定用户ID和文件名，提供默认值。
+    响应按扩展名设置正确的MIME类型，并带有基于内容哈希的强ETag：
+    - If-None-Match / If-Modified-Since 命中时返回304，不重复传输文件
+    - 支持 Range / If-Range，可断点续传（206）
 
     Args:
+        request (Request): 原始请求，用于读取条件请求头
         userID (str, optional): 用户ID，默认为"666"
         filename (str, optional): 文件名，默认为"test.pptx"
 
@@ -186,4 +558,28 @@ async def handle_file_download(userID: str = "666", filename: str = "test.pptx")
 
         Response: 文件下载流
     """
-    return await download_file_service(userID, filename)
+    return await download_file_service(userID, filename, request.headers)
+
+
+async def handle_metrics():
+    """
+    Prometheus指标接口
+
+    以Prometheus文本格式导出：
+    - 各生成阶段（llm、convert、parse、render、serialize、publish、total等）的耗时直方图，
+      以及最近样本的 p50/p95/p99
+    - 各阶段失败次数、合并请求数
+    - LLM请求耗时、排队耗时、首个文本片段耗时，响应缓存命中、重试和各后端状态
+    - 后台任务队列长度和结束数
+
+    Example:
+        GET /metrics
+
+        Response:
+        aifilegen_stage_duration_seconds_bucket{pipeline="ppt",stage="llm",le="5"} 3
+        aifilegen_stage_duration_seconds_recent{pipeline="ppt",stage="llm",quantile="0.95"} 4.2
+        ...
+    """
+    return Response(
+        metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,254 @@
+"""
+异步任务队列模块
+提交生成任务后立即返回任务ID，由有界工作池在后台执行，任务状态持久化到本地SQLite文件
+
+SQLite读写（WAL模式，synchronous=NORMAL）都通过 asyncio.to_thread 执行，提交和查询不会阻塞事件循环
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from FileRequestServer.config import JOB_CONFIG
+from FileRequestServer.metrics import metrics_registry
+from FileRequestServer.progress import bind_job, progress_broker, unbind_job
+from FileRequestServer.structured_logging import get_logger
+
+# 任务状态: "queued" | "processing" | "completed" | "failed"
+UNFINISHED_STATUSES = ("queued", "processing")
+
+logger = get_logger(__name__)
+
+
+_finished_jobs = metrics_registry.counter(
+    "jobs_finished_total", "后台任务结束数（按类型和结果）", ("kind", "status")
+)
+
+
+class QueueFullError(Exception):
+    """排队任务数量已达上限"""
+
+
+class JobStore:
+    """基于SQLite的任务状态存储，可在多线程中安全使用（方法是同步的，事件循环中应放到线程池执行）"""
+
+    def __init__(self, db_path: str):
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            # WAL模式下 NORMAL 只在检查点时fsync，断电最多丢失最近的提交，不会损坏数据库
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    message TEXT,
+                    payload TEXT NOT NULL,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "attempts" not in columns:
+                # 旧版本创建的数据库没有 attempts 列
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            self._conn.commit()
+
+    def create(self, job_id: str, kind: str, payload: Dict[str, Any], message: str):
+        """新建任务记录"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, message, payload, result, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, "queued", message, json.dumps(payload, ensure_ascii=False), None, now, now),
+            )
+            self._conn.commit()
+
+    def update(
+        self,
+        job_id: str,
+        status: str,
+        message: str,
+        result: Optional[Dict[str, Any]] = None,
+    ):
+        """更新任务状态"""
+        result_json = json.dumps(result, ensure_ascii=False) if result is not None else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, result = ?, updated_at = ? WHERE job_id = ?",
+                (status, message, result_json, time.time(), job_id),
+            )
+            self._conn.commit()
+
+    def start_attempt(self, job_id: str, message: str) -> int:
+        """把任务标记为处理中并累加执行次数，返回累加后的次数"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, message = ?, attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                ("processing", message, time.time(), job_id),
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return row["attempts"] if row else 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_dict(row) if row else None
+
+    def list_unfinished(self) -> List[Dict[str, Any]]:
+        """列出所有未完成的任务（按提交时间排序），用于重启后恢复"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                UNFINISHED_STATUSES,
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            "task_id": row["job_id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "message": row["message"],
+            "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+            "attempts": row["attempts"],
+        }
+
+
+# 任务执行函数：接收提交时的请求参数，返回写入任务结果的字典
+JobRunner = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobManager:
+    """
+    有界工作池
+
+    任务先写入SQLite再放入内存队列，固定数量的worker协程从队列中取任务执行，
+    因此即使有大量任务排队，也只会有max_workers个任务同时占用生成资源。
+    每次开始执行都会累加任务的执行次数；重启时已执行 max_attempts 次仍未完成的任务
+    （例如每次都让进程崩溃的请求）标记为失败，不再重新排队。
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        runners: Dict[str, JobRunner],
+        max_workers: int = JOB_CONFIG["max_workers"],
+        max_queue_size: int = JOB_CONFIG["max_queue_size"],
+        max_attempts: int = JOB_CONFIG["max_attempts"],
+    ):
+        self.store = store
+        self.runners = runners
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self.max_attempts = max_attempts
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self):
+        """启动worker并恢复上次未完成的任务"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        for job in await asyncio.to_thread(self.store.list_unfinished):
+            if self.max_attempts and job["attempts"] >= self.max_attempts:
+                message = f"任务已执行 {job['attempts']} 次仍未完成，不再重试"
+                await asyncio.to_thread(self.store.update, job["task_id"], "failed", message)
+                progress_broker.publish(job["task_id"], "failed", message=message)
+                _finished_jobs.inc(kind=job["kind"], status="failed")
+                logger.error("❌ 任务多次执行未完成，标记为失败", task_id=job["task_id"], attempts=job["attempts"])
+                continue
+            # 重启前正在处理的任务重新排队
+            await asyncio.to_thread(self.store.update, job["task_id"], "queued", "服务重启，任务已重新排队")
+            progress_broker.publish(job["task_id"], "queued")
+            self._queue.put_nowait(job["task_id"])
+        if self._queue.qsize():
+            logger.info("🔄 已恢复未完成的任务", count=self._queue.qsize())
+        self._workers = [
+            asyncio.create_task(self._worker()) for _ in range(self.max_workers)
+        ]
+
+    async def stop(self):
+        """停止所有worker，未完成的任务保留在SQLite中等待下次启动"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, kind: str, payload: Dict[str, Any]) -> str:
+        """提交任务，返回任务ID"""
+        if kind not in self.runners:
+            raise ValueError(f"未知的任务类型: {kind}")
+        if self._queue is None:
+            raise RuntimeError("任务队列尚未启动")
+        if self.max_queue_size and self._queue.qsize() >= self.max_queue_size:
+            raise QueueFullError(f"排队任务已达上限 {self.max_queue_size}")
+
+        job_id = str(uuid.uuid4())
+        await asyncio.to_thread(self.store.create, job_id, kind, payload, "任务已提交到队列")
+        progress_broker.publish(job_id, "queued")
+        self._queue.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """查询任务状态"""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    def stats(self) -> Dict[str, int]:
+        """当前排队的任务数和worker数量"""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len(self._workers),
+        }
+
+    async def _worker(self):
+        assert self._queue is not None
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None or job["status"] not in UNFINISHED_STATUSES:
+            return
+        await asyncio.to_thread(self.store.start_attempt, job_id, "正在生成文件...")
+        progress_broker.publish(job_id, "processing")
+        token = bind_job(job_id)
+        try:
+            result = await self.runners[job["kind"]](job["payload"])
+            await asyncio.to_thread(self.store.update, job_id, "completed", "文件生成成功", result)
+            progress_broker.publish(job_id, "completed", result=result)
+            _finished_jobs.inc(kind=job["kind"], status="completed")
+            logger.info("任务完成", kind=job["kind"])
+        except Exception as e:
+            await asyncio.to_thread(self.store.update, job_id, "failed", f"文件生成失败: {str(e)}")
+            progress_broker.publish(job_id, "failed", message=str(e))
+            _finished_jobs.inc(kind=job["kind"], status="failed")
+            logger.error("后台任务失败", kind=job["kind"], error=str(e), exc_info=True)
+        finally:
+            unbind_job(token)
@@ -0,0 +1,210 @@
+"""
+LLM响应缓存模块
+以完整消息、模型和请求参数的哈希为键，缓存模型响应（内存LRU层 + 磁盘层）
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from FileRequestServer.config import LLM_CACHE_CONFIG
+
+
+def make_cache_key(messages: Any, model: str, params: Dict[str, Any]) -> str:
+    """根据消息、模型和参数生成内容寻址的缓存键"""
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    两级缓存：内存层按字节数做LRU淘汰，磁盘层按TTL过期并在超出容量时删除最旧的文件
+
+    磁盘命中会回填内存层。所有方法都是线程安全的。
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_CACHE_CONFIG["enabled"],
+        memory_max_bytes: int = LLM_CACHE_CONFIG["memory_max_bytes"],
+        disk_enabled: bool = LLM_CACHE_CONFIG["disk_enabled"],
+        disk_dir: str = LLM_CACHE_CONFIG["disk_dir"],
+        disk_max_bytes: int = LLM_CACHE_CONFIG["disk_max_bytes"],
+        ttl_seconds: float = LLM_CACHE_CONFIG["ttl_seconds"],
+    ):
+        self.enabled = enabled
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_enabled = disk_enabled
+        self.disk_dir = os.path.abspath(disk_dir)
+        self.disk_max_bytes = disk_max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        # key -> (value, 过期时间)
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: Optional[int] = None  # 首次写入时统计
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，未命中或已过期时返回None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                self._memory_remove(key)
+
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["disk_hits"] += 1
+            self._memory_put(key, value, now + self.ttl_seconds)
+        return value
+
+    def put(self, key: str, value: str):
+        """写入缓存"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._memory_put(key, value, time.time() + self.ttl_seconds)
+            self._stats["writes"] += 1
+        self._disk_put(key, value)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中等计数以及当前占用"""
+        with self._lock:
+            return {
+                **self._stats,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes or 0,
+            }
+
+    # ---- 内存层（调用方持有锁） ----
+
+    def _memory_put(self, key: str, value: str, expires_at: float):
+        # 先移除旧值：新值放不进内存层时，也不能继续返回同一键的旧值
+        if key in self._memory:
+            self._memory_remove(key)
+        size = len(value.encode("utf-8"))
+        if size > self.memory_max_bytes:
+            return
+        self._memory[key] = (value, expires_at)
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes:
+            oldest = next(iter(self._memory))
+            self._memory_remove(oldest)
+            self._stats["memory_evictions"] += 1
+
+    def _memory_remove(self, key: str):
+        value, _ = self._memory.pop(key)
+        self._memory_bytes -= len(value.encode("utf-8"))
+
+    # ---- 磁盘层 ----
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if not self.disk_enabled:
+            return None
+        path = self._disk_path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl_seconds <= now:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _disk_put(self, key: str, value: str):
+        if not self.disk_enabled:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再原子替换，避免并发读到半个文件
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(value)
+        new_size = os.path.getsize(tmp_path)
+        # 覆盖已有条目时只计入大小差值
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan_disk_bytes()
+            else:
+                self._disk_bytes += new_size - old_size
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._evict_disk()
+
+    def _scan_disk_files(self):
+        files = []
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def _scan_disk_bytes(self) -> int:
+        return sum(size for _, size, _ in self._scan_disk_files())
+
+    def _evict_disk(self):
+        """删除过期文件，并按修改时间从旧到新删除直到降到容量的90%"""
+        now = time.time()
+        files = sorted(self._scan_disk_files())
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        evicted = 0
+        for mtime, size, path in files:
+            if total <= target and mtime + self.ttl_seconds > now:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["disk_evictions"] += evicted
+
+
+# 进程内共享的响应缓存
+response_cache = LLMResponseCache()
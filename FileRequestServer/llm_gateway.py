@@ -0,0 +1,583 @@
+"""
+LLM网关模块
+进程内共享的OpenAI兼容客户端，PPT和Word生成器都通过这里调用大模型
+
+所有异步请求都运行在网关自己的事件循环线程上，因此：
+- 同一个AsyncOpenAI客户端（及其httpx连接池）可以被FastAPI事件循环、线程池中的同步代码和命令行脚本同时复用
+- FastAPI中可以直接 await :func:`achat_completion`，不需要 asyncio.to_thread
+- 未显式指定 base_url 的调用由 :data:`llm_router` 在配置的多个后端之间选择，每个后端有独立的RPM/TPM额度和自适应并发上限
+- 失败的调用按 :data:`retry_policy` 退避重试；要求JSON输出的调用会校验结果，格式错误同样重试
+- 传入 token_budget 的调用按预算设置 max_tokens，并用响应的 usage 校准 :data:`token_accountant` 的估算
+- 响应 usage 中命中服务商前缀缓存的提示词token数计入 llm_cached_prompt_tokens_total，
+  请求耗时和首个文本片段耗时按是否命中（prefix_cache 标签）分别统计
+"""
+import asyncio
+import importlib.util
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Coroutine, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+
+from FileRequestServer.config import LLM_CLIENT_CONFIG, OPENAI_CONFIG
+from FileRequestServer.llm_cache import make_cache_key, response_cache
+from FileRequestServer.llm_limiter import estimate_request_tokens
+from FileRequestServer.llm_retry import (
+    MalformedResponseError,
+    retry_policy,
+    validate_json_content,
+)
+from FileRequestServer.llm_router import llm_router
+from FileRequestServer.metrics import metrics_registry
+from FileRequestServer.progress import bind_job, current_job_id
+from FileRequestServer.structured_logging import bind_request, current_request_id, get_logger
+from FileRequestServer.token_budget import TokenBudget, token_accountant
+
+T = TypeVar("T")
+
+logger = get_logger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+_async_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+_sync_clients: Dict[Tuple[str, str], OpenAI] = {}
+
+_llm_request_duration = metrics_registry.histogram(
+    "llm_request_duration_seconds",
+    "单次上游LLM请求耗时（秒，不含排队和重试等待）",
+    ("backend", "mode", "prefix_cache"),
+)
+_llm_queue_wait = metrics_registry.histogram(
+    "llm_queue_wait_seconds", "LLM请求在限流器中排队的耗时（秒）", ("backend",)
+)
+_llm_first_token = metrics_registry.histogram(
+    "llm_first_token_seconds", "流式请求收到首个文本片段的耗时（秒）", ("backend", "prefix_cache")
+)
+_llm_prompt_tokens = metrics_registry.counter(
+    "llm_prompt_tokens_total", "上游报告的提示词token数", ("backend",)
+)
+_llm_cached_prompt_tokens = metrics_registry.counter(
+    "llm_cached_prompt_tokens_total", "上游报告的命中前缀缓存的提示词token数", ("backend",)
+)
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """获取（必要时启动）网关事件循环线程"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever, name="llm-gateway", daemon=True
+            )
+            thread.start()
+            _loop = loop
+    return _loop
+
+
+async def _in_caller_context(request_id: Optional[str], job_id: Optional[str], coro: Coroutine[Any, Any, T]) -> T:
+    """
+    在网关循环的任务中恢复调用方的请求ID和任务ID
+
+    run_coroutine_threadsafe 创建的任务使用网关线程的上下文，不会复制调用方的contextvars；
+    这里设置的值只属于该任务，不影响其他请求
+    """
+    bind_request(request_id)
+    bind_job(job_id)
+    return await coro
+
+
+def _submit(coro: Coroutine[Any, Any, T], loop: asyncio.AbstractEventLoop):
+    wrapped = _in_caller_context(current_request_id(), current_job_id(), coro)
+    return asyncio.run_coroutine_threadsafe(wrapped, loop)
+
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    """在网关事件循环上执行协程并阻塞等待结果（供同步代码调用）"""
+    return _submit(coro, _get_loop()).result()
+
+
+async def run_async(coro: Coroutine[Any, Any, T]) -> T:
+    """在网关事件循环上执行协程，并在调用方的事件循环中等待结果"""
+    loop = _get_loop()
+    if asyncio.get_running_loop() is loop:
+        return await coro
+    return await asyncio.wrap_future(_submit(coro, loop))
+
+
+def _http_client_kwargs() -> Dict[str, Any]:
+    """根据配置构建httpx连接池参数"""
+    http2 = LLM_CLIENT_CONFIG.get("http2", False)
+    if http2 and importlib.util.find_spec("h2") is None:
+        logger.warning("⚠️ 未安装 h2 库，LLM客户端回退到HTTP/1.1")
+        http2 = False
+    return {
+        "limits": httpx.Limits(
+            max_connections=LLM_CLIENT_CONFIG["max_connections"],
+            max_keepalive_connections=LLM_CLIENT_CONFIG["max_keepalive_connections"],
+            keepalive_expiry=LLM_CLIENT_CONFIG["keepalive_expiry"],
+        ),
+        "http2": http2,
+        "timeout": httpx.Timeout(LLM_CLIENT_CONFIG["timeout"]),
+    }
+
+
+def _client_key(base_url: Optional[str], api_key: Optional[str]) -> Tuple[str, str]:
+    return (base_url or OPENAI_CONFIG["base_url"], api_key or OPENAI_CONFIG["api_key"])
+
+
+def get_async_client(
+    base_url: Optional[str] = None, api_key: Optional[str] = None
+) -> AsyncOpenAI:
+    """获取共享的AsyncOpenAI客户端（只能在网关事件循环上使用）"""
+    key = _client_key(base_url, api_key)
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                base_url=key[0],
+                api_key=key[1],
+                max_retries=0,  # 重试由 retry_policy 统一处理
+                http_client=DefaultAsyncHttpxClient(**_http_client_kwargs()),
+            )
+            _async_clients[key] = client
+    return client
+
+
+def get_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> OpenAI:
+    """获取共享的同步OpenAI客户端（带连接池，供需要直接使用SDK的代码）"""
+    key = _client_key(base_url, api_key)
+    with _lock:
+        client = _sync_clients.get(key)
+        if client is None:
+            client = OpenAI(
+                base_url=key[0],
+                api_key=key[1],
+                http_client=DefaultHttpxClient(**_http_client_kwargs()),
+            )
+            _sync_clients[key] = client
+    return client
+
+
+def _is_cacheable(response: ChatCompletion) -> bool:
+    """只缓存正常结束且有内容的响应（被截断的输出不缓存）"""
+    return bool(
+        response.choices
+        and response.choices[0].message.content
+        and response.choices[0].finish_reason == "stop"
+    )
+
+
+async def _cache_lookup(cache_key: Optional[str], use_cache: bool) -> Optional[ChatCompletion]:
+    if cache_key is None or not use_cache:
+        return None
+    cached = await asyncio.to_thread(response_cache.get, cache_key)
+    return ChatCompletion.model_validate_json(cached) if cached is not None else None
+
+
+async def _cache_store(cache_key: Optional[str], response: ChatCompletion):
+    if cache_key is not None and _is_cacheable(response):
+        await asyncio.to_thread(response_cache.put, cache_key, response.model_dump_json())
+
+
+def _expects_json(params: Dict[str, Any]) -> bool:
+    response_format = params.get("response_format")
+    return isinstance(response_format, dict) and response_format.get("type") == "json_object"
+
+
+def cached_prompt_tokens(usage: Any) -> Optional[int]:
+    """
+    响应 usage 中命中服务商前缀缓存的提示词token数，服务商未报告时返回None
+
+    兼容 OpenAI（prompt_tokens_details.cached_tokens）、Moonshot（cached_tokens）
+    和 DeepSeek（prompt_cache_hit_tokens）的字段
+    """
+    if usage is None:
+        return None
+    details = getattr(usage, "prompt_tokens_details", None)
+    for value in (
+        getattr(details, "cached_tokens", None),
+        getattr(usage, "cached_tokens", None),
+        getattr(usage, "prompt_cache_hit_tokens", None),
+    ):
+        if value is not None:
+            return int(value)
+    return None
+
+
+def _record_prompt_cache(backend: str, usage: Any) -> str:
+    """记录提示词和前缀缓存命中的token数，返回耗时指标的 prefix_cache 标签（hit / miss / unknown）"""
+    prompt_tokens = getattr(usage, "prompt_tokens", None) if usage is not None else None
+    if prompt_tokens:
+        _llm_prompt_tokens.inc(prompt_tokens, backend=backend)
+    cached = cached_prompt_tokens(usage)
+    if cached is None:
+        return "unknown"
+    if cached:
+        _llm_cached_prompt_tokens.inc(cached, backend=backend)
+        logger.debug("⚡ 命中前缀缓存", backend=backend, cached_tokens=cached, prompt_tokens=prompt_tokens)
+    return "hit" if cached else "miss"
+
+
+def _stream_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """流式请求要求在最后一个片段中返回 usage（用于校准预算和统计前缀缓存命中）"""
+    if not LLM_CLIENT_CONFIG.get("stream_include_usage") or "stream_options" in params:
+        return params
+    return {**params, "stream_options": {"include_usage": True}}
+
+
+def _finish_reason(response: ChatCompletion) -> Optional[str]:
+    return response.choices[0].finish_reason if response.choices else None
+
+
+def _budget_params(params: Dict[str, Any], token_budget: Optional[TokenBudget]) -> Dict[str, Any]:
+    """按预算设置 max_tokens；每次尝试时重新读取，输出被截断后的重试会使用放大后的值"""
+    if token_budget is None or token_budget.max_tokens is None:
+        return params
+    return {**params, "max_tokens": token_budget.max_tokens}
+
+
+async def _create_chat_completion(
+    messages: List[Dict[str, Any]],
+    model: Optional[str],
+    base_url: Optional[str],
+    api_key: Optional[str],
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+    **params: Any,
+) -> ChatCompletion:
+    requested_model = model
+    model = model or OPENAI_CONFIG["model_path"]
+    # 预算给出的 max_tokens 不计入缓存键
+    cache_key = make_cache_key(messages, model, params) if response_cache.enabled else None
+    cached = await _cache_lookup(cache_key, use_cache)
+    if cached is not None:
+        return cached
+
+    max_tokens = _budget_params(params, token_budget).get("max_tokens")
+
+    async def _attempt() -> Tuple[str, ChatCompletion]:
+        request_params = _budget_params(params, token_budget)
+        estimated_tokens = estimate_request_tokens(messages, request_params.get("max_tokens"))
+        # 每次尝试（包括重试和对冲）都重新选择后端
+        async with llm_router.route(requested_model, base_url, api_key) as (backend, routed_model):
+            client = get_async_client(backend.base_url, backend.api_key)
+            queued_at = time.perf_counter()
+            async with backend.limiter.slot(estimated_tokens) as permit:
+                started = time.perf_counter()
+                _llm_queue_wait.observe(started - queued_at, backend=backend.name)
+                response = await client.chat.completions.create(
+                    model=routed_model,
+                    messages=messages,
+                    stream=False,
+                    **request_params,
+                )
+                _llm_request_duration.observe(
+                    time.perf_counter() - started,
+                    backend=backend.name,
+                    mode="single",
+                    prefix_cache=_record_prompt_cache(backend.name, response.usage),
+                )
+                permit.record_usage(response.usage)
+        if token_budget is not None and _finish_reason(response) == "length":
+            # 截断导致的格式错误会重试，重试时使用放大后的 max_tokens
+            token_accountant.record_truncation(token_budget, request_params.get("max_tokens"))
+        if _expects_json(params) and response.choices:
+            validate_json_content(response.choices[0].message.content)
+        return routed_model, response
+
+    # 对冲时两个尝试可能落在不同后端，由返回值带出实际响应的模型
+    routed_model, response = await retry_policy.run(
+        _attempt,
+        key=(model, max_tokens),
+        hedge=True,
+        can_hedge=llm_router.has_spare_capacity,
+    )
+    # 只用最终返回的响应校准（对冲时两个尝试都可能拿到响应），按实际响应的模型记录，
+    # 备用后端的用量不影响主模型的估算
+    token_accountant.observe(routed_model, messages, response.usage, _finish_reason(response), token_budget)
+    # 缓存键按请求的模型计算，其他模型的响应不写入，避免之后命中时拿到另一个模型的输出
+    if routed_model == model:
+        await _cache_store(cache_key, response)
+    return response
+
+
+async def achat_completion(
+    messages: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+    **params: Any,
+) -> ChatCompletion:
+    """
+    异步调用chat.completions接口
+
+    Args:
+        messages (List[Dict[str, Any]]): 对话消息
+        model (Optional[str]): 模型名称，默认使用 OPENAI_CONFIG["model_path"]
+        base_url (Optional[str]): API地址，默认使用 OPENAI_CONFIG["base_url"]
+        api_key (Optional[str]): API密钥，默认使用 OPENAI_CONFIG["api_key"]
+        use_cache (bool): 是否读取响应缓存；为False时跳过缓存直接请求模型，新结果仍会写回缓存
+        token_budget (Optional[TokenBudget]): 由 token_accountant.plan 得到的预算，用于设置 max_tokens 并校准估算
+        **params: 其余透传给 chat.completions.create 的参数（temperature、response_format等）
+
+    Returns:
+        ChatCompletion: 模型响应
+    """
+    return await run_async(
+        _create_chat_completion(messages, model, base_url, api_key, use_cache, token_budget, **params)
+    )
+
+
+def chat_completion(
+    messages: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+    **params: Any,
+) -> ChatCompletion:
+    """同步调用chat.completions接口，参数同 :func:`achat_completion`"""
+    return run_sync(
+        _create_chat_completion(messages, model, base_url, api_key, use_cache, token_budget, **params)
+    )
+
+
+_STREAM_END = object()
+
+
+async def _pump_stream(
+    emit: Callable[[Any], None],
+    messages: List[Dict[str, Any]],
+    model: Optional[str],
+    base_url: Optional[str],
+    api_key: Optional[str],
+    use_cache: bool,
+    token_budget: Optional[TokenBudget],
+    params: Dict[str, Any],
+):
+    """
+    在网关事件循环上执行流式请求，通过 emit 依次交出文本片段、异常和结束标记 _STREAM_END
+
+    emit 必须是线程安全的，调用方在其他线程或事件循环中消费
+    """
+    resolved_model = model or OPENAI_CONFIG["model_path"]
+    try:
+        cache_key = (
+            make_cache_key(messages, resolved_model, params)
+            if response_cache.enabled
+            else None
+        )
+        cached = await _cache_lookup(cache_key, use_cache)
+        if cached is not None:
+            emit(cached.choices[0].message.content)
+            return
+
+        parts: List[str] = []
+        finish_reason = None
+        usage = None
+        served_model = resolved_model
+        request_params = _budget_params(params, token_budget)
+        estimated_tokens = estimate_request_tokens(messages, request_params.get("max_tokens"))
+        stream_params = _stream_params(request_params)
+
+        async def _attempt():
+            nonlocal finish_reason, usage, served_model
+            async with llm_router.route(model, base_url, api_key) as (backend, routed_model):
+                served_model = routed_model
+                client = get_async_client(backend.base_url, backend.api_key)
+                queued_at = time.perf_counter()
+                # 整个流式响应期间都占用并发名额
+                async with backend.limiter.slot(estimated_tokens) as permit:
+                    started = time.perf_counter()
+                    _llm_queue_wait.observe(started - queued_at, backend=backend.name)
+                    stream = await client.chat.completions.create(
+                        model=routed_model,
+                        messages=messages,
+                        stream=True,
+                        **stream_params,
+                    )
+                    first_token = None
+                    async for chunk in stream:
+                        if getattr(chunk, "usage", None):
+                            usage = chunk.usage
+                            permit.record_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        if chunk.choices[0].delta.content:
+                            if not parts:
+                                first_token = time.perf_counter() - started
+                                permit.record_first_token()
+                            parts.append(chunk.choices[0].delta.content)
+                            emit(chunk.choices[0].delta.content)
+                        finish_reason = chunk.choices[0].finish_reason or finish_reason
+                    # usage 在最后一个片段中返回，流结束后才能确定是否命中前缀缓存
+                    prefix_cache = _record_prompt_cache(backend.name, usage)
+                    if first_token is not None:
+                        _llm_first_token.observe(first_token, backend=backend.name, prefix_cache=prefix_cache)
+                    _llm_request_duration.observe(
+                        time.perf_counter() - started,
+                        backend=backend.name,
+                        mode="stream",
+                        prefix_cache=prefix_cache,
+                    )
+
+        # 已经有文本交给调用方后不能再重试，也不做对冲
+        await retry_policy.run(
+            _attempt,
+            key=(resolved_model, request_params.get("max_tokens"), "stream"),
+            should_retry=lambda exc: not parts,
+        )
+        token_accountant.observe(
+            served_model, messages, usage, finish_reason, token_budget, output_text="".join(parts)
+        )
+        if token_budget is not None and finish_reason == "length":
+            token_accountant.record_truncation(token_budget, request_params.get("max_tokens"))
+        if served_model != resolved_model:
+            # 同非流式调用：其他模型的响应不写入按请求模型计算的缓存键
+            return
+        if _expects_json(params):
+            # 内容已经交给调用方，格式错误时只是不写入缓存
+            try:
+                validate_json_content("".join(parts))
+            except MalformedResponseError:
+                return
+        await _cache_store(
+            cache_key,
+            ChatCompletion(
+                id=f"stream-{int(time.time() * 1000)}",
+                object="chat.completion",
+                created=int(time.time()),
+                model=resolved_model,
+                choices=[
+                    Choice(
+                        index=0,
+                        finish_reason=finish_reason or "stop",
+                        message=ChatCompletionMessage(
+                            role="assistant", content="".join(parts)
+                        ),
+                    )
+                ],
+            ),
+        )
+    except Exception as e:
+        emit(e)
+    finally:
+        emit(_STREAM_END)
+
+
+def stream_chat_completion(
+    messages: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+    **params: Any,
+) -> Iterator[str]:
+    """
+    以流式方式调用chat.completions接口，逐段返回模型输出的文本
+
+    请求在网关事件循环上执行，收到的文本片段通过线程安全队列交给调用方，
+    供同步代码（命令行脚本等）一边迭代一边处理。参数同 :func:`achat_completion`。
+    与非流式调用共用同一份响应缓存，命中时一次性返回完整内容。
+    """
+    chunks: "queue.Queue[Any]" = queue.Queue()
+    future = _submit(
+        _pump_stream(chunks.put, messages, model, base_url, api_key, use_cache, token_budget, params),
+        _get_loop(),
+    )
+    try:
+        while True:
+            item = chunks.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # 调用方提前结束迭代时取消上游请求
+        future.cancel()
+
+
+async def astream_chat_completion(
+    messages: List[Dict[str, Any]],
+    model: Optional[str] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+    **params: Any,
+) -> AsyncIterator[str]:
+    """
+    :func:`stream_chat_completion` 的异步版本，可在FastAPI事件循环中直接 ``async for``
+
+    等待下一个片段时不占用线程池线程，并发的流式请求数不受线程池大小限制
+    """
+    loop = asyncio.get_running_loop()
+    chunks: "asyncio.Queue[Any]" = asyncio.Queue()
+
+    def _emit(item: Any):
+        loop.call_soon_threadsafe(chunks.put_nowait, item)
+
+    future = _submit(
+        _pump_stream(_emit, messages, model, base_url, api_key, use_cache, token_budget, params),
+        _get_loop(),
+    )
+    try:
+        while True:
+            item = await chunks.get()
+            if item is _STREAM_END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        future.cancel()
+
+
+def _collect_llm_metrics():
+    """导出时读取响应缓存、重试和各后端限流/路由的统计"""
+    cache = response_cache.stats()
+    yield (
+        "llm_cache_requests_total", "counter", "LLM响应缓存查询次数",
+        [
+            ({"result": "memory_hit"}, cache["memory_hits"]),
+            ({"result": "disk_hit"}, cache["disk_hits"]),
+            ({"result": "miss"}, cache["misses"]),
+        ],
+    )
+    yield ("llm_cache_memory_bytes", "gauge", "LLM响应缓存内存层占用（字节）", [({}, cache["memory_bytes"])])
+
+    retry = retry_policy.stats()
+    yield (
+        "llm_retries_total", "counter", "LLM调用重试次数（按失败类型）",
+        [({"kind": k[len("retry_"):]}, v) for k, v in sorted(retry.items()) if k.startswith("retry_")],
+    )
+    yield ("llm_retries_exhausted_total", "counter", "重试次数用尽仍失败的LLM调用数", [({}, retry["exhausted"])])
+    yield ("llm_hedges_total", "counter", "发出的对冲请求数", [({}, retry["hedges"])])
+    yield ("llm_hedge_wins_total", "counter", "对冲请求先于原请求返回的次数", [({}, retry["hedge_wins"])])
+
+    backends = llm_router.stats()
+    for name, metric_type, help_text, field in (
+        ("llm_backend_requests_total", "counter", "各后端完成的LLM调用数", "requests"),
+        ("llm_backend_errors_total", "counter", "各后端失败的LLM调用数（429、5xx、超时等）", "errors"),
+        ("llm_backend_rate_limited_total", "counter", "各后端返回429的次数", "overloaded"),
+        ("llm_backend_concurrency_limit", "gauge", "各后端当前的自适应并发上限", "concurrency_limit"),
+        ("llm_backend_in_flight", "gauge", "各后端正在进行的LLM调用数", "in_flight"),
+    ):
+        yield (name, metric_type, help_text, [({"backend": b["name"]}, b[field]) for b in backends])
+    yield (
+        "llm_backend_healthy", "gauge", "后端是否参与路由（1健康/0冷却中）",
+        [({"backend": b["name"]}, 1 if b["healthy"] else 0) for b in backends],
+    )
+
+
+metrics_registry.register_collector(_collect_llm_metrics)
@@ -0,0 +1,238 @@
+"""
+LLM限流模块
+PPT和Word生成共用的上游调用限流：每分钟请求数(RPM)和每分钟token数(TPM)令牌桶 + AIMD自适应并发
+
+超出额度的调用会排队等待，而不是直接失败。所有方法都在网关事件循环上调用。
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from FileRequestServer.config import LLM_RATE_LIMIT_CONFIG
+from FileRequestServer.token_budget import token_accountant
+
+
+def estimate_text_tokens(text: str) -> int:
+    """估算文本的token数（按实际usage校准，见 token_budget）"""
+    return token_accountant.estimate_text(text)
+
+
+def estimate_request_tokens(
+    messages: List[Dict[str, Any]], max_tokens: Optional[int] = None
+) -> int:
+    """估算一次调用消耗的token数（输入估算 + 输出上限）"""
+    prompt_tokens = token_accountant.estimate_messages(messages)
+    return prompt_tokens + (max_tokens or LLM_RATE_LIMIT_CONFIG["default_completion_tokens"])
+
+
+class TokenBucket:
+    """
+    按分钟额度匀速补充的令牌桶
+
+    等待者按到达顺序获取令牌，大请求不会被小请求持续插队饿死。
+    per_minute 为0时不限制。
+    """
+
+    def __init__(self, per_minute: float, capacity: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1):
+        """取出amount个令牌，不足时等待补充"""
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # 超过桶容量的请求按满桶处理，否则永远等不到
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self.rate)
+
+    def adjust(self, amount: float):
+        """按实际用量修正：正数退还多扣的令牌，负数补扣（允许透支，之后的请求会等待更久）"""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + amount)
+
+    @property
+    def available(self) -> float:
+        self._refill()
+        return self._tokens
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD自适应并发上限
+
+    - 调用成功且耗时不超过 latency_target 时加性增加（每次 +1/limit，约每轮满并发 +1）
+    - 流式调用的耗时取决于输出长度，改为按首个token的耗时与 first_token_target 比较
+    - 上游返回429时乘性减少；同一批并发中的多个429只减少一次
+    - 耗时超过目标时保持不变
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_target: float,
+        decrease_factor: float,
+        first_token_target: Optional[float] = None,
+    ):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.first_token_target = first_token_target or latency_target
+        self.decrease_factor = decrease_factor
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._in_flight = 0
+        self._epoch = 0  # 每次减少后递增，之前发出的调用再遇到429不再重复减少
+        self._condition: Optional[asyncio.Condition] = None
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def has_spare_capacity(self) -> bool:
+        return self._in_flight < int(self._limit)
+
+    def _get_condition(self) -> asyncio.Condition:
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    async def acquire(self) -> int:
+        """等待并占用一个并发名额，返回占用时的epoch供 release 使用"""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._in_flight < int(self._limit))
+            self._in_flight += 1
+            return self._epoch
+
+    async def release(
+        self, epoch: int, latency: Optional[float], overloaded: bool, first_token: bool = False
+    ):
+        """释放名额并根据本次调用结果调整并发上限；first_token 表示 latency 是流式调用的首token耗时"""
+        target = self.first_token_target if first_token else self.latency_target
+        condition = self._get_condition()
+        async with condition:
+            self._in_flight -= 1
+            if overloaded:
+                if epoch == self._epoch:
+                    self._limit = max(self.minimum, self._limit * self.decrease_factor)
+                    self._epoch += 1
+            elif latency is not None and latency <= target:
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+            condition.notify_all()
+
+
+class _Permit:
+    """一次调用的限流凭证，调用方拿到响应后可通过 record_usage 回报实际token用量"""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self.started: Optional[float] = None
+        self.first_token_latency: Optional[float] = None
+
+    def record_first_token(self):
+        """流式调用收到首个token时调用，并发上限按首token耗时而不是整个响应的耗时调整"""
+        if self.first_token_latency is None and self.started is not None:
+            self.first_token_latency = time.monotonic() - self.started
+
+    def record_usage(self, usage: Any):
+        total = getattr(usage, "total_tokens", None) if usage is not None else None
+        if total:
+            self.actual_tokens = total
+
+
+def _is_overload_error(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+class LLMRateLimiter:
+    """组合RPM、TPM令牌桶和自适应并发上限"""
+
+    def __init__(self, config: Dict[str, Any] = LLM_RATE_LIMIT_CONFIG):
+        self.enabled = config["enabled"]
+        self.requests = TokenBucket(config["requests_per_minute"])
+        self.tokens = TokenBucket(config["tokens_per_minute"])
+        self.concurrency = AdaptiveConcurrencyLimiter(
+            initial=config["initial_concurrency"],
+            minimum=config["min_concurrency"],
+            maximum=config["max_concurrency"],
+            latency_target=config["latency_target_seconds"],
+            decrease_factor=config["decrease_factor"],
+            first_token_target=config.get("first_token_target_seconds"),
+        )
+        self._stats = {"acquired": 0, "overloaded": 0, "wait_seconds": 0.0}
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int) -> AsyncIterator[_Permit]:
+        """占用一次上游调用的额度，退出时根据结果调整并发上限并修正token用量"""
+        permit = _Permit(estimated_tokens)
+        if not self.enabled:
+            yield permit
+            return
+
+        waited_from = time.monotonic()
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+        epoch = await self.concurrency.acquire()
+        started = time.monotonic()
+        permit.started = started
+        self._stats["acquired"] += 1
+        self._stats["wait_seconds"] += started - waited_from
+
+        overloaded = False
+        latency: Optional[float] = None
+        try:
+            yield permit
+            latency = permit.first_token_latency
+            if latency is None:
+                latency = time.monotonic() - started
+        except BaseException as e:
+            overloaded = _is_overload_error(e)
+            if overloaded:
+                self._stats["overloaded"] += 1
+            raise
+        finally:
+            await self.concurrency.release(
+                epoch, latency, overloaded, first_token=permit.first_token_latency is not None
+            )
+            if permit.actual_tokens is not None:
+                self.tokens.adjust(estimated_tokens - permit.actual_tokens)
+
+    def has_spare_capacity(self) -> bool:
+        """当前是否还有空闲并发名额（用于决定是否值得发出对冲请求）"""
+        return not self.enabled or self.concurrency.has_spare_capacity()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._stats,
+            "concurrency_limit": self.concurrency.limit,
+            "in_flight": self.concurrency.in_flight,
+        }
+
+
+# 进程内共享的限流器（PPT与Word共用同一份额度）
+rate_limiter = LLMRateLimiter()
@@ -0,0 +1,227 @@
+"""
+LLM重试模块
+按错误类型（429、5xx、超时、JSON格式错误）做带抖动的指数退避重试，并支持对冲请求：
+单次调用超过近期耗时的p95仍未返回时再发出一个相同请求，取先返回有效结果的那个
+"""
+import asyncio
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional, TypeVar
+
+import httpx
+import openai
+
+from FileRequestServer.config import LLM_RETRY_CONFIG
+from FileRequestServer.structured_logging import get_logger
+
+T = TypeVar("T")
+
+logger = get_logger(__name__)
+
+
+class MalformedResponseError(ValueError):
+    """要求返回JSON的调用得到了无法解析的内容"""
+
+
+def validate_json_content(content: Optional[str]):
+    """检查模型输出中是否包含可解析的JSON对象，不合法时抛出 MalformedResponseError"""
+    if not content:
+        raise MalformedResponseError("AI响应内容为空")
+    start = content.find("{")
+    end = content.rfind("}") + 1
+    if start == -1 or end == 0:
+        raise MalformedResponseError("AI响应中未找到JSON对象")
+    try:
+        json.loads(content[start:end])
+    except json.JSONDecodeError as e:
+        raise MalformedResponseError(f"AI响应JSON解析失败: {e}") from e
+
+
+def classify_error(exc: BaseException) -> Optional[str]:
+    """
+    将调用异常归类为可重试的错误类型
+
+    Returns:
+        Optional[str]: "rate_limit" | "server_error" | "timeout" | "connection" | "malformed_json"，
+        不可重试（如400、401）时返回None
+    """
+    if isinstance(exc, MalformedResponseError):
+        return "malformed_json"
+    if isinstance(exc, (openai.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    status_code = getattr(exc, "status_code", None)
+    if status_code == 429:
+        return "rate_limit"
+    if isinstance(status_code, int) and status_code >= 500:
+        return "server_error"
+    if isinstance(exc, (openai.APIConnectionError, httpx.TransportError)):
+        return "connection"
+    return None
+
+
+def _retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """读取429/503响应中的 Retry-After 头（秒）"""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class LatencyWindow:
+    """按调用类型保存最近的成功耗时，用于计算对冲延迟"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples: Dict[Hashable, Deque[float]] = {}
+
+    def record(self, key: Hashable, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.size)).append(seconds)
+
+    def percentile(self, key: Hashable, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class RetryPolicy:
+    """重试与对冲策略，配置见 LLM_RETRY_CONFIG"""
+
+    def __init__(self, config: Dict[str, Any] = LLM_RETRY_CONFIG):
+        self.config = config
+        self.latency = LatencyWindow(config["latency_window"])
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = {
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "exhausted": 0,
+        }
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] = self._stats.get(name, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        """第attempt次失败后的等待时间：full jitter 指数退避，且不少于服务端要求的 Retry-After"""
+        cap = min(self.config["max_delay"], self.config["base_delay"] * (2 ** (attempt - 1)))
+        delay = random.uniform(0, cap)
+        retry_after = _retry_after_seconds(exc)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.config["max_delay"]))
+        return delay
+
+    def hedge_delay(self, key: Hashable) -> Optional[float]:
+        """对冲延迟：该类调用近期耗时的p95；样本不足时使用默认值，未启用对冲时返回None"""
+        if not self.config["hedge_enabled"]:
+            return None
+        delay = self.latency.percentile(
+            key, self.config["hedge_percentile"], self.config["hedge_min_samples"]
+        )
+        if delay is None:
+            delay = self.config["hedge_default_delay"]
+        return max(delay, self.config["hedge_min_delay"])
+
+    async def _hedged(
+        self,
+        call: Callable[[], Awaitable[T]],
+        key: Hashable,
+        can_hedge: Callable[[], bool],
+    ) -> T:
+        async def _timed() -> T:
+            started = time.monotonic()
+            result = await call()
+            self.latency.record(key, time.monotonic() - started)
+            return result
+
+        first = asyncio.ensure_future(_timed())
+        tasks = [first]
+        try:
+            delay = self.hedge_delay(key)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done and can_hedge():
+                    self._count("hedges")
+                    tasks.append(asyncio.ensure_future(_timed()))
+
+            pending = set(tasks)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            assert error is not None
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        key: Hashable = None,
+        hedge: bool = False,
+        can_hedge: Callable[[], bool] = lambda: True,
+        should_retry: Callable[[BaseException], bool] = lambda exc: True,
+    ) -> T:
+        """
+        执行调用，失败时按错误类型决定是否退避重试
+
+        Args:
+            call (Callable[[], Awaitable[T]]): 发起一次上游调用的协程工厂
+            key (Hashable): 调用类型，用于统计耗时分布
+            hedge (bool): 是否允许对冲（流式调用不能对冲）
+            can_hedge (Callable[[], bool]): 触发对冲前的检查，例如上游并发是否还有余量
+            should_retry (Callable[[BaseException], bool]): 额外的重试条件，例如流式输出是否已经开始
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if hedge:
+                    return await self._hedged(call, key, can_hedge)
+                started = time.monotonic()
+                result = await call()
+                self.latency.record(key, time.monotonic() - started)
+                return result
+            except Exception as e:
+                kind = classify_error(e)
+                if kind is None or not should_retry(e):
+                    raise
+                if attempt >= self.config["max_attempts"]:
+                    self._count("exhausted")
+                    raise
+                delay = self.backoff(attempt, e)
+                self._count("retries")
+                self._count(f"retry_{kind}")
+                logger.warning(
+                    "⚠️ LLM调用失败，退避后重试",
+                    kind=kind,
+                    delay=round(delay, 2),
+                    next_attempt=attempt + 1,
+                    error=str(e),
+                )
+                await asyncio.sleep(delay)
+
+
+# 进程内共享的重试策略
+retry_policy = RetryPolicy()
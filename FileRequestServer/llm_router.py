@@ -0,0 +1,217 @@
+"""
+LLM多后端路由模块
+在多个OpenAI兼容后端之间选择最快的健康后端：每个后端维护耗时和错误率的滚动EWMA，
+按权重和当前负载打分，并各自拥有独立的限流器（并发上限即该后端的 max_concurrency）
+"""
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from FileRequestServer.config import LLM_RATE_LIMIT_CONFIG, LLM_ROUTER_CONFIG, OPENAI_CONFIG
+from FileRequestServer.llm_limiter import LLMRateLimiter, rate_limiter
+from FileRequestServer.llm_retry import classify_error
+from FileRequestServer.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class Backend:
+    """
+    一个OpenAI兼容后端
+
+    settings 为包含 base_url、api_key、model_path 的字典；主后端直接引用 OPENAI_CONFIG，
+    因此环境变量覆盖和运行时修改都会生效。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        settings: Dict[str, Any],
+        weight: float = 1.0,
+        limiter: Optional[LLMRateLimiter] = None,
+    ):
+        self.name = name
+        self.settings = settings
+        self.weight = weight if weight > 0 else 1.0
+        self.limiter = limiter or LLMRateLimiter()
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.unhealthy_until = 0.0
+        self.active = 0  # 已路由到该后端、尚未结束的调用数（包括在限流器中排队的）
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def base_url(self) -> str:
+        return self.settings["base_url"]
+
+    @property
+    def api_key(self) -> str:
+        return self.settings["api_key"]
+
+    @property
+    def model(self) -> str:
+        return self.settings["model_path"]
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def has_spare_capacity(self) -> bool:
+        return self.active < self.limiter.concurrency.limit or not self.limiter.enabled
+
+    def score(self, fallback_latency: float) -> float:
+        """预期耗时 ×（进行中的调用数 + 1）/ 权重，越小越优先；没有样本的后端按最快的已知后端估算"""
+        latency = self.latency_ewma if self.latency_ewma is not None else fallback_latency
+        return latency * (self.active + 1) / self.weight
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "model": self.model,
+            "weight": self.weight,
+            "latency_ewma": self.latency_ewma,
+            "error_ewma": round(self.error_ewma, 4),
+            "healthy": self.is_healthy(time.time()),
+            "active": self.active,
+            "requests": self.requests,
+            "errors": self.errors,
+            **self.limiter.stats(),
+        }
+
+
+def _backend_limiter(backend_config: Dict[str, Any]) -> LLMRateLimiter:
+    """为附加后端构建限流器：默认值取自 LLM_RATE_LIMIT_CONFIG，可由后端的 rate_limit 覆盖"""
+    config = {**LLM_RATE_LIMIT_CONFIG, **backend_config.get("rate_limit", {})}
+    if backend_config.get("max_concurrency"):
+        config["max_concurrency"] = backend_config["max_concurrency"]
+        config["initial_concurrency"] = min(config["initial_concurrency"], config["max_concurrency"])
+    return LLMRateLimiter(config)
+
+
+class LLMRouter:
+    """按EWMA耗时、错误率、权重和负载在多个后端之间选择"""
+
+    def __init__(self, config: Dict[str, Any] = LLM_ROUTER_CONFIG):
+        self.alpha = config["ewma_alpha"]
+        self.error_threshold = config["error_threshold"]
+        self.cooldown_seconds = config["cooldown_seconds"]
+        self._lock = threading.Lock()
+        self.backends: List[Backend] = [
+            Backend("primary", OPENAI_CONFIG, config["primary_weight"], rate_limiter)
+        ]
+        for item in config["backends"]:
+            self.backends.append(
+                Backend(item["name"], item, item.get("weight", 1.0), _backend_limiter(item))
+            )
+        # 调用方显式指定 base_url 时使用的临时后端，不参与路由
+        self._pinned: Dict[Tuple[str, str], Backend] = {}
+
+    def _pinned_backend(self, base_url: str, api_key: Optional[str]) -> Backend:
+        key = (base_url, api_key or OPENAI_CONFIG["api_key"])
+        with self._lock:
+            for backend in self.backends:
+                if backend.base_url == base_url and (api_key is None or backend.api_key == api_key):
+                    backend.active += 1
+                    return backend
+            backend = self._pinned.get(key)
+            if backend is None:
+                settings = {"base_url": key[0], "api_key": key[1], "model_path": OPENAI_CONFIG["model_path"]}
+                backend = Backend(base_url, settings)
+                self._pinned[key] = backend
+            backend.active += 1
+        return backend
+
+    def select(self) -> Backend:
+        """
+        选择当前最优的后端并占用一个进行中计数（由 record 释放）
+
+        优先有空闲并发名额的健康后端；全部不健康时选冷却最早结束的。
+        """
+        now = time.time()
+        with self._lock:
+            healthy = [b for b in self.backends if b.is_healthy(now)]
+            if not healthy:
+                backend = min(self.backends, key=lambda b: b.unhealthy_until)
+                backend.active += 1
+                return backend
+            available = [b for b in healthy if b.has_spare_capacity()] or healthy
+            known = [b.latency_ewma for b in available if b.latency_ewma is not None]
+            fallback = min(known) if known else 1.0
+            backend = min(available, key=lambda b: b.score(fallback))
+            backend.active += 1
+            return backend
+
+    def has_spare_capacity(self) -> bool:
+        """是否有健康后端还有空闲并发名额"""
+        now = time.time()
+        return any(
+            b.is_healthy(now) and b.has_spare_capacity() for b in self.backends
+        )
+
+    def record(self, backend: Backend, latency: Optional[float], error: Optional[BaseException]):
+        """记录一次调用结果；只有429、5xx、超时等上游问题计入错误率"""
+        failed = error is not None and classify_error(error) is not None
+        with self._lock:
+            backend.active -= 1
+            backend.requests += 1
+            if failed:
+                backend.errors += 1
+            backend.error_ewma += self.alpha * ((1.0 if failed else 0.0) - backend.error_ewma)
+            if latency is not None:
+                if backend.latency_ewma is None:
+                    backend.latency_ewma = latency
+                else:
+                    backend.latency_ewma += self.alpha * (latency - backend.latency_ewma)
+            if (
+                failed
+                and backend.error_ewma >= self.error_threshold
+                and backend.is_healthy(time.time())
+                and len(self.backends) > 1
+            ):
+                backend.unhealthy_until = time.time() + self.cooldown_seconds
+                logger.warning(
+                    "⚠️ LLM后端错误率过高，暂停使用",
+                    backend=backend.name,
+                    error_rate=round(backend.error_ewma, 3),
+                    cooldown_seconds=self.cooldown_seconds,
+                )
+
+    @asynccontextmanager
+    async def route(
+        self,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[Backend, str]]:
+        """
+        选择后端并记录本次调用的耗时和结果
+
+        显式指定 base_url 时固定使用该地址；显式指定的 model 只对主后端或固定后端生效，
+        其他后端使用各自配置的模型。
+
+        Yields:
+            Tuple[Backend, str]: (后端, 实际使用的模型名)
+        """
+        if base_url:
+            backend = self._pinned_backend(base_url, api_key)
+        else:
+            backend = self.select()
+        resolved_model = model if model and (base_url or backend.name == "primary") else backend.model
+
+        started = time.monotonic()
+        try:
+            yield backend, resolved_model
+        except BaseException as e:
+            self.record(backend, None, e)
+            raise
+        self.record(backend, time.monotonic() - started, None)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [backend.snapshot() for backend in self.backends]
+
+
+# 进程内共享的路由器
+llm_router = LLMRouter()
@@ -0,0 +1,259 @@
+"""
+进程内指标收集模块
+各生成阶段的耗时直方图（含近期 p50/p95/p99）、计数器，以及 Prometheus 文本格式的导出
+"""
+import bisect
+import logging
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from FileRequestServer.config import METRICS_CONFIG
+
+# structured_logging 依赖本模块，这里直接使用标准库logging避免循环导入；
+# 挂在 aifilegen 日志器下，仍由结构化日志的处理器输出
+logger = logging.getLogger("aifilegen.FileRequestServer.metrics")
+
+LabelValues = Tuple[str, ...]
+# 采集函数返回 (指标名, 类型, 说明, [(标签字典, 数值), ...])
+CollectedMetric = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape_label_value(str(v))}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _header(name: str, metric_type: str, help_text: str) -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = _header(self.name, "counter", self.help_text)
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(
+                f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}"
+            )
+        return lines
+
+
+class _HistogramSeries:
+    def __init__(self, bucket_count: int, window: int):
+        self.bucket_counts = [0] * bucket_count
+        self.count = 0
+        self.total = 0.0
+        self.recent: Deque[float] = deque(maxlen=window)
+
+
+class Histogram:
+    """
+    耗时直方图
+
+    导出累计桶计数（可在Prometheus中用 histogram_quantile 聚合），
+    同时保留最近 window 个样本，直接导出 p50/p95/p99 供单机查看。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = METRICS_CONFIG["buckets"],
+        window: int = METRICS_CONFIG["quantile_window"],
+        quantiles: Sequence[float] = METRICS_CONFIG["quantiles"],
+    ):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.window = window
+        self.quantiles = tuple(quantiles)
+        self._lock = threading.Lock()
+        self._series: Dict[LabelValues, _HistogramSeries] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _HistogramSeries(len(self.buckets), self.window)
+            if index < len(self.buckets):
+                series.bucket_counts[index] += 1
+            series.count += 1
+            series.total += value
+            series.recent.append(value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """统计 with 块的耗时（秒），块内抛出异常时不记录"""
+        started = time.perf_counter()
+        yield
+        self.observe(time.perf_counter() - started, **labels)
+
+    def percentile(self, q: float, **labels: str) -> Optional[float]:
+        """最近样本的分位数（q 取 0~1），没有样本时返回None"""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            samples = sorted(series.recent) if series else []
+        return _percentile(samples, q)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            snapshot = [
+                (key, list(s.bucket_counts), s.count, s.total, sorted(s.recent))
+                for key, s in sorted(self._series.items())
+            ]
+
+        lines = _header(self.name, "histogram", self.help_text)
+        for key, bucket_counts, count, total, _ in snapshot:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket_labels = {**labels, "le": _format_value(bound)}
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f'{self.name}_bucket{_format_labels({**labels, "le": "+Inf"})} {count}')
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+
+        # 近期分位数单独作为gauge导出，避免与直方图类型混在同一个指标名下
+        quantile_name = f"{self.name}_recent"
+        lines += _header(
+            quantile_name, "gauge",
+            f"{self.help_text}（最近{self.window}个样本的分位数）",
+        )
+        for key, _, _, _, samples in snapshot:
+            labels = dict(zip(self.labelnames, key))
+            for q in self.quantiles:
+                value = _percentile(samples, q)
+                if value is not None:
+                    q_labels = {**labels, "quantile": _format_value(q)}
+                    lines.append(f"{quantile_name}{_format_labels(q_labels)} {_format_value(value)}")
+        return lines
+
+
+def _percentile(sorted_samples: List[float], q: float) -> Optional[float]:
+    if not sorted_samples:
+        return None
+    index = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[index]
+
+
+class MetricsRegistry:
+    """指标注册表：自有的计数器/直方图，加上导出时才读取的外部统计（缓存、重试、限流等）"""
+
+    def __init__(self, prefix: str = METRICS_CONFIG["prefix"]):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, object] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(name, lambda full: Counter(full, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        return self._get_or_create(name, lambda full: Histogram(full, help_text, labelnames, **kwargs))
+
+    def _get_or_create(self, name: str, factory):
+        full_name = f"{self.prefix}_{name}"
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = factory(full_name)
+            return metric
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        """注册一个在导出时调用的采集函数，名称会自动加上前缀"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines += metric.render()
+        for collector in collectors:
+            try:
+                collected = list(collector())
+            except Exception as e:
+                logger.warning("⚠️ 指标采集失败: %s", e)
+                continue
+            for name, metric_type, help_text, samples in collected:
+                full_name = f"{self.prefix}_{name}"
+                lines += _header(full_name, metric_type, help_text)
+                for labels, value in samples:
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# 进程内共享的注册表
+metrics_registry = MetricsRegistry()
+
+stage_duration = metrics_registry.histogram(
+    "stage_duration_seconds", "生成流程各阶段耗时（秒）", ("pipeline", "stage")
+)
+stage_failures = metrics_registry.counter(
+    "stage_failures_total", "生成流程各阶段失败次数", ("pipeline", "stage", "error")
+)
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str) -> Iterator[None]:
+    """
+    统计一个流程阶段的耗时
+
+    成功时计入 stage_duration_seconds，抛出异常时计入 stage_failures_total（按异常类型区分）。
+    同步代码和 async 函数中的 with 块都可以使用。
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        stage_failures.inc(pipeline=pipeline, stage=stage, error=type(e).__name__)
+        raise
+    stage_duration.observe(time.perf_counter() - started, pipeline=pipeline, stage=stage)
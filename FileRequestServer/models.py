@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 
 class GeneratePPTRequest(BaseModel):
@@ -8,6 +8,11 @@ class GeneratePPTRequest(BaseModel):
     expected_slides: Optional[int] = 4
     design_number: Optional[int] = 5
     custom_filename: Optional[str] = "test"
+    generation_mode: Optional[str] = None  # "single" | "stream" | "outline"，为空时使用 PPT_CONFIG 配置
+    chinese_variant: Optional[str] = None  # "s2hk" | "s2tw" | "none"，简繁转换目标，为空时使用 TEXT_CONVERSION_CONFIG 配置
+    bypass_cache: bool = False  # 跳过LLM响应缓存，强制重新生成
+    return_file: bool = False  # 为True时直接在响应中返回文件内容，无需再调用 /download
+    persist: bool = True  # return_file 为True时是否仍在响应发送后把文件保存到 Output/<userId>/
 
 
 class GenerateWordRequest(BaseModel):
@@ -78,3 +83,14 @@ float PID_AntiWindup(float r, float y, float u_max)
 （完）
     """
     custom_filename: Optional[str] = "test"
+    generation_mode: Optional[str] = None  # "single" | "parallel"，为空时使用 WORD_CONFIG 配置
+    chinese_variant: Optional[str] = None  # "s2hk" | "s2tw" | "none"，简繁转换目标，为空时使用 TEXT_CONVERSION_CONFIG 配置
+    bypass_cache: bool = False  # 跳过LLM响应缓存，强制重新生成
+    return_file: bool = False  # 为True时直接在响应中返回文件内容，无需再调用 /download
+    persist: bool = True  # return_file 为True时是否仍在响应发送后把文件保存到 Output/<userId>/
+
+
+class GenerateBatchRequest(BaseModel):
+    ppt_requests: List[GeneratePPTRequest] = []
+    word_requests: List[GenerateWordRequest] = []
+    as_job: bool = False  # 为True时每个条目提交为后台任务，只返回任务ID
@@ -0,0 +1,110 @@
+"""
+任务进度事件模块
+生成流程通过 :func:`report_progress` 上报阶段事件，SSE接口订阅后实时推送给前端
+
+当前任务ID保存在contextvars中，asyncio.to_thread 会复制上下文，
+因此线程池中的生成代码无需传递任务ID即可上报进度。
+"""
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from FileRequestServer.config import JOB_CONFIG
+
+# 任务结束的阶段，订阅者收到后停止
+TERMINAL_STAGES = ("completed", "failed")
+
+_current_job_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_job_id", default=None
+)
+
+
+class ProgressBroker:
+    """进程内的进度事件分发器，保存每个任务的事件历史，供晚到的订阅者回放"""
+
+    def __init__(self, max_finished_jobs: int = JOB_CONFIG["progress_history_jobs"]):
+        self.max_finished_jobs = max_finished_jobs
+        self._lock = threading.Lock()
+        self._events: Dict[str, List[Dict[str, Any]]] = {}
+        self._subscribers: Dict[
+            str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]
+        ] = {}
+        self._finished: Deque[str] = deque()
+
+    def publish(self, job_id: str, stage: str, **data: Any):
+        """发布事件，可在任意线程中调用"""
+        event = {"task_id": job_id, "stage": stage, "time": time.time(), **data}
+        with self._lock:
+            self._events.setdefault(job_id, []).append(event)
+            subscribers = list(self._subscribers.get(job_id, []))
+            if stage in TERMINAL_STAGES:
+                self._finished.append(job_id)
+                while len(self._finished) > self.max_finished_jobs:
+                    self._events.pop(self._finished.popleft(), None)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def has_events(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._events
+
+    async def subscribe(
+        self, job_id: str, keepalive: Optional[float] = None
+    ) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        订阅任务事件：先回放历史事件，再推送新事件，收到结束阶段后停止
+
+        若设置了keepalive，超过该秒数没有新事件时产出None，调用方可借此发送心跳。
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            history = list(self._events.get(job_id, []))
+            self._subscribers.setdefault(job_id, []).append((loop, queue))
+        try:
+            for event in history:
+                yield event
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["stage"] in TERMINAL_STAGES:
+                    return
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(job_id, [])
+                if (loop, queue) in subscribers:
+                    subscribers.remove((loop, queue))
+                if not subscribers:
+                    self._subscribers.pop(job_id, None)
+
+
+progress_broker = ProgressBroker()
+
+
+def bind_job(job_id: Optional[str]) -> contextvars.Token:
+    """将当前上下文绑定到任务ID，之后的 report_progress 都会归属到该任务"""
+    return _current_job_id.set(job_id)
+
+
+def unbind_job(token: contextvars.Token):
+    _current_job_id.reset(token)
+
+
+def current_job_id() -> Optional[str]:
+    return _current_job_id.get()
+
+
+def report_progress(stage: str, **data: Any):
+    """上报当前任务的进度阶段；不在任务上下文中（如同步接口、命令行）时忽略"""
+    job_id = _current_job_id.get()
+    if job_id is not None:
+        progress_broker.publish(job_id, stage, **data)
@@ -1,17 +1,51 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from AIFileGenerator.FileRequestServer.models import GeneratePPTRequest, GenerateWordRequest
+from AIFileGenerator.FileRequestServer.models import (
+    GenerateBatchRequest,
+    GeneratePPTRequest,
+    GenerateWordRequest,
+)
 from AIFileGenerator.FileRequestServer.handlers import (
     handle_mock_test,
     handle_ppt_generation,
     handle_word_generation,
+    handle_batch_generation,
     handle_file_download,
+    handle_ppt_job_submission,
+    handle_word_job_submission,
+    handle_job_status,
+    handle_job_events,
+    handle_metrics,
     copy_docs_to_wrapper,
+    job_manager,
 )
+from FileRequestServer.config import TEMPLATE_CONFIG
+from FileRequestServer.structured_logging import RequestIdMiddleware
+from FileRequestServer.template_registry import preload_templates
+from FileRequestServer.text_converter import text_converter
+from AIFileGenerator.PPTGenProject.PPT_Gen_functions import preload_layout_indexes
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 预加载模板，避免首个请求读取模板文件
+    if TEMPLATE_CONFIG["preload_on_startup"]:
+        preload_templates()
+        preload_layout_indexes()
+        # 预先加载默认变体的简繁转换词典（约0.15秒），避免首个请求等待
+        text_converter.preload()
+    # 启动后台任务工作池，并恢复上次未完成的任务
+    await job_manager.start()
+    yield
+    await job_manager.stop()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# 为每个请求分配请求ID，生成流程中的日志都会带上该ID
+app.add_middleware(RequestIdMiddleware)
 
 # fastapi dev .\FileRequestServer\server_main.py --host 0.0.0.0 --port 8000
 
@@ -34,7 +68,43 @@ async def generate_Word(request: GenerateWordRequest):
     return await handle_word_generation(request)
 
 
-@app.get("/download")
+@app.post("/generate/batch")
+@copy_docs_to_wrapper(handle_batch_generation)
+async def generate_Batch(request: GenerateBatchRequest):
+    return await handle_batch_generation(request)
+
+
+@app.post("/generate/ppt/async", status_code=202)
+@copy_docs_to_wrapper(handle_ppt_job_submission)
+async def submit_PPT_job(request: GeneratePPTRequest):
+    return await handle_ppt_job_submission(request)
+
+
+@app.post("/generate/word/async", status_code=202)
+@copy_docs_to_wrapper(handle_word_job_submission)
+async def submit_Word_job(request: GenerateWordRequest):
+    return await handle_word_job_submission(request)
+
+
+@app.get("/jobs/{task_id}")
+@copy_docs_to_wrapper(handle_job_status)
+async def get_job_status(task_id: str):
+    return await handle_job_status(task_id)
+
+
+@app.get("/jobs/{task_id}/events")
+@copy_docs_to_wrapper(handle_job_events)
+async def stream_job_events(task_id: str):
+    return await handle_job_events(task_id)
+
+
+@app.api_route("/download", methods=["GET", "HEAD"])
 @copy_docs_to_wrapper(handle_file_download)
-async def download_file(userID: str = "666", filename: str = "test.pptx"):
-    return await handle_file_download(userID, filename)
+async def download_file(request: Request, userID: str = "666", filename: str = "test.pptx"):
+    return await handle_file_download(request, userID, filename)
+
+
+@app.get("/metrics", tags=["Monitoring"])
+@copy_docs_to_wrapper(handle_metrics)
+async def get_metrics():
+    return await handle_metrics()
@@ -1,144 +1,311 @@
 import asyncio
 import os
 import sys
-import shutil
+from email.utils import formatdate, parsedate_to_datetime
 
 from fastapi import HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from AIFileGenerator.FileRequestServer.models import GeneratePPTRequest
-from AIFileGenerator.PPTGenProject.PPT_Gen_functions import generate_ppt_from_user_input
-from AIFileGenerator.WordGenProject.Word_Gen_functions import generate_wordDoc_from_user_input
+from AIFileGenerator.FileRequestServer.models import GenerateBatchRequest, GeneratePPTRequest
+from FileRequestServer.config import BATCH_CONFIG, DOWNLOAD_CONFIG
+from FileRequestServer.file_metadata import FileMetadata, file_metadata_cache
+from FileRequestServer.generated_file import GeneratedFile
+from FileRequestServer.metrics import metrics_registry, stage_timer
+from FileRequestServer.progress import report_progress
+from FileRequestServer.singleflight import SingleFlight
+from FileRequestServer.structured_logging import get_logger
+from FileRequestServer.text_converter import resolve_chinese_variant
+from AIFileGenerator.PPTGenProject.PPT_Gen_functions import (
+    generate_ppt_from_user_input,
+    generate_ppt_from_user_input_async,
+    resolve_ppt_options,
+)
+from AIFileGenerator.WordGenProject.Word_Gen_functions import (
+    generate_wordDoc_from_user_input,
+    generate_wordDoc_from_user_input_async,
+    resolve_word_generation_mode,
+)
+
+logger = get_logger(__name__)
 
 
 async def mock_generate_file_service(request: GeneratePPTRequest):
-    """在Output文件夹创建txt文件并返回绝对路径"""
-    fullPath = await mock_generate_file_from_user_input(
+    """在用户输出目录创建txt文件并返回绝对路径"""
+    generated = await mock_generate_file_from_user_input(
         user_input=request.content,
         userId=request.userId,
         expected_slides=request.expected_slides,
         custom_filename=request.custom_filename,
         design_number=request.design_number,
     )
-    # 在Output文件夹下根据userId创建子文件夹
+    return await asyncio.to_thread(save_to_user_dir, generated, request.userId)
+
+
+async def mock_generate_file_from_user_input(
+    user_input, userId, expected_slides, custom_filename, design_number
+) -> GeneratedFile:
+    """在内存中生成txt文件"""
+    file_name = f"{custom_filename}.txt" if custom_filename else f"mock_{userId}.txt"
+    text = (
+        f"User ID: {userId}\n"
+        f"Content: {user_input}\n"
+        f"Expected Slides: {expected_slides}\n"
+        f"Design Number: {design_number}\n"
+    )
+    # sleep to simulate processing time
+    await asyncio.sleep(5)
+    return GeneratedFile(file_name, text.encode("utf-8"))
+
+
+def get_user_output_dir(userId: str) -> str:
+    """获取用户专属输出目录 Output/<userId>/ 的绝对路径"""
     output_base_dir = os.path.join(os.path.dirname(__file__), "..", "Output")
-    user_output_dir = os.path.join(output_base_dir, request.userId)
-    os.makedirs(user_output_dir, exist_ok=True)
+    return os.path.abspath(os.path.join(output_base_dir, userId))
 
-    # 获取原文件名并构建新的目标路径
-    original_filename = os.path.basename(fullPath)
-    new_fullPath = os.path.join(user_output_dir, original_filename)
-    new_fullPath = os.path.abspath(new_fullPath)
 
-    # 移动文件到用户专属目录
-    shutil.move(fullPath, new_fullPath)
+# 文件扩展名对应的指标流程名
+_PIPELINES = {".pptx": "ppt", ".docx": "word"}
 
-    return new_fullPath
 
+def save_to_user_dir(generated: GeneratedFile, userId: str) -> str:
+    """
+    将内存中的生成结果写入 Output/<userId>/ 并返回绝对路径
 
-async def mock_generate_file_from_user_input(
-    user_input, userId, expected_slides, custom_filename, design_number
-):
-    """在Output文件夹创建txt文件并返回绝对路径"""
-    output_dir = os.path.join(os.path.dirname(__file__), "..", "Output")
-    os.makedirs(output_dir, exist_ok=True)
+    先写临时文件再原子替换；同名文件已存在时按 OUTPUT_CONFIG 另存为带版本号的文件名，
+    返回的路径即实际文件名。
+    """
+    with stage_timer(_PIPELINES.get(os.path.splitext(generated.filename)[1], "mock"), "publish"):
+        full_path = generated.save(get_user_output_dir(userId))
+    logger.debug("文件已保存到用户目录", path=full_path, size=len(generated.data))
+    # 内容已在内存中，顺便登记下载用的ETag
+    file_metadata_cache.prime(full_path, generated.data)
+    return full_path
 
-    file_name = f"{custom_filename}.txt" if custom_filename else f"mock_{userId}.txt"
-    file_path = os.path.join(output_dir, file_name)
 
-    with open(file_path, "w", encoding="utf-8") as f:
-        f.write(f"User ID: {userId}\n")
-        f.write(f"Content: {user_input}\n")
-        f.write(f"Expected Slides: {expected_slides}\n")
-        f.write(f"Design Number: {design_number}\n")
-    # sleep to simulate processing time
-    import time
+# 进行中的相同请求只生成一次，每个请求各自得到一份结果
+_ppt_flights = SingleFlight()
+_word_flights = SingleFlight()
+_coalesced_requests = metrics_registry.counter(
+    "coalesced_requests_total", "与进行中的相同请求合并、没有单独生成的请求数", ("pipeline",)
+)
 
-    await asyncio.sleep(5)
-    return os.path.abspath(file_path)
+
+def _normalize_text(text) -> str:
+    """合并键使用的文本归一化：忽略首尾及连续空白的差异"""
+    return " ".join((text or "").split())
+
+
+async def _generate_shared(flights, key, factory, request, pipeline: str) -> GeneratedFile:
+    """加入（或发起）合并的生成，结果按请求的自定义文件名命名"""
+    with stage_timer(pipeline, "total"):
+        async with flights.join(key, factory) as (generated, sole):
+            if not sole:
+                _coalesced_requests.inc(pipeline=pipeline)
+                logger.debug("与进行中的相同请求合并", pipeline=pipeline)
+                report_progress("coalesced")
+            return generated.renamed(request.custom_filename)
 
 
 def generate_ppt_service(request: GeneratePPTRequest) -> str:
-    """生成PPT文件并移动到用户目录"""
-    fullPath = generate_ppt_from_user_input(
-        user_input=request.content,
-        expected_slides=request.expected_slides,
-        custom_filename=request.custom_filename,
-        design_number=request.design_number,
+    """生成PPT文件并保存到用户目录"""
+    with stage_timer("ppt", "total"):
+        generated = generate_ppt_from_user_input(
+            user_input=request.content,
+            expected_slides=request.expected_slides,
+            custom_filename=request.custom_filename,
+            design_number=request.design_number,
+            generation_mode=request.generation_mode,
+            use_cache=not request.bypass_cache,
+            in_memory=True,
+            chinese_variant=request.chinese_variant,
+        )
+    return save_to_user_dir(generated, request.userId)
+
+
+async def generate_ppt_file_service_async(request: GeneratePPTRequest) -> GeneratedFile:
+    """
+    在内存中生成PPT文件，不写磁盘
+
+    内容、页数、模板、生成模式和简繁转换目标都相同的请求同时到达时只生成一次。
+    """
+    key = (
+        _normalize_text(request.content),
+        *resolve_ppt_options(
+            request.expected_slides, request.design_number, request.generation_mode
+        ),
+        resolve_chinese_variant(request.chinese_variant),
+        request.bypass_cache,
     )
 
-    # 在Output文件夹下根据userId创建子文件夹
-    output_base_dir = os.path.join(os.path.dirname(__file__), "..", "Output")
-    user_output_dir = os.path.join(output_base_dir, request.userId)
-    os.makedirs(user_output_dir, exist_ok=True)
+    def _generate():
+        return generate_ppt_from_user_input_async(
+            user_input=request.content,
+            expected_slides=request.expected_slides,
+            custom_filename=request.custom_filename,
+            design_number=request.design_number,
+            generation_mode=request.generation_mode,
+            use_cache=not request.bypass_cache,
+            in_memory=True,
+            chinese_variant=request.chinese_variant,
+        )
 
-    # 获取原文件名并构建新的目标路径
-    original_filename = os.path.basename(fullPath)
-    new_fullPath = os.path.join(user_output_dir, original_filename)
-    new_fullPath = os.path.abspath(new_fullPath)
+    return await _generate_shared(_ppt_flights, key, _generate, request, "ppt")
 
-    # 移动文件到用户专属目录
-    shutil.move(fullPath, new_fullPath)
 
-    return new_fullPath
+async def generate_ppt_service_async(request: GeneratePPTRequest) -> str:
+    """generate_ppt_service 的异步版本，大模型调用不占用线程池"""
+    generated = await generate_ppt_file_service_async(request)
+    return await asyncio.to_thread(save_to_user_dir, generated, request.userId)
 
 
 def generate_word_service(request):
-    """生成Word文档并移动到用户目录"""
-    fullPath = generate_wordDoc_from_user_input(
-        learning_content=request.learning_content,
-        user_requirements=request.user_requirements,
-        custom_filename=request.custom_filename,
+    """生成Word文档并保存到用户目录"""
+    with stage_timer("word", "total"):
+        generated = generate_wordDoc_from_user_input(
+            learning_content=request.learning_content,
+            user_requirements=request.user_requirements,
+            custom_filename=request.custom_filename,
+            use_cache=not request.bypass_cache,
+            in_memory=True,
+            chinese_variant=request.chinese_variant,
+            generation_mode=request.generation_mode,
+        )
+    return save_to_user_dir(generated, request.userId)
+
+
+async def generate_word_file_service_async(request) -> GeneratedFile:
+    """
+    在内存中生成Word文档，不写磁盘
+
+    学习内容、用户要求、生成模式和简繁转换目标都相同的请求同时到达时只生成一次。
+    """
+    key = (
+        _normalize_text(request.learning_content),
+        _normalize_text(request.user_requirements),
+        resolve_word_generation_mode(request.generation_mode),
+        resolve_chinese_variant(request.chinese_variant),
+        request.bypass_cache,
     )
-    # 在Output文件夹下根据userId创建子文件夹
-    output_base_dir = os.path.join(os.path.dirname(__file__), "..", "Output")
-    user_output_dir = os.path.join(output_base_dir, request.userId)
-    os.makedirs(user_output_dir, exist_ok=True)
 
-    # 获取原文件名并构建新的目标路径
-    original_filename = os.path.basename(fullPath)
-    new_fullPath = os.path.join(user_output_dir, original_filename)
-    new_fullPath = os.path.abspath(new_fullPath)
+    def _generate():
+        return generate_wordDoc_from_user_input_async(
+            learning_content=request.learning_content,
+            user_requirements=request.user_requirements,
+            custom_filename=request.custom_filename,
+            use_cache=not request.bypass_cache,
+            in_memory=True,
+            chinese_variant=request.chinese_variant,
+            generation_mode=request.generation_mode,
+        )
 
-    # 移动文件到用户专属目录
-    shutil.move(fullPath, new_fullPath)
+    return await _generate_shared(_word_flights, key, _generate, request, "word")
 
-    return new_fullPath
 
+async def generate_word_service_async(request):
+    """generate_word_service 的异步版本，大模型调用不占用线程池"""
+    generated = await generate_word_file_service_async(request)
+    return await asyncio.to_thread(save_to_user_dir, generated, request.userId)
 
-async def download_file_service(userID: str, filename: str):
+
+async def generate_batch_service_async(request: GenerateBatchRequest) -> list:
+    """
+    并发执行批量生成请求，并发数受 BATCH_CONFIG["max_concurrency"] 限制
+
+    每个条目与单独调用 generate_ppt_service / generate_word_service 的行为一致，
+    单个条目失败不影响其他条目。
+
+    Returns:
+        list: 按 PPT条目、Word条目 顺序排列的结果，每项为 (kind, 请求, 文件路径或异常)
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONFIG["max_concurrency"])
+
+    async def _run(service, item):
+        async with semaphore:
+            try:
+                return await service(item)
+            except Exception as e:
+                logger.error("批量生成条目失败", error=str(e), exc_info=True)
+                return e
+
+    items = [("ppt", generate_ppt_service_async, item) for item in request.ppt_requests]
+    items += [("word", generate_word_service_async, item) for item in request.word_requests]
+    outcomes = await asyncio.gather(*(_run(service, item) for _, service, item in items))
+    return [(kind, item, outcome) for (kind, _, item), outcome in zip(items, outcomes)]
+
+
+def _is_within(path: str, directory: str) -> bool:
+    return path != directory and os.path.commonpath([path, directory]) == directory
+
+
+def _is_not_modified(request_headers, metadata: FileMetadata) -> bool:
+    """根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-None-Match 使用弱比较，且存在时忽略 If-Modified-Since
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or metadata.etag in tags
+
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return int(metadata.stat_result.st_mtime) <= since
+    return False
+
+
+async def download_file_service(userID: str, filename: str, request_headers=None):
     """
     文件下载核心逻辑
 
     根据用户ID和文件名构建文件路径并返回文件下载响应。
+    响应带有基于内容哈希的强ETag和Last-Modified，客户端缓存仍有效时返回304；
+    Range / If-Range 请求由 FileResponse 处理（支持断点续传和分段下载）。
 
     Args:
         userID (str): 用户ID，用于构建用户专属目录路径
         filename (str): 要下载的文件名
+        request_headers (Mapping[str, str] | None): 请求头，用于条件请求
 
     Returns:
-        FileResponse: 文件下载响应，设置适当的媒体类型和文件名
+        Response: 文件下载响应（200/206），或缓存有效时的304响应
 
     Raises:
-        HTTPException: 当文件路径不存在时抛出404错误
+        HTTPException: 当文件路径不存在（或不在用户目录内）时抛出404错误
 
     Note:
         此函数为内部辅助函数，被download_file_with_defaults调用
     """
     file_path = get_user_file_path(userID, filename)
+    # 拒绝通过 ".." 等方式访问用户目录以外的文件
+    if not _is_within(file_path, get_user_output_dir(userID)) or not _is_within(
+        file_path, get_user_output_dir("")
+    ):
+        raise HTTPException(status_code=404, detail="文件不存在")
 
-    if not os.path.exists(file_path):
+    metadata = await asyncio.to_thread(file_metadata_cache.get, file_path)
+    if metadata is None:
         raise HTTPException(status_code=404, detail="文件不存在")
 
+    headers = {
+        "ETag": metadata.etag,
+        "Last-Modified": formatdate(metadata.stat_result.st_mtime, usegmt=True),
+        "Cache-Control": DOWNLOAD_CONFIG["cache_control"],
+    }
+    if request_headers is not None and _is_not_modified(request_headers, metadata):
+        return Response(status_code=304, headers=headers)
+
     return FileResponse(
-        path=file_path, filename=filename, media_type="application/octet-stream"
+        path=file_path,
+        filename=filename,
+        media_type=metadata.media_type,
+        headers=headers,
+        stat_result=metadata.stat_result,
     )
 
 
 def get_user_file_path(userID: str, filename: str):
     """获取用户文件的完整路径"""
-    output_base_dir = os.path.join(os.path.dirname(__file__), "..", "Output")
-    user_output_dir = os.path.join(output_base_dir, userID)
-    file_path = os.path.join(user_output_dir, filename)
-    return os.path.abspath(file_path)
+    return os.path.abspath(os.path.join(get_user_output_dir(userID), filename))
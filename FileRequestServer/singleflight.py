@@ -0,0 +1,87 @@
+"""
+请求合并模块
+相同的生成请求同时到达时只执行一次，其余请求等待并共享同一结果
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+
+class _Flight:
+    def __init__(self, task: "asyncio.Task[Any]"):
+        self.task = task
+        self.participants = 1
+        self.released = 0
+        self.claimed = False  # 唯一参与者已取得结果的所有权
+        self.cleaned = False
+
+
+class SingleFlight:
+    """
+    按键合并进行中的协程调用
+
+    第一个调用者发起实际工作（在独立的Task中执行，调用者断开也不会取消其他等待者），
+    工作完成前到达的相同键调用者直接等待同一结果。工作完成后该键立即移除，之后的调用会重新执行。
+    结果被多个参与者共享时，所有参与者都退出后调用cleanup释放共享结果（例如删除共享的临时文件）；
+    只有一个参与者时由它自行接管结果，不会调用cleanup。
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, _Flight] = {}
+
+    def in_flight(self) -> int:
+        """当前正在执行的不同请求数量"""
+        return len(self._flights)
+
+    @asynccontextmanager
+    async def join(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        cleanup: Optional[Callable[[Any], None]] = None,
+    ) -> AsyncIterator[Tuple[Any, bool]]:
+        """
+        加入（或发起）一次调用
+
+        Yields:
+            Tuple[Any, bool]: (结果, 是否为唯一参与者)；唯一参与者可以直接占用结果而无需复制
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+
+            async def _lead():
+                try:
+                    return await factory()
+                finally:
+                    # 在Task结束前移除，保证结果产生后不会再有新的参与者加入
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+
+            flight = _Flight(asyncio.ensure_future(_lead()))
+            flight.task.add_done_callback(lambda _: self._maybe_cleanup(flight, cleanup))
+            self._flights[key] = flight
+        else:
+            flight.participants += 1
+
+        try:
+            result = await asyncio.shield(flight.task)
+            sole = flight.participants == 1
+            flight.claimed = sole
+            yield result, sole
+        finally:
+            flight.released += 1
+            self._maybe_cleanup(flight, cleanup)
+
+    @staticmethod
+    def _maybe_cleanup(flight: _Flight, cleanup: Optional[Callable[[Any], None]]):
+        if (
+            cleanup is None
+            or flight.cleaned
+            or flight.claimed
+            or not flight.task.done()
+            or flight.released < flight.participants
+        ):
+            return
+        flight.cleaned = True
+        if not flight.task.cancelled() and flight.task.exception() is None:
+            cleanup(flight.task.result())
@@ -0,0 +1,292 @@
+"""
+结构化日志模块
+替代生成流程中的 print()：分级、每行一个JSON对象、自动附带请求ID和任务ID
+
+- 业务代码通过 ``get_logger(__name__)`` 获取日志器，用关键字参数传递字段：
+  ``logger.info("PPT生成成功", path=result_path)``
+- 字段值（含消息）超过 ``max_field_chars`` 时截断，避免整段学习内容或AI响应写入日志
+- AI原始响应等大段内容使用 ``logger.payload()``，仅在DEBUG级别下按比例采样记录
+- 日志记录先放入有界队列，由后台线程格式化并写出，请求线程不会阻塞在stdout上；
+  队列满时丢弃并计入 ``log_records_dropped_total`` 指标
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from FileRequestServer.config import LOGGING_CONFIG
+from FileRequestServer.metrics import metrics_registry
+from FileRequestServer.progress import current_job_id
+
+ROOT_LOGGER_NAME = "aifilegen"
+
+_ADAPTER_KWARGS = ("exc_info", "stack_info", "stacklevel", "extra")
+# 截断嵌套结构时的最大深度和每层最多输出的元素数
+_MAX_DEPTH = 4
+_MAX_ITEMS = 20
+
+_current_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "current_request_id", default=None
+)
+
+_dropped_records = metrics_registry.counter(
+    "log_records_dropped_total", "日志队列已满而被丢弃的日志条数"
+)
+
+# 客户端通过 X-Request-ID 传入的请求ID只接受这些字符，避免日志注入
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,64}$")
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def bind_request(request_id: Optional[str]) -> contextvars.Token:
+    """将当前上下文绑定到请求ID，之后的日志都会带上该ID"""
+    return _current_request_id.set(request_id)
+
+
+def unbind_request(token: contextvars.Token):
+    _current_request_id.reset(token)
+
+
+def current_request_id() -> Optional[str]:
+    return _current_request_id.get()
+
+
+class RequestIdMiddleware:
+    """
+    为每个HTTP请求绑定请求ID（纯ASGI中间件，不缓冲响应，SSE等流式响应不受影响）
+
+    优先使用客户端传入的 X-Request-ID，否则生成新的ID；响应头中回传同一个ID
+    """
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID_PATTERN.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (self.header, request_id.encode("latin-1"))]
+            await send(message)
+
+        token = bind_request(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            unbind_request(token)
+
+
+def truncate_value(value: Any, max_chars: int, depth: int = 0) -> Any:
+    """把字段值转换为可JSON序列化的结构，并截断过长的字符串和过大的容器"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        if depth >= _MAX_DEPTH:
+            return f"<dict: {len(value)} 项>"
+        items = list(value.items())
+        result = {str(k): truncate_value(v, max_chars, depth + 1) for k, v in items[:_MAX_ITEMS]}
+        if len(items) > _MAX_ITEMS:
+            result["..."] = f"+{len(items) - _MAX_ITEMS} 项"
+        return result
+    if isinstance(value, (list, tuple, set)):
+        if depth >= _MAX_DEPTH:
+            return f"<{type(value).__name__}: {len(value)} 项>"
+        items = list(value)
+        result = [truncate_value(v, max_chars, depth + 1) for v in items[:_MAX_ITEMS]]
+        if len(items) > _MAX_ITEMS:
+            result.append(f"... +{len(items) - _MAX_ITEMS} 项")
+        return result
+    text = value if isinstance(value, str) else str(value)
+    if max_chars and len(text) > max_chars:
+        return f"{text[:max_chars]}…(+{len(text) - max_chars} 字符)"
+    return text
+
+
+def _record_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """请求ID、任务ID和业务字段（字段放在 record.fields 中，避免与LogRecord自带属性如 filename 冲突）"""
+    fields = {"request_id": getattr(record, "request_id", None), "job_id": getattr(record, "job_id", None)}
+    fields.update(getattr(record, "fields", None) or {})
+    return fields
+
+
+class _ContextFilter(logging.Filter):
+    """在产生日志的线程中记录请求ID和任务ID（写出在后台线程，无法再读取contextvars）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = _current_request_id.get()
+        if not hasattr(record, "job_id"):
+            record.job_id = current_job_id()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    def __init__(self, max_field_chars: int = LOGGING_CONFIG["max_field_chars"]):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": truncate_value(record.getMessage(), self.max_field_chars),
+        }
+        for key, value in _record_fields(record).items():
+            if value is not None and key not in entry:
+                entry[key] = truncate_value(value, self.max_field_chars)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """便于命令行阅读的单行格式：时间 级别 [请求/任务] 消息 key=value ..."""
+
+    def __init__(self, max_field_chars: int = LOGGING_CONFIG["max_field_chars"]):
+        super().__init__()
+        self.max_field_chars = max_field_chars
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = _record_fields(record)
+        ids = [str(fields[key]) for key in ("request_id", "job_id") if fields[key]]
+        fields.pop("request_id")
+        fields.pop("job_id")
+        parts = [
+            time.strftime("%H:%M:%S", time.localtime(record.created)),
+            record.levelname,
+        ]
+        if ids:
+            parts.append(f"[{'/'.join(ids)}]")
+        parts.append(truncate_value(record.getMessage(), self.max_field_chars))
+        for key, value in fields.items():
+            value = truncate_value(value, self.max_field_chars)
+            parts.append(f"{key}={value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)}")
+        line = " ".join(parts)
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            line = f"{line}\n{record.exc_text}"
+        return line
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """写入有界队列；队列满时丢弃日志并计数，而不是阻塞调用方"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 只合并消息参数、展开异常文本，保留自定义字段供后台线程格式化
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped_records.inc()
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """把关键字参数作为结构化字段传给日志记录"""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _ADAPTER_KWARGS}
+        if fields:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+    def payload(self, msg: str, **fields: Any):
+        """
+        记录AI原始响应等大段内容
+
+        show_ai_response 开启时以INFO级别记录（字段仍会截断）；
+        否则仅在DEBUG级别下按 payload_sample_rate 采样记录
+        """
+        if LOGGING_CONFIG.get("show_ai_response", False):
+            self.info(msg, **fields)
+        elif self.isEnabledFor(logging.DEBUG) and random.random() < LOGGING_CONFIG["payload_sample_rate"]:
+            self.debug(msg, sampled=True, **fields)
+
+
+def _resolve_level() -> int:
+    if LOGGING_CONFIG.get("show_debug_info"):
+        return logging.DEBUG
+    return logging.getLevelName(str(LOGGING_CONFIG.get("level", "INFO")).upper())
+
+
+def setup_logging(stream=None):
+    """配置 aifilegen 日志器（重复调用只生效一次）；首次 get_logger 时会自动调用"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        if LOGGING_CONFIG.get("format", "json") == "text":
+            formatter: logging.Formatter = TextFormatter()
+        else:
+            formatter = JsonFormatter()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(formatter)
+
+        handler = _DroppingQueueHandler(queue.Queue(maxsize=LOGGING_CONFIG["queue_size"]))
+        handler.addFilter(_ContextFilter())
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        root.setLevel(_resolve_level())
+        root.handlers[:] = [handler]
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """停止后台写出线程，写出队列中剩余的日志"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """获取 aifilegen 下的子日志器，如 get_logger(__name__) -> aifilegen.FileRequestServer.handlers"""
+    setup_logging()
+    if name.startswith("AIFileGenerator."):
+        name = name[len("AIFileGenerator."):]
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}"), {})
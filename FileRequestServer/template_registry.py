@@ -0,0 +1,94 @@
+"""
+模板缓存模块
+PPT设计模板和Word模板的文件内容只读取一次并常驻内存，每次请求从内存创建新的实例
+"""
+import os
+import threading
+from io import BytesIO
+from typing import Dict, Iterable, Optional, Tuple
+
+from docxtpl import DocxTemplate
+from pptx import Presentation
+
+from FileRequestServer.config import (
+    PATHS,
+    PPT_CONFIG,
+    TEMPLATE_CONFIG,
+    WORD_CONFIG,
+    get_ppt_template_path,
+)
+from FileRequestServer.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class TemplateRegistry:
+    """按文件路径缓存模板字节内容，可选按修改时间失效"""
+
+    def __init__(self, check_mtime: bool = TEMPLATE_CONFIG["check_mtime"]):
+        self.check_mtime = check_mtime
+        self._lock = threading.Lock()
+        # 绝对路径 -> (读取时的mtime_ns, 文件内容)
+        self._entries: Dict[str, Tuple[int, bytes]] = {}
+
+    def _get_entry(self, path: str) -> Optional[Tuple[int, bytes]]:
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and not self.check_mtime:
+            return entry
+
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if entry is not None and entry[0] == mtime_ns:
+            return entry
+
+        with open(path, "rb") as f:
+            data = f.read()
+        entry = (mtime_ns, data)
+        with self._lock:
+            self._entries[path] = entry
+        return entry
+
+    def get_bytes(self, path: str) -> Optional[bytes]:
+        """获取模板文件内容，文件不存在时返回None"""
+        entry = self._get_entry(path)
+        return entry[1] if entry is not None else None
+
+    def get_version(self, path: str) -> Optional[int]:
+        """获取模板当前内容的版本（读取时的mtime_ns），模板重新加载后版本随之改变；文件不存在时返回None"""
+        entry = self._get_entry(path)
+        return entry[0] if entry is not None else None
+
+    def open_presentation(self, path: str):
+        """从缓存的模板内容创建新的Presentation，模板不存在时返回None"""
+        data = self.get_bytes(path)
+        return Presentation(BytesIO(data)) if data is not None else None
+
+    def open_docx_template(self, path: str) -> Optional[DocxTemplate]:
+        """从缓存的模板内容创建新的DocxTemplate，模板不存在时返回None"""
+        data = self.get_bytes(path)
+        return DocxTemplate(BytesIO(data)) if data is not None else None
+
+    def preload(self, paths: Iterable[str]) -> int:
+        """预加载模板，返回成功加载的数量"""
+        return sum(1 for path in paths if self.get_bytes(path) is not None)
+
+
+template_registry = TemplateRegistry()
+
+
+def get_word_template_path() -> str:
+    """获取默认Word模板文件路径"""
+    return os.path.join(PATHS["word_template_folder"], WORD_CONFIG["default_template"])
+
+
+def preload_templates() -> int:
+    """预加载全部PPT设计模板和默认Word模板"""
+    paths = [get_ppt_template_path(n) for n in PPT_CONFIG["available_designs"]]
+    paths.append(get_word_template_path())
+    loaded = template_registry.preload(paths)
+    logger.info("🎨 已预加载模板", loaded=loaded, total=len(paths))
+    return loaded
@@ -0,0 +1,158 @@
+"""
+简繁转换模块
+在解析模型输出之后，只转换JSON中的字符串值（不转换键和结构），并跳过无需转换的文本：
+
+- 纯ASCII文本（英文、数字、公式）直接返回
+- 不含任何会被该变体改写的字符的文本（已是目标繁体）直接返回
+- 其余字符串去重（标题、选项等经常重复）后拼接，一次转换，避免逐字段调用的开销
+
+每个请求可以指定目标变体（s2hk / s2tw / none），未指定时使用 TEXT_CONVERSION_CONFIG 的默认值。
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+import opencc
+
+from FileRequestServer.config import TEXT_CONVERSION_CONFIG
+
+# "s2hk": 香港繁体；"s2tw": 台湾繁体；"none": 保持模型输出不变
+CHINESE_VARIANTS = ("s2hk", "s2tw", "none")
+
+# 预先逐字检查的范围：基本多文种平面中的非ASCII字符（跳过代理区）；
+# 其他平面的字符（如扩展B以后的汉字）一律视为需要转换
+_SCAN_RANGES = ((0x80, 0xD7FF), (0xE000, 0xFFFF))
+# 批量转换时拼接字符串的分隔符（OpenCC不会改写它；"\x00" 会被当作字符串结尾）
+_SEPARATOR = "\x1f"
+
+
+def resolve_chinese_variant(variant: Optional[str]) -> str:
+    """使用配置的默认值补全目标变体，并检查是否可用"""
+    if not variant:
+        variant = TEXT_CONVERSION_CONFIG["default_variant"]
+    if variant not in CHINESE_VARIANTS:
+        raise ValueError(f"未知的简繁转换变体: {variant}，可用变体: {CHINESE_VARIANTS}")
+    return variant
+
+
+class TextConverter:
+    """
+    进程内共享的简繁转换器
+
+    每个变体只创建一个OpenCC实例（加载词典约需0.15秒），调用时加锁，可在线程池中安全使用。
+    OpenCC的C扩展在转换期间持有GIL，按线程创建实例只会增加初始化开销，不会提高吞吐。
+
+    OpenCC本身很快（每字符约25纳秒），逐字段调用或跨请求缓存的Python开销反而更大，
+    因此 :meth:`convert_data` 收集去重后的字符串，用分隔符拼接后一次转换，再写回原位置。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._converters: Dict[str, Tuple[opencc.OpenCC, threading.Lock, Pattern[str]]] = {}
+
+    def _get(self, variant: str) -> Tuple[opencc.OpenCC, threading.Lock, Pattern[str]]:
+        """获取（必要时创建）变体的OpenCC实例、实例锁和“需要转换的字符”正则"""
+        entry = self._converters.get(variant)
+        if entry is None:
+            with self._lock:
+                entry = self._converters.get(variant)
+                if entry is None:
+                    converter = opencc.OpenCC(variant)
+                    entry = (converter, threading.Lock(), _build_pattern(converter))
+                    self._converters[variant] = entry
+        return entry
+
+    def preload(self, variant: Optional[str] = None):
+        """预先加载变体的OpenCC词典并构建检测正则"""
+        variant = resolve_chinese_variant(variant)
+        if variant != "none":
+            self._get(variant)
+
+    def needs_conversion(self, text: str, variant: Optional[str] = None) -> bool:
+        """文本中是否含有该变体会改写的字符（纯ASCII或已是目标繁体时返回False）"""
+        variant = resolve_chinese_variant(variant)
+        if variant == "none" or text.isascii():
+            return False
+        return self._get(variant)[2].search(text) is not None
+
+    def convert(self, text: str, variant: Optional[str] = None) -> str:
+        """转换一段文本"""
+        if not self.needs_conversion(text, variant):
+            return text
+        converter, lock, _ = self._get(resolve_chinese_variant(variant))
+        with lock:
+            return converter.convert(text)
+
+    def convert_data(self, data: Any, variant: Optional[str] = None, source: Optional[str] = None) -> Any:
+        """
+        转换解析后的JSON数据中的字符串值（原地修改并返回），字典的键保持不变
+
+        Args:
+            data: json.loads 得到的数据
+            variant: 目标变体，为空时使用默认值
+            source: 解析前的原文；提供时先整体检查一次，已是目标繁体或纯ASCII时不再遍历数据
+        """
+        variant = resolve_chinese_variant(variant)
+        if variant == "none":
+            return data
+        if isinstance(data, str):
+            return self.convert(data, variant)
+        if source is not None and not self.needs_conversion(source, variant):
+            return data
+
+        # 原文 -> 所在的 (容器, 键/下标) 列表；重复的标题、选项等只转换一次
+        pending: Dict[str, List[Tuple[Any, Any]]] = {}
+        _collect(data, pending)
+        if not pending:
+            return data
+        texts = list(pending)
+        joined = _SEPARATOR.join(texts)
+        converter, lock, pattern = self._get(variant)
+        if pattern.search(joined) is None:
+            return data
+        with lock:
+            results = converter.convert(joined).split(_SEPARATOR)
+            if len(results) != len(texts):
+                # 个别字符串本身含有分隔符，逐个转换
+                results = [converter.convert(text) for text in texts]
+        for text, result in zip(texts, results):
+            if result != text:
+                for container, key in pending[text]:
+                    container[key] = result
+        return data
+
+
+def _collect(value: Any, pending: Dict[str, List[Tuple[Any, Any]]]):
+    """收集非ASCII字符串值及其所在位置"""
+    if isinstance(value, dict):
+        slots = value.items()
+    elif isinstance(value, list):
+        slots = enumerate(value)
+    else:
+        return
+    for key, item in slots:
+        if isinstance(item, str):
+            if not item.isascii():
+                pending.setdefault(item, []).append((value, key))
+        elif isinstance(item, (dict, list)):
+            _collect(item, pending)
+
+
+def _build_pattern(converter: opencc.OpenCC) -> Pattern[str]:
+    """
+    逐字转换扫描范围内的全部字符，收集会被改写的字符
+
+    不含这些字符的文本视为已是目标繁体。极少数简繁同形、只在词组中才改写的字
+    （如“一只”中的“只”）单独出现时不会被识别，实际文本中通常会伴随其他简体字。
+    """
+    chars = [chr(code) for start, end in _SCAN_RANGES for code in range(start, end + 1)]
+    converted = converter.convert("\n".join(chars)).split("\n")
+    if len(converted) != len(chars):
+        converted = [converter.convert(ch) for ch in chars]
+    changed = "".join(ch for ch, result in zip(chars, converted) if result != ch)
+    # 单个字符类（不用分支），长文本的扫描耗时约为OpenCC转换的三分之一
+    return re.compile(f"[{re.escape(changed)}\\U00010000-\\U0010FFFF]")
+
+
+# 进程内共享的转换器
+text_converter = TextConverter()
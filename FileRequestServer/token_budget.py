@@ -0,0 +1,311 @@
+"""
+Token预算模块
+在本地估算提示词token数，按期望的输出规模确定 max_tokens，并用响应中的 usage 校准估算：
+
+- 提示词：ASCII字符与其他字符（中文等）分别按配置折算，再乘以按模型校准的系数
+  （实际 prompt_tokens / 本地估算值 的EWMA）
+- 输出：按输出类型（kind）的 固定部分 + 每单位 × 单位数（如每页、每题）估算，乘以按 (模型, kind)
+  校准的系数；max_tokens 再乘以安全余量，并受上下文窗口剩余空间限制
+- 上下文窗口连最低输出都放不下时抛出 :class:`TokenBudgetError`；放不下期望输出时
+  由调用方降级（减少页数、改为分块并发生成）
+- 输出被截断（finish_reason=length）时放大该次调用的 max_tokens 供重试使用，并提高对应的校准系数
+- 校准只使用最终返回给调用方的响应：对冲中落选的、因格式错误被重试的响应都不计入
+
+预算通过 llm_gateway 的 token_budget 参数传入，网关负责设置 max_tokens 和回报实际用量；
+max_tokens 不计入响应缓存键，校准导致的预算变化不会让缓存失效。
+"""
+import math
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from FileRequestServer.config import OPENAI_CONFIG, TOKEN_BUDGET_CONFIG
+from FileRequestServer.metrics import metrics_registry
+from FileRequestServer.structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# 模型名称中的上下文窗口后缀，如 moonshot-v1-32k
+_CONTEXT_SUFFIX_PATTERN = re.compile(r"(\d+)k\b", re.IGNORECASE)
+
+_budget_plans = metrics_registry.counter(
+    "llm_budget_plans_total",
+    "token预算规划次数（fit: 放得下期望输出；over: 需要降级；rejected: 提示词超出上下文窗口）",
+    ("kind", "result"),
+)
+_truncated_responses = metrics_registry.counter(
+    "llm_truncated_responses_total", "输出达到 max_tokens 被截断的LLM调用数", ("kind",)
+)
+
+
+class TokenBudgetError(ValueError):
+    """提示词加期望输出超出模型的上下文窗口"""
+
+
+def _resolve_model(model: Optional[str]) -> str:
+    return model or OPENAI_CONFIG["model_path"]
+
+
+def _message_text(message: Any) -> str:
+    content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+    return str(content or "")
+
+
+class TokenBudget:
+    """
+    一次调用的token预算
+
+    max_tokens 为None表示不限制（预算功能关闭）；fit_units 为上下文窗口内能容纳的最大单位数，
+    小于 units 时调用方应降级或调用 :meth:`require_fit` 拒绝请求
+    """
+
+    def __init__(
+        self,
+        model: str,
+        kind: str,
+        units: int,
+        prompt_tokens: int,
+        expected_output_tokens: int,
+        raw_output_tokens: float,
+        max_tokens: Optional[int],
+        max_tokens_cap: Optional[int],
+        fit_units: int,
+    ):
+        self.model = model
+        self.kind = kind
+        self.units = units
+        self.prompt_tokens = prompt_tokens
+        self.expected_output_tokens = expected_output_tokens
+        self.raw_output_tokens = raw_output_tokens  # 未校准的期望输出，用于计算校准比值
+        self.max_tokens = max_tokens
+        self.max_tokens_cap = max_tokens_cap
+        self.fit_units = fit_units
+
+    @property
+    def fits(self) -> bool:
+        return self.fit_units >= self.units
+
+    def require_fit(self):
+        """放不下期望输出时抛出 TokenBudgetError（用于无法降级的调用）"""
+        if not self.fits:
+            raise TokenBudgetError(
+                f"提示词约 {self.prompt_tokens} tokens，模型 {self.model} 的上下文窗口放不下"
+                f"期望的输出（约 {self.expected_output_tokens} tokens），请缩短输入内容"
+            )
+
+    def expand(self) -> bool:
+        """输出被截断后放大 max_tokens（不超过上下文窗口剩余空间），已达上限时返回False"""
+        if self.max_tokens is None or self.max_tokens_cap is None:
+            return False
+        grown = min(self.max_tokens_cap, math.ceil(self.max_tokens * TOKEN_BUDGET_CONFIG["truncation_growth"]))
+        if grown <= self.max_tokens:
+            return False
+        self.max_tokens = grown
+        return True
+
+    def __repr__(self) -> str:
+        return (
+            f"TokenBudget(kind={self.kind!r}, units={self.units}, prompt={self.prompt_tokens}, "
+            f"expected={self.expected_output_tokens}, max_tokens={self.max_tokens}, fit_units={self.fit_units})"
+        )
+
+
+class TokenAccountant:
+    """
+    进程内共享的token估算器
+
+    提示词系数按模型校准，输出系数按 (模型, 输出类型) 校准，都使用EWMA平滑并限制在
+    calibration_bounds 范围内。所有方法都是线程安全的。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prompt_factors: Dict[str, float] = {}
+        self._output_factors: Dict[Tuple[str, str], float] = {}
+
+    @staticmethod
+    def context_window(model: Optional[str] = None) -> int:
+        """模型的上下文窗口：优先取配置，其次按名称后缀（如 -32k）推断"""
+        model = _resolve_model(model)
+        windows = TOKEN_BUDGET_CONFIG["context_windows"]
+        if model in windows:
+            return windows[model]
+        match = _CONTEXT_SUFFIX_PATTERN.search(model)
+        if match:
+            return int(match.group(1)) * 1024
+        return TOKEN_BUDGET_CONFIG["default_context_window"]
+
+    @staticmethod
+    def _raw_text_tokens(text: str) -> float:
+        ascii_chars = len(text.encode("ascii", "ignore"))
+        return (
+            ascii_chars / TOKEN_BUDGET_CONFIG["ascii_chars_per_token"]
+            + (len(text) - ascii_chars) / TOKEN_BUDGET_CONFIG["cjk_chars_per_token"]
+        )
+
+    def _raw_message_tokens(self, messages: Iterable[Any]) -> float:
+        overhead = TOKEN_BUDGET_CONFIG["message_overhead_tokens"]
+        return sum(self._raw_text_tokens(_message_text(message)) + overhead for message in messages)
+
+    def _prompt_factor(self, model: str) -> float:
+        with self._lock:
+            return self._prompt_factors.get(model, 1.0)
+
+    def _output_factor(self, model: str, kind: str) -> float:
+        with self._lock:
+            return self._output_factors.get((model, kind), 1.0)
+
+    def estimate_text(self, text: str, model: Optional[str] = None) -> int:
+        """估算文本的token数（按模型校准）"""
+        model = _resolve_model(model)
+        return math.ceil(self._raw_text_tokens(text) * self._prompt_factor(model))
+
+    def estimate_messages(self, messages: List[Any], model: Optional[str] = None) -> int:
+        """估算对话消息的提示词token数（按模型校准）"""
+        model = _resolve_model(model)
+        return math.ceil(self._raw_message_tokens(messages) * self._prompt_factor(model))
+
+    def plan(
+        self,
+        messages: List[Any],
+        kind: str,
+        units: int = 1,
+        model: Optional[str] = None,
+        extra_output_tokens: int = 0,
+    ) -> TokenBudget:
+        """
+        为一次调用规划输出预算
+
+        Args:
+            messages (List[Any]): 已构建好的对话消息
+            kind (str): 输出类型，对应 TOKEN_BUDGET_CONFIG["output_profiles"] 的键
+            units (int): 输出单位数（页数、题数等）
+            model (Optional[str]): 模型名称，默认使用 OPENAI_CONFIG["model_path"]
+            extra_output_tokens (int): 不按单位计算的额外期望输出（如照搬原文的内容）
+
+        Returns:
+            TokenBudget: 预算；fit_units < units 时表示放不下期望输出
+
+        Raises:
+            TokenBudgetError: 上下文窗口剩余空间少于 min_output_tokens
+        """
+        model = _resolve_model(model)
+        units = max(1, units)
+        base, per_unit = TOKEN_BUDGET_CONFIG["output_profiles"][kind]
+        raw_output = base + per_unit * units + extra_output_tokens
+        output_factor = self._output_factor(model, kind)
+        expected = math.ceil(raw_output * output_factor)
+        prompt_tokens = self.estimate_messages(messages, model)
+        if not TOKEN_BUDGET_CONFIG["enabled"]:
+            return TokenBudget(model, kind, units, prompt_tokens, expected, raw_output, None, None, units)
+
+        window = self.context_window(model)
+        cap = min(
+            window - prompt_tokens - TOKEN_BUDGET_CONFIG["context_reserve_tokens"],
+            TOKEN_BUDGET_CONFIG["max_output_tokens"],
+        )
+        if cap < TOKEN_BUDGET_CONFIG["min_output_tokens"]:
+            _budget_plans.inc(kind=kind, result="rejected")
+            raise TokenBudgetError(
+                f"提示词约 {prompt_tokens} tokens，超出模型 {model} 的上下文窗口（{window} tokens），请缩短输入内容"
+            )
+
+        fit_units = units
+        if expected > cap:
+            room = cap / output_factor - base - extra_output_tokens
+            fit_units = max(0, min(units - 1, math.floor(room / per_unit))) if per_unit else 0
+        _budget_plans.inc(kind=kind, result="fit" if fit_units >= units else "over")
+        max_tokens = max(
+            TOKEN_BUDGET_CONFIG["min_output_tokens"],
+            min(cap, math.ceil(expected * TOKEN_BUDGET_CONFIG["safety_margin"])),
+        )
+        return TokenBudget(model, kind, units, prompt_tokens, expected, raw_output, max_tokens, cap, fit_units)
+
+    def _update(self, factors: Dict[Any, float], key: Any, ratio: float):
+        low, high = TOKEN_BUDGET_CONFIG["calibration_bounds"]
+        ratio = min(high, max(low, ratio))
+        alpha = TOKEN_BUDGET_CONFIG["calibration_alpha"]
+        with self._lock:
+            current = factors.get(key, 1.0)
+            factors[key] = current + alpha * (ratio - current)
+
+    def observe(
+        self,
+        model: Optional[str],
+        messages: List[Any],
+        usage: Any,
+        finish_reason: Optional[str],
+        budget: Optional[TokenBudget] = None,
+        output_text: Optional[str] = None,
+    ):
+        """
+        根据一次上游响应校准估算（由 llm_gateway 对最终返回的非缓存响应调用，每次调用只校准一次）
+
+        model 为实际响应的模型（路由到备用后端时可能与 budget.model 不同），校准系数按它记录；
+        usage 中没有 completion_tokens 时（部分流式接口）按 output_text 估算输出token数；
+        有 budget 时同时校准该输出类型。放大 max_tokens 见 :meth:`record_truncation`
+        """
+        model = _resolve_model(model)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens:
+            raw_prompt = self._raw_message_tokens(messages)
+            if raw_prompt > 0:
+                self._update(self._prompt_factors, model, prompt_tokens / raw_prompt)
+        if budget is None:
+            return
+
+        truncated = finish_reason == "length"
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if not completion_tokens and output_text:
+            completion_tokens = self.estimate_text(output_text, model)
+        if completion_tokens and budget.raw_output_tokens > 0:
+            ratio = completion_tokens / budget.raw_output_tokens
+            if truncated:
+                # 截断时实际输出只是下限
+                ratio *= TOKEN_BUDGET_CONFIG["truncation_growth"]
+            self._update(self._output_factors, (model, budget.kind), ratio)
+
+    def record_truncation(self, budget: TokenBudget, max_tokens: Optional[int]):
+        """
+        一次尝试的输出被截断：计数并放大 budget.max_tokens 供之后的重试使用（由 llm_gateway 对每次尝试调用）
+
+        max_tokens 为该次尝试使用的值；对冲的两个尝试都被截断时只放大一次
+        """
+        _truncated_responses.inc(kind=budget.kind)
+        expanded = budget.max_tokens == max_tokens and budget.expand()
+        logger.warning(
+            "⚠️ 输出达到 max_tokens 被截断",
+            kind=budget.kind,
+            max_tokens=max_tokens,
+            next_max_tokens=budget.max_tokens if expanded else None,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prompt_factors": dict(self._prompt_factors),
+                "output_factors": dict(self._output_factors),
+            }
+
+
+# 进程内共享的token估算器
+token_accountant = TokenAccountant()
+
+
+def _collect_budget_metrics():
+    """导出时读取当前的校准系数"""
+    stats = token_accountant.stats()
+    yield (
+        "llm_prompt_token_calibration", "gauge", "提示词token估算的校准系数（实际 / 本地估算）",
+        [({"model": model}, factor) for model, factor in sorted(stats["prompt_factors"].items())],
+    )
+    yield (
+        "llm_output_token_calibration", "gauge", "输出token估算的校准系数（实际 / 配置估算）",
+        [
+            ({"model": model, "kind": kind}, factor)
+            for (model, kind), factor in sorted(stats["output_factors"].items())
+        ],
+    )
+
+
+metrics_registry.register_collector(_collect_budget_metrics)
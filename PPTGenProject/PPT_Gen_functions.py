@@ -1,14 +1,40 @@
+import asyncio
+import io
 import json
 import re
 import random
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from typing import Callable, Dict, List, Any, Optional, Tuple, Union
 from pptx import Presentation
 import os
-from PPTGenProject.PPT_Prompt import get_ppt_generation_prompt
-from openai import OpenAI
-from FileRequestServer.config import OPENAI_CONFIG, PPT_CONFIG, PATHS, LOGGING_CONFIG
-import opencc
-converter_hk = opencc.OpenCC('s2hk')
+from PPTGenProject.PPT_Prompt import (
+    get_ppt_generation_prompt,
+    get_ppt_outline_prompt,
+    get_ppt_outline_system_prompt,
+    get_ppt_section_prompt,
+    get_ppt_section_system_prompt,
+    get_ppt_system_prompt,
+)
+from PPTGenProject.PPT_Stream_Parser import SlideStreamParser
+from openai.types.chat import ChatCompletionSystemMessageParam, ChatCompletionUserMessageParam
+from FileRequestServer.config import PPT_CONFIG, PATHS, LOGGING_CONFIG
+from FileRequestServer.content_digest import digest_content, digest_content_async
+from FileRequestServer.generated_file import GeneratedFile
+from FileRequestServer.metrics import stage_duration, stage_timer
+from FileRequestServer.progress import report_progress
+from FileRequestServer.structured_logging import get_logger
+from FileRequestServer.template_registry import template_registry
+from FileRequestServer.text_converter import resolve_chinese_variant, text_converter
+from FileRequestServer.token_budget import TokenBudget, token_accountant
+from FileRequestServer.llm_gateway import (
+    achat_completion,
+    astream_chat_completion,
+    chat_completion,
+    run_sync,
+    stream_chat_completion,
+)
+logger = get_logger(__name__)
 
 def generate_table_of_contents(slides_data: List[Dict[str, Any]]) -> Dict[str, Any]:
     """根据幻灯片内容生成目录"""
@@ -36,13 +62,18 @@ def create_table_of_contents_slide(prs, toc_data: Dict[str, Any]):
     title = slide.shapes.title
     title.text = "目录"
 
+    fill_table_of_contents(slide, toc_data.get("content", []))
+    return slide
+
+
+def fill_table_of_contents(slide, toc_items: List[str]):
+    """填充目录幻灯片的内容占位符"""
     # 获取内容占位符并调整位置和大小
     content_placeholder = slide.placeholders[1]
     text_frame = content_placeholder.text_frame
     text_frame.clear()
 
     # 添加目录项
-    toc_items = toc_data.get("content", [])
     for i, item in enumerate(toc_items):
         if i == 0:
             p = text_frame.paragraphs[0]
@@ -54,40 +85,50 @@ def create_table_of_contents_slide(prs, toc_data: Dict[str, Any]):
         p.level = 0
 
 
-def parse_content(content: str) -> Dict[str, Any]:
-    """解析GPT返回的内容"""
-    if LOGGING_CONFIG["show_debug_info"]:
-        print("=" * 60)
-        print("🤖 GPT 生成的原始内容:")
-        print("=" * 60)
-        print(content)
-        print("=" * 60)
+def remove_slide(prs, slide):
+    """从演示文稿中删除指定幻灯片"""
+    slide_id_list = prs.slides._sldIdLst
+    for slide_id in list(slide_id_list):
+        if prs.slides.get(slide_id.id) is slide:
+            prs.part.drop_rel(slide_id.rId)
+            slide_id_list.remove(slide_id)
+            return
+
 
+def load_json_object(content: str) -> Optional[Dict[str, Any]]:
+    """解析模型输出中的JSON对象，直接解析失败时提取第一个 { 到最后一个 } 之间的部分；都失败时返回None"""
     try:
         # 尝试直接解析JSON
         parsed_data = json.loads(content)
-        if LOGGING_CONFIG["show_debug_info"]:
-            print("✅ JSON解析成功!")
+        logger.debug("✅ JSON解析成功!")
         return parsed_data
     except json.JSONDecodeError:
-        print("⚠️ 直接JSON解析失败，尝试提取JSON部分...")
+        logger.warning("⚠️ 直接JSON解析失败，尝试提取JSON部分...")
         # 如果解析失败，尝试提取JSON部分
         json_match = re.search(r"\{.*\}", content, re.DOTALL)
         if json_match:
             try:
                 parsed_data = json.loads(json_match.group())
-                if LOGGING_CONFIG["show_debug_info"]:
-                    print("✅ 提取JSON解析成功!")
+                logger.debug("✅ 提取JSON解析成功!")
                 return parsed_data
             except json.JSONDecodeError:
-                print("❌ 提取JSON解析也失败")
+                logger.warning("❌ 提取JSON解析也失败")
+    return None
+
+
+def parse_content(content: str) -> Dict[str, Any]:
+    """解析GPT返回的内容"""
+    logger.payload("🤖 GPT 生成的原始内容", content=content)
 
-        print("🔄 使用默认结构...")
+    parsed_data = load_json_object(content)
+    if parsed_data is None:
+        logger.warning("🔄 使用默认结构...", content_chars=len(content))
         # 如果仍然失败，返回默认结构
         return {
             "title": "演示文稿",
             "slides": [{"type": "title", "title": "标题", "subtitle": "副标题"}],
         }
+    return parsed_data
 
 
 def create_title_slide(prs, slide_data: Dict[str, str]):
@@ -102,92 +143,133 @@ def create_title_slide(prs, slide_data: Dict[str, str]):
     subtitle.text = slide_data.get("subtitle", "副标题")
 
 
-def get_available_content_layouts(prs) -> List[int]:
-    """自动检测模板中可用的内容布局（必须同时包含标题和内容占位符的布局）"""
-    available_layouts = []
+def build_layout_index(prs) -> Dict[int, Dict[str, Any]]:
+    """
+    扫描模板中的内容布局，建立 布局索引 -> 占位符信息 的索引
+
+    只记录同时包含标题占位符（idx 0）和内容占位符的布局（跳过布局0，通常是标题页布局）。
+    只检查新建幻灯片时会被复制的占位符（不含页脚、日期、页码），与实际幻灯片上的占位符一致。
+
+    Returns:
+        Dict[int, Dict[str, Any]]: {布局索引: {"title_idx": 0, "content_idx": int, "content_type": 占位符类型}}
+    """
+    layout_index = {}
 
     for i, layout in enumerate(prs.slide_layouts):
-        # 跳过布局0（通常是标题页布局）
         if i == 0:
             continue
 
-        # 检查是否有标题占位符（索引0）和内容占位符
-        has_title = False
-        has_content = False
-
+        title_idx = None
+        content_idx = None
+        content_type = None
         try:
-            for placeholder in layout.placeholders:
+            for placeholder in layout.iter_cloneable_placeholders():
+                idx = placeholder.placeholder_format.idx
                 # 检查是否为标题占位符
-                if placeholder.placeholder_format.idx == 0:
-                    has_title = True
+                if idx == 0:
+                    title_idx = idx
                 # 检查是否为内容占位符（有text_frame且不是标题）
-                elif (
-                    hasattr(placeholder, "text_frame")
-                    and placeholder.placeholder_format.idx != 0
-                ):
-                    has_content = True
-
-            # 只有同时具备标题和内容占位符才认为是可用的内容布局
-            if has_title and has_content:
-                available_layouts.append(i)
-                if LOGGING_CONFIG.get("show_debug_info", False):
-                    print(f"  🔍 发现可用布局: {i} (标题✓ 内容✓)")
-            else:
-                if LOGGING_CONFIG.get("show_debug_info", False):
-                    title_status = "✓" if has_title else "✗"
-                    content_status = "✓" if has_content else "✗"
-                    print(
-                        f"  ❌ 布局 {i} 不可用 (标题{title_status} 内容{content_status})"
-                    )
+                elif content_idx is None and hasattr(placeholder, "text_frame"):
+                    content_idx = idx
+                    content_type = placeholder.placeholder_format.type
         except Exception as e:
-            if LOGGING_CONFIG.get("show_debug_info", False):
-                print(f"  ⚠️ 检查布局 {i} 时出错: {e}")
+            logger.debug("⚠️ 检查布局时出错", layout=i, error=str(e))
             continue
 
-    if LOGGING_CONFIG.get("show_debug_info", False):
-        print(f"  📋 模板中可用的内容布局: {available_layouts}")
+        # 只有同时具备标题和内容占位符才认为是可用的内容布局
+        if title_idx is not None and content_idx is not None:
+            layout_index[i] = {
+                "title_idx": title_idx,
+                "content_idx": content_idx,
+                "content_type": content_type,
+            }
+            logger.debug("🔍 发现可用布局", layout=i, content_idx=content_idx)
+        else:
+            logger.debug(
+                "❌ 布局不可用",
+                layout=i,
+                has_title=title_idx is not None,
+                has_content=content_idx is not None,
+            )
+
+    return layout_index
+
+
+def get_available_content_layouts(prs) -> List[int]:
+    """自动检测模板中可用的内容布局（必须同时包含标题和内容占位符的布局）"""
+    available_layouts = list(build_layout_index(prs).keys())
+
+    logger.debug("📋 模板中可用的内容布局", layouts=available_layouts)
 
     return available_layouts
 
 
-# 缓存布局检测结果，避免重复检测
-_layout_cache = {}
+# 每个设计模板的布局索引，服务启动时预先构建，避免每页幻灯片都扫描占位符
+# 设计编号 -> (构建时的模板版本, 布局索引)；模板文件被替换、版本改变后重新构建
+_design_layout_index: Dict[int, Tuple[Optional[int], Dict[int, Dict[str, Any]]]] = {}
+_design_layout_index_lock = threading.Lock()
 
 
-def get_random_content_layout(prs) -> int:
+def get_design_layout_index(design_number: int, prs=None) -> Dict[int, Dict[str, Any]]:
+    """获取设计模板的布局索引，首次使用或模板版本改变时构建并缓存"""
+    template_path = get_template_path(design_number)
+    version = template_registry.get_version(template_path)
+    with _design_layout_index_lock:
+        entry = _design_layout_index.get(design_number)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    if prs is None:
+        prs = template_registry.open_presentation(template_path)
+    layout_index = build_layout_index(prs) if prs is not None else {}
+    with _design_layout_index_lock:
+        _design_layout_index[design_number] = (version, layout_index)
+    return layout_index
+
+
+def preload_layout_indexes():
+    """为所有可用设计模板预先构建布局索引"""
+    for design_number in PPT_CONFIG["available_designs"]:
+        get_design_layout_index(design_number)
+    if LOGGING_CONFIG.get("show_progress", False):
+        logger.info("📋 已构建设计模板的布局索引", designs=len(_design_layout_index))
+
+
+def get_random_content_layout(prs, design_number: Optional[int] = None) -> int:
     """随机选择一个内容布局"""
     # 检查是否使用自动检测
     use_auto_detection = PPT_CONFIG.get("auto_detect_layouts", True)
 
     if use_auto_detection:
-        # 创建缓存键（基于模板的布局数量）
-        cache_key = len(prs.slide_layouts)
-
-        # 检查缓存
-        if cache_key in _layout_cache:
-            available_layouts = _layout_cache[cache_key]
+        if design_number is not None:
+            available_layouts = list(get_design_layout_index(design_number, prs))
         else:
-            # 自动检测可用布局并缓存
+            # 未知设计模板时直接检测当前演示文稿
             available_layouts = get_available_content_layouts(prs)
-            _layout_cache[cache_key] = available_layouts
 
         if not available_layouts:
-            print("⚠️ 未检测到可用的内容布局，使用默认布局1")
+            logger.warning("⚠️ 未检测到可用的内容布局，使用默认布局1", design_number=design_number)
             return 1
     else:
         # 使用配置文件中的布局列表
         available_layouts = PPT_CONFIG.get("available_content_layouts", [1])
         if not available_layouts:
-            print("⚠️ 配置中无可用布局，使用默认布局1")
+            logger.warning("⚠️ 配置中无可用布局，使用默认布局1")
             return 1
 
     return random.choice(available_layouts)
 
 
 def create_content_slide_with_layout(
-    prs, slide_data: Dict[str, Any], layout_index: int
+    prs,
+    slide_data: Dict[str, Any],
+    layout_index: int,
+    layout_info: Optional[Dict[str, Any]] = None,
 ):
-    """使用指定布局创建内容幻灯片"""
+    """使用指定布局创建内容幻灯片
+
+    传入布局索引信息（见 :func:`build_layout_index`）时直接按idx取内容占位符，否则逐个查找。
+    """
     content_type = slide_data.get("content_type", "bullet_list")
 
     # 使用指定的布局
@@ -201,22 +283,29 @@ def create_content_slide_with_layout(
     # 根据布局类型处理内容
     content_data = slide_data.get("content", [])
 
-    # 尝试找到内容占位符
     content_placeholder = None
-    for shape in slide.placeholders:
-        # 查找文本占位符（通常是索引1或其他）
-        if (
-            hasattr(shape, "text_frame") and shape.placeholder_format.idx != 0
-        ):  # 0通常是标题
-            content_placeholder = shape
-            break
+    if layout_info is not None:
+        try:
+            content_placeholder = slide.placeholders[layout_info["content_idx"]]
+        except KeyError:
+            content_placeholder = None
+
+    # 尝试找到内容占位符
+    if content_placeholder is None:
+        for shape in slide.placeholders:
+            # 查找文本占位符（通常是索引1或其他）
+            if (
+                hasattr(shape, "text_frame") and shape.placeholder_format.idx != 0
+            ):  # 0通常是标题
+                content_placeholder = shape
+                break
 
     if content_placeholder is None:
         # 如果没有找到占位符，尝试使用索引1
         try:
             content_placeholder = slide.placeholders[1]
         except (IndexError, KeyError):
-            print(f"⚠️ 布局 {layout_index} 没有可用的内容占位符，跳过内容添加")
+            logger.warning("⚠️ 布局没有可用的内容占位符，跳过内容添加", layout=layout_index)
             return
 
     # 处理文本内容
@@ -259,28 +348,31 @@ def create_content_slide_with_layout(
             p.text = str(content_data)
 
 
-def create_content_slide(prs, slide_data: Dict[str, Any]):
+def create_content_slide(
+    prs, slide_data: Dict[str, Any], design_number: Optional[int] = None
+):
     """创建内容幻灯片（支持随机布局）"""
     # 检查是否启用随机布局
     use_random_layouts = PPT_CONFIG.get("use_random_layouts", True)
 
     if use_random_layouts:
         # 随机选择布局
-        layout_index = get_random_content_layout(prs)
+        layout_index = get_random_content_layout(prs, design_number)
 
-        if LOGGING_CONFIG.get("show_debug_info", False):
-            print(f"  🎲 随机选择布局: {layout_index}")
+        logger.debug("🎲 随机选择布局", layout=layout_index)
     else:
         # 使用默认布局1
         layout_index = 1
-        if LOGGING_CONFIG.get("show_debug_info", False):
-            print(f"  📄 使用默认布局: {layout_index}")
+        logger.debug("📄 使用默认布局", layout=layout_index)
+
+    layout_info = None
+    if design_number is not None:
+        layout_info = get_design_layout_index(design_number, prs).get(layout_index)
 
     try:
-        create_content_slide_with_layout(prs, slide_data, layout_index)
+        create_content_slide_with_layout(prs, slide_data, layout_index, layout_info)
     except Exception as e:
-        print(f"⚠️ 使用布局 {layout_index} 失败: {e}")
-        print("🔄 回退到默认布局 1")
+        logger.warning("⚠️ 使用布局失败，回退到默认布局 1", layout=layout_index, error=str(e))
         # 如果随机布局失败，回退到布局1
         create_content_slide_with_layout(prs, slide_data, 1)
 
@@ -290,55 +382,116 @@ def get_template_path(design_number: Optional[int]) -> str:
     return PATHS["ppt_template_path_format"].format(design_number)
 
 
-def create_presentation(
-    ppt_data: Dict[str, Any],
-    design_number: Optional[int] = None,
-    custom_filename: Optional[str] = None,
-) -> str:
-    """创建完整的演示文稿"""
+def open_presentation_template(design_number: Optional[int] = None):
+    """打开设计模板，模板不存在时使用默认空白模板"""
     if design_number is None:
         design_number = PPT_CONFIG["default_design_number"]
 
     template_path = get_template_path(design_number)
-    print(f"📁 模板文件路径: {template_path}")
-    # 使用模板文件创建演示文稿
-    if os.path.exists(template_path):
-        prs = Presentation(template_path)
-        if LOGGING_CONFIG.get("show_progress", True):
-            print(f"🎨 使用模板: {template_path}")
+    # 使用模板文件创建演示文稿（模板内容缓存在内存中）
+    prs = template_registry.open_presentation(template_path)
+    if prs is not None:
+        logger.debug("🎨 使用模板", path=template_path)
     else:
         prs = Presentation()
-        print(f"⚠️ 模板文件不存在，使用默认模板: {template_path}")
+        logger.warning("⚠️ 模板文件不存在，使用默认模板", path=template_path)
+    return prs
 
-    # 获取演示文稿标题和建议文件名
-    presentation_title = ppt_data.get("title", "演示文稿")
+
+def resolve_presentation_filename(
+    ppt_data: Dict[str, Any], custom_filename: Optional[str] = None
+) -> str:
+    """根据自定义文件名或GPT建议的文件名确定输出文件名"""
     suggested_filename = ppt_data.get("filename", "presentation")
 
     # 确定最终文件名
     if custom_filename:
-        filename = f"{custom_filename}.pptx"
-    else:
-        filename = f"{suggested_filename}.pptx"
+        return f"{custom_filename}.pptx"
+    return f"{suggested_filename}.pptx"
+
+
+def resolve_presentation_path(
+    ppt_data: Dict[str, Any], custom_filename: Optional[str] = None
+) -> str:
+    """根据自定义文件名或GPT建议的文件名确定输出文件的绝对路径"""
+    filename = resolve_presentation_filename(ppt_data, custom_filename)
 
     # 创建Output文件夹（如果不存在）
     output_dir = PATHS["output_folder"]
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-        print(f"📁 创建输出目录: {output_dir}")
+        logger.info("📁 创建输出目录", path=output_dir)
 
     # 生成完整的文件路径（绝对路径）
-    full_path = os.path.abspath(os.path.join(output_dir, filename))
+    return os.path.abspath(os.path.join(output_dir, filename))
+
+
+def save_presentation(
+    prs,
+    ppt_data: Dict[str, Any],
+    custom_filename: Optional[str] = None,
+    in_memory: bool = False,
+) -> Union[str, GeneratedFile]:
+    """
+    保存演示文稿
+
+    Args:
+        in_memory (bool): 为True时保存到内存并返回 GeneratedFile，否则写入Output文件夹并返回文件绝对路径
+            （先写临时文件再原子替换，同名文件已存在时按 OUTPUT_CONFIG 使用带版本号的文件名）
+    """
+    buffer = io.BytesIO()
+    with stage_timer("ppt", "serialize"):
+        prs.save(buffer)
+    generated = GeneratedFile(
+        resolve_presentation_filename(ppt_data, custom_filename), buffer.getvalue()
+    )
+    if in_memory:
+        report_progress("saved", filename=generated.filename)
+        return generated
+
+    with stage_timer("ppt", "write"):
+        full_path = generated.save(PATHS["output_folder"])
+    report_progress("saved", filename=os.path.basename(full_path))
+    return full_path
+
+
+def create_presentation(
+    ppt_data: Dict[str, Any],
+    design_number: Optional[int] = None,
+    custom_filename: Optional[str] = None,
+    in_memory: bool = False,
+) -> Union[str, GeneratedFile]:
+    """创建完整的演示文稿，in_memory 的含义见 :func:`save_presentation`"""
+    if design_number is None:
+        design_number = PPT_CONFIG["default_design_number"]
+    with stage_timer("ppt", "render"):
+        prs = _render_presentation(ppt_data, design_number, custom_filename)
+
+    # 保存文件
+    return save_presentation(prs, ppt_data, custom_filename, in_memory)
+
+
+def _render_presentation(
+    ppt_data: Dict[str, Any], design_number: int, custom_filename: Optional[str]
+):
+    """打开模板并添加全部幻灯片（含目录页）"""
+    prs = open_presentation_template(design_number)
+
+    # 获取演示文稿标题和文件名
+    presentation_title = ppt_data.get("title", "演示文稿")
 
     if LOGGING_CONFIG.get("show_progress", False):
-        print(f"📊 正在创建演示文稿: {presentation_title}")
-        print(f"📁 文件路径: {full_path}")
+        logger.info(
+            "📊 正在创建演示文稿",
+            title=presentation_title,
+            filename=resolve_presentation_filename(ppt_data, custom_filename),
+        )
 
     slides = ppt_data.get("slides", [])
 
     # 生成目录数据
     toc_data = generate_table_of_contents(slides)
-    if LOGGING_CONFIG.get("show_debug_info", False):
-        print(f"📋 已生成目录，包含 {len(toc_data['content'])} 个章节")
+    logger.debug("📋 已生成目录", sections=len(toc_data["content"]))
 
     # 创建幻灯片
     slide_counter = 0
@@ -348,34 +501,141 @@ def create_presentation(
         slide_title = slide_data.get("title", f"幻灯片 {i + 1}")
 
         slide_counter += 1
-        if LOGGING_CONFIG.get("show_debug_info", False):
-            print(f"  📄 创建第 {slide_counter} 页: {slide_title} ({slide_type})")
+        logger.debug("📄 创建幻灯片", slide=slide_counter, title=slide_title, type=slide_type)
 
         if slide_type == "title":
             create_title_slide(prs, slide_data)
             # 在标题页后插入目录页
             if len(toc_data["content"]) > 0:
                 slide_counter += 1
-                if LOGGING_CONFIG.get("show_debug_info", False):
-                    print(f"  📋 创建第 {slide_counter} 页: 目录 (table_of_contents)")
+                logger.debug("📋 创建目录页", slide=slide_counter)
                 create_table_of_contents_slide(prs, toc_data)
         else:
-            create_content_slide(prs, slide_data)
+            create_content_slide(prs, slide_data, design_number)
+        report_progress("slide_rendered", slide=slide_counter, title=slide_title)
+
+    return prs
+
+
+class StreamingPresentationBuilder:
+    """
+    边生成边渲染的演示文稿构建器
+
+    每收到一页幻灯片数据就立即添加到演示文稿中。目录页在标题页之后先占位，
+    等所有内容页到齐后再填充（没有内容页时删除），最终页面顺序与 :func:`create_presentation` 一致。
+    """
+
+    def __init__(self, design_number: Optional[int] = None):
+        if design_number is None:
+            design_number = PPT_CONFIG["default_design_number"]
+        self.design_number = design_number
+        self.prs = open_presentation_template(design_number)
+        self.toc_slide = None
+        self.toc_items: List[str] = []
+        self.slide_count = 0
+        self.render_seconds = 0.0  # 累计渲染耗时，finish时计入 render 阶段
+
+    def add_slide(self, slide_data: Dict[str, Any]):
+        """添加一页幻灯片"""
+        started = time.perf_counter()
+        try:
+            self._add_slide(slide_data)
+        finally:
+            self.render_seconds += time.perf_counter() - started
+
+    def _add_slide(self, slide_data: Dict[str, Any]):
+        self.slide_count += 1
+        slide_type = slide_data.get("type", "content")
+        logger.debug(
+            "📄 创建幻灯片",
+            slide=self.slide_count,
+            title=slide_data.get("title", f"幻灯片 {self.slide_count}"),
+            type=slide_type,
+        )
+
+        if slide_type == "title":
+            create_title_slide(self.prs, slide_data)
+            # 在标题页后插入目录页占位
+            if self.toc_slide is None:
+                self.toc_slide = create_table_of_contents_slide(self.prs, {})
+        else:
+            create_content_slide(self.prs, slide_data, self.design_number)
+            if slide_type == "content":
+                self.toc_items.append(
+                    slide_data.get("title", f"第{self.slide_count}部分")
+                )
+        report_progress(
+            "slide_rendered", slide=self.slide_count, title=slide_data.get("title")
+        )
+
+    def finish(
+        self,
+        ppt_data: Dict[str, Any],
+        custom_filename: Optional[str] = None,
+        in_memory: bool = False,
+    ) -> Union[str, GeneratedFile]:
+        """填充目录并保存文件，in_memory 的含义见 :func:`save_presentation`"""
+        started = time.perf_counter()
+        if self.toc_slide is not None:
+            if self.toc_items:
+                fill_table_of_contents(self.toc_slide, self.toc_items)
+            else:
+                remove_slide(self.prs, self.toc_slide)
+        # 与模型输出交替进行的各页渲染耗时合计为一次 render
+        stage_duration.observe(
+            self.render_seconds + time.perf_counter() - started, pipeline="ppt", stage="render"
+        )
+
+        return save_presentation(self.prs, ppt_data, custom_filename, in_memory)
+
+
+def build_ppt_messages(user_input: str, expected_slides: Optional[int] = None) -> List[Any]:
+    """构建PPT内容生成的对话消息：固定的系统提示词在前，用户内容在后，便于命中服务商的前缀缓存"""
+    if expected_slides is None:
+        expected_slides = PPT_CONFIG["default_expected_slides"]
+    return [
+        ChatCompletionSystemMessageParam(role="system", content=get_ppt_system_prompt()),
+        ChatCompletionUserMessageParam(role="user", content=get_ppt_generation_prompt(user_input, expected_slides)),
+    ]
 
-    # 保存文件
-    prs.save(full_path)
-    return full_path
 
+def build_ppt_outline_messages(user_input: str, expected_slides: int) -> List[Any]:
+    """构建outline模式大纲调用的对话消息"""
+    return [
+        ChatCompletionSystemMessageParam(role="system", content=get_ppt_outline_system_prompt()),
+        ChatCompletionUserMessageParam(role="user", content=get_ppt_outline_prompt(user_input, expected_slides)),
+    ]
 
-def get_openai_client(
-    base_url: Optional[str] = None, api_key: Optional[str] = None
-) -> OpenAI:
-    """创建OpenAI客户端"""
-    if base_url is None:
-        base_url = OPENAI_CONFIG["base_url"]
-    if api_key is None:
-        api_key = OPENAI_CONFIG["api_key"]
-    return OpenAI(base_url=base_url, api_key=api_key)
+
+def plan_ppt_messages(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    model_path: Optional[str] = None,
+    kind: str = "ppt",
+    build_messages: Callable[[str, int], List[Any]] = build_ppt_messages,
+) -> Tuple[List[Any], TokenBudget]:
+    """
+    构建消息并按页数规划输出预算
+
+    上下文窗口放不下期望页数时减少页数（降级）后重新构建消息；一页都放不下时抛出 TokenBudgetError
+    """
+    if expected_slides is None:
+        expected_slides = PPT_CONFIG["default_expected_slides"]
+    messages = build_messages(user_input, expected_slides)
+    budget = token_accountant.plan(messages, kind, expected_slides, model=model_path)
+    if not budget.fits:
+        if budget.fit_units < 1:
+            budget.require_fit()
+        logger.warning(
+            "⚠️ 上下文窗口放不下期望页数，减少页数",
+            expected_slides=expected_slides,
+            slides=budget.fit_units,
+            prompt_tokens=budget.prompt_tokens,
+        )
+        report_progress("budget_downgraded", expected_slides=expected_slides, slides=budget.fit_units)
+        messages = build_messages(user_input, budget.fit_units)
+        budget = token_accountant.plan(messages, kind, budget.fit_units, model=model_path)
+    return messages, budget
 
 
 def generate_ppt_content(
@@ -384,35 +644,311 @@ def generate_ppt_content(
     base_url: Optional[str] = None,
     api_key: Optional[str] = None,
     model_path: Optional[str] = None,
+    use_cache: bool = True,
 ) -> str:
-    """使用GPT根据用户输入生成PPT内容"""
-    if expected_slides is None:
-        expected_slides = PPT_CONFIG["default_expected_slides"]
-    if base_url is None:
-        base_url = OPENAI_CONFIG["base_url"]
-    if api_key is None:
-        api_key = OPENAI_CONFIG["api_key"]
-    if model_path is None:
-        model_path = OPENAI_CONFIG["model_path"]
+    """使用GPT根据用户输入生成PPT内容（max_tokens 按页数估算）"""
+    messages, budget = plan_ppt_messages(user_input, expected_slides, model_path)
+    report_progress("llm_started")
+    # use json response
+    with stage_timer("ppt", "llm"):
+        response = chat_completion(
+            messages,
+            model=model_path,
+            base_url=base_url,
+            api_key=api_key,
+            use_cache=use_cache,
+            token_budget=budget,
+            response_format={"type": "json_object"},
+        )
+
+    content = response.choices[0].message.content or ""
+    report_progress("llm_finished", chars=len(content))
+    return content
 
-    client = get_openai_client(base_url, api_key)
-    prompt = get_ppt_generation_prompt(user_input, expected_slides)
 
-    from openai.types.chat import ChatCompletionUserMessageParam
+async def generate_ppt_content_async(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model_path: Optional[str] = None,
+    use_cache: bool = True,
+) -> str:
+    """generate_ppt_content 的异步版本，可直接在FastAPI事件循环中await"""
+    messages, budget = plan_ppt_messages(user_input, expected_slides, model_path)
+    report_progress("llm_started")
+    with stage_timer("ppt", "llm"):
+        response = await achat_completion(
+            messages,
+            model=model_path,
+            base_url=base_url,
+            api_key=api_key,
+            use_cache=use_cache,
+            token_budget=budget,
+            response_format={"type": "json_object"},
+        )
 
-    messages = [ChatCompletionUserMessageParam(role="user", content=prompt)]
-# use json response
-    response = client.chat.completions.create(
+    content = response.choices[0].message.content or ""
+    report_progress("llm_finished", chars=len(content))
+    return content
+
+
+def _merge_section_slide(
+    outline_slide: Dict[str, Any], generated: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """把章节调用生成的内容合并到大纲中的对应页；没有生成结果时用大纲摘要作为段落内容"""
+    merged = {key: value for key, value in outline_slide.items() if key != "summary"}
+    merged["type"] = "content"
+    merged.setdefault("content_type", "bullet_list")
+    if generated and generated.get("content"):
+        # 标题以大纲为准，保证与目录一致
+        merged["content_type"] = generated.get("content_type") or merged["content_type"]
+        merged["content"] = generated["content"]
+        if "has_image" in generated:
+            merged["has_image"] = generated["has_image"]
+    elif not merged.get("content"):
+        # 模型在大纲中已给出内容时保留，否则用摘要
+        merged["content_type"] = "paragraph"
+        merged["content"] = outline_slide.get("summary", "")
+    return merged
+
+
+async def _generate_section_async(
+    user_input: str,
+    presentation_title: str,
+    outline_titles: List[str],
+    section_slides: List[Dict[str, Any]],
+    base_url: Optional[str],
+    api_key: Optional[str],
+    model_path: Optional[str],
+    use_cache: bool,
+) -> List[Any]:
+    """生成一个章节（连续几页内容页）的内容，返回模型给出的 slides 列表"""
+    prompt = get_ppt_section_prompt(user_input, presentation_title, outline_titles, section_slides)
+    messages = [
+        ChatCompletionSystemMessageParam(role="system", content=get_ppt_section_system_prompt()),
+        ChatCompletionUserMessageParam(role="user", content=prompt),
+    ]
+    budget = token_accountant.plan(messages, "ppt_section", len(section_slides), model=model_path)
+    budget.require_fit()
+    response = await achat_completion(
+        messages,
         model=model_path,
-        messages=messages,
-        stream=False,
+        base_url=base_url,
+        api_key=api_key,
+        use_cache=use_cache,
+        token_budget=budget,
         response_format={"type": "json_object"},
     )
+    data = load_json_object(response.choices[0].message.content or "")
+    slides = data.get("slides") if isinstance(data, dict) else None
+    if not isinstance(slides, list):
+        raise ValueError("章节响应中缺少 slides 数组")
+    return slides
+
 
-    return response.choices[0].message.content or ""
+async def generate_ppt_data_outline_async(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model_path: Optional[str] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """outline模式：先用一次调用生成大纲，再按章节并发生成各页内容
 
+    每个章节包含 PPT_CONFIG["outline_section_slides"] 页内容页，同时进行的章节调用数不超过
+    PPT_CONFIG["outline_max_concurrency"]，总耗时取决于最慢的章节而不是整份演示文稿的解码时间。
+    单个章节失败时该章节用大纲摘要代替；所有章节都失败时抛出异常。
 
-def generate_ppt_from_user_input(
+    Returns:
+        Dict[str, Any]: 与 :func:`parse_content` 结构相同的PPT数据（尚未转换繁体）
+    """
+    messages, budget = plan_ppt_messages(
+        user_input, expected_slides, model_path, "ppt_outline", build_ppt_outline_messages
+    )
+    report_progress("llm_started")
+    with stage_timer("ppt", "llm_outline"):
+        response = await achat_completion(
+            messages,
+            model=model_path,
+            base_url=base_url,
+            api_key=api_key,
+            use_cache=use_cache,
+            token_budget=budget,
+            response_format={"type": "json_object"},
+        )
+    with stage_timer("ppt", "parse"):
+        ppt_data = parse_content(response.choices[0].message.content or "")
+
+    slides = [slide for slide in ppt_data.get("slides", []) if isinstance(slide, dict)]
+    content_positions = [i for i, slide in enumerate(slides) if slide.get("type", "content") != "title"]
+    section_size = max(1, PPT_CONFIG["outline_section_slides"])
+    sections = [
+        content_positions[i:i + section_size] for i in range(0, len(content_positions), section_size)
+    ]
+    outline_titles = [slides[i].get("title", "") for i in content_positions]
+    presentation_title = ppt_data.get("title", "演示文稿")
+    report_progress("outline_ready", slides=len(slides), sections=len(sections))
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("📋 大纲生成完成", slides=len(slides), sections=len(sections))
+
+    semaphore = asyncio.Semaphore(max(1, PPT_CONFIG["outline_max_concurrency"]))
+    errors: List[Exception] = []
+    finished = 0
+
+    async def _run(positions: List[int]):
+        nonlocal finished
+        section_slides = [slides[i] for i in positions]
+        async with semaphore:
+            try:
+                generated = await _generate_section_async(
+                    user_input, presentation_title, outline_titles, section_slides,
+                    base_url, api_key, model_path, use_cache,
+                )
+            except Exception as e:
+                errors.append(e)
+                logger.warning(
+                    "⚠️ 章节内容生成失败，使用大纲摘要代替",
+                    titles=[slide.get("title", "") for slide in section_slides],
+                    error=str(e),
+                )
+                generated = []
+        for offset, position in enumerate(positions):
+            item = generated[offset] if offset < len(generated) else None
+            slides[position] = _merge_section_slide(slides[position], item if isinstance(item, dict) else None)
+        finished += 1
+        report_progress("section_finished", section=finished, sections=len(sections))
+
+    with stage_timer("ppt", "llm_sections"):
+        await asyncio.gather(*(_run(positions) for positions in sections))
+    if sections and len(errors) == len(sections):
+        raise errors[0]
+
+    ppt_data["slides"] = slides
+    report_progress("llm_finished", slides=len(slides))
+    return ppt_data
+
+
+def generate_ppt_data_outline(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model_path: Optional[str] = None,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """generate_ppt_data_outline_async 的同步版本（在LLM网关事件循环上执行）"""
+    return run_sync(
+        generate_ppt_data_outline_async(
+            user_input, expected_slides, base_url, api_key, model_path, use_cache
+        )
+    )
+
+
+def create_presentation_from_content(
+    content: str,
+    design_number: Optional[int] = None,
+    custom_filename: Optional[str] = None,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """将GPT返回的原始内容解析、转换并渲染为PPT文件，返回文件绝对路径（in_memory时返回 GeneratedFile）"""
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ GPT内容生成完成！", chars=len(content))
+
+    # 解析内容
+    with stage_timer("ppt", "parse"):
+        ppt_data = parse_content(content)
+    return create_presentation_from_data(
+        ppt_data, design_number, custom_filename, in_memory, chinese_variant, source=content
+    )
+
+
+def create_presentation_from_data(
+    ppt_data: Dict[str, Any],
+    design_number: Optional[int] = None,
+    custom_filename: Optional[str] = None,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+    source: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """将解析后的PPT数据转换繁体并渲染为PPT文件；source 为解析前的原文（用于快速判断是否需要转换）"""
+    # 如果是简体，那么转换为繁体（只转换字符串值，已是繁体时跳过）
+    with stage_timer("ppt", "convert"):
+        ppt_data = text_converter.convert_data(ppt_data, chinese_variant, source=source)
+    report_progress("parsed", slides=len(ppt_data.get("slides", [])))
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ 内容解析完成！", slides=len(ppt_data.get("slides", [])))
+
+    # 创建PPT
+    saved = create_presentation(ppt_data, design_number, custom_filename, in_memory)
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ PPT文件已创建", **_describe_saved(saved))
+
+    return saved
+
+
+def _describe_saved(saved: Union[str, GeneratedFile]) -> Dict[str, Any]:
+    """生成结果的日志字段：内存中的文件记录文件名和大小，已保存的文件记录路径"""
+    if isinstance(saved, GeneratedFile):
+        return {"filename": saved.filename, "size": len(saved.data)}
+    return {"path": saved}
+
+
+def _load_streamed_slide(slide_text: str, chinese_variant: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """解析流式输出中切出的单页幻灯片并转换繁体"""
+    try:
+        return text_converter.convert_data(json.loads(slide_text), chinese_variant, source=slide_text)
+    except json.JSONDecodeError:
+        logger.warning("⚠️ 流式幻灯片JSON解析失败，跳过该页", chars=len(slide_text))
+        return None
+
+
+# 流式生成时每收到这么多字符上报一次 tokens_received 进度
+STREAM_PROGRESS_INTERVAL_CHARS = 500
+
+
+def _add_streamed_slides(
+    builder: "StreamingPresentationBuilder", slide_texts: List[str], chinese_variant: Optional[str] = None
+):
+    """解析并渲染流式输出中切出的幻灯片"""
+    for slide_text in slide_texts:
+        slide_data = _load_streamed_slide(slide_text, chinese_variant)
+        if slide_data is not None:
+            builder.add_slide(slide_data)
+
+
+def _finish_streamed_presentation(
+    builder: "StreamingPresentationBuilder",
+    content: str,
+    design_number: Optional[int],
+    custom_filename: Optional[str],
+    in_memory: bool,
+    chinese_variant: Optional[str],
+) -> Union[str, GeneratedFile]:
+    """流结束后完整解析一次（获取标题/文件名），填充目录并保存；流式解析没有得到幻灯片时回退到完整渲染"""
+    with stage_timer("ppt", "parse"):
+        ppt_data = parse_content(content)
+    report_progress("parsed", slides=len(ppt_data.get("slides", [])))
+
+    if builder.slide_count == 0:
+        logger.warning("🔄 流式解析未得到幻灯片，回退到完整渲染...")
+        with stage_timer("ppt", "convert"):
+            ppt_data = text_converter.convert_data(ppt_data, chinese_variant, source=content)
+        saved = create_presentation(ppt_data, design_number, custom_filename, in_memory)
+    else:
+        # 各页已在流式解析时转换，这里只需转换标题、文件名等顶层字段
+        with stage_timer("ppt", "convert"):
+            header = {key: value for key, value in ppt_data.items() if key != "slides"}
+            ppt_data = {**text_converter.convert_data(header, chinese_variant), "slides": ppt_data.get("slides", [])}
+        saved = builder.finish(ppt_data, custom_filename, in_memory)
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ PPT文件已创建", **_describe_saved(saved))
+    return saved
+
+
+def generate_ppt_streaming(
     user_input: str,
     expected_slides: Optional[int] = None,
     custom_filename: Optional[str] = None,
@@ -420,45 +956,245 @@ def generate_ppt_from_user_input(
     base_url: Optional[str] = None,
     api_key: Optional[str] = None,
     model_path: Optional[str] = None,
-) -> str:
-    """根据用户输入生成PPT的完整流程
+    use_cache: bool = True,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """流式生成PPT：边接收GPT输出边解析 slides 数组并立即渲染已完成的幻灯片
+
+    渲染与生成重叠进行，最后一个token到达后只需填充目录并保存。
+    如果流式解析没有得到任何幻灯片，则回退到完整解析后再渲染。
+
     Returns:
-        str: 生成的PPT文件的绝对路径, eg:"E:\\UnityProjects\\AI-PPT-Generator\\Output\\test.pptx"
+        Union[str, GeneratedFile]: 生成的PPT文件的绝对路径；in_memory 为True时返回内存中的文件
     """
-    # 使用配置文件的默认值
+    messages, budget = plan_ppt_messages(user_input, expected_slides, model_path)
+    parser = SlideStreamParser()
+    builder = StreamingPresentationBuilder(design_number)
+    chunks: List[str] = []
+    received_chars = 0
+    next_report_at = 0
+
+    report_progress("llm_started")
+    # llm_stream 包含与接收交替进行的逐页渲染，其中渲染部分另计入 render
+    with stage_timer("ppt", "llm_stream"):
+        for delta in stream_chat_completion(
+            messages,
+            model=model_path,
+            base_url=base_url,
+            api_key=api_key,
+            use_cache=use_cache,
+            token_budget=budget,
+            response_format={"type": "json_object"},
+        ):
+            chunks.append(delta)
+            received_chars += len(delta)
+            # 按字符数节流上报，避免每个token都产生一个事件
+            if received_chars >= next_report_at:
+                report_progress("tokens_received", chars=received_chars)
+                next_report_at = received_chars + STREAM_PROGRESS_INTERVAL_CHARS
+            _add_streamed_slides(builder, parser.feed(delta), chinese_variant)
+
+    report_progress("llm_finished", chars=received_chars)
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ GPT内容生成完成！", chars=received_chars, rendered_slides=builder.slide_count)
+
+    return _finish_streamed_presentation(
+        builder, "".join(chunks), design_number, custom_filename, in_memory, chinese_variant
+    )
+
+
+async def generate_ppt_streaming_async(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    custom_filename: Optional[str] = None,
+    design_number: Optional[int] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model_path: Optional[str] = None,
+    use_cache: bool = True,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """generate_ppt_streaming 的异步版本
+
+    在事件循环中接收流式输出，只把逐页渲染和最后的保存放到线程池中，
+    等待模型输出期间不占用线程池线程
+    """
+    messages, budget = plan_ppt_messages(user_input, expected_slides, model_path)
+    parser = SlideStreamParser()
+    builder = await asyncio.to_thread(StreamingPresentationBuilder, design_number)
+    chunks: List[str] = []
+    received_chars = 0
+    next_report_at = 0
+
+    report_progress("llm_started")
+    with stage_timer("ppt", "llm_stream"):
+        async for delta in astream_chat_completion(
+            messages,
+            model=model_path,
+            base_url=base_url,
+            api_key=api_key,
+            use_cache=use_cache,
+            token_budget=budget,
+            response_format={"type": "json_object"},
+        ):
+            chunks.append(delta)
+            received_chars += len(delta)
+            if received_chars >= next_report_at:
+                report_progress("tokens_received", chars=received_chars)
+                next_report_at = received_chars + STREAM_PROGRESS_INTERVAL_CHARS
+            slide_texts = parser.feed(delta)
+            if slide_texts:
+                # 同一演示文稿的幻灯片依次渲染，渲染期间收到的片段在队列中等待
+                await asyncio.to_thread(_add_streamed_slides, builder, slide_texts, chinese_variant)
+
+    report_progress("llm_finished", chars=received_chars)
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ GPT内容生成完成！", chars=received_chars, rendered_slides=builder.slide_count)
+
+    return await asyncio.to_thread(
+        _finish_streamed_presentation,
+        builder, "".join(chunks), design_number, custom_filename, in_memory, chinese_variant,
+    )
+
+
+# "single": 等待完整响应后再解析渲染；"stream": 流式生成并边收边渲染；
+# "outline": 先生成大纲，再按章节并发生成内容
+PPT_GENERATION_MODES = ("single", "stream", "outline")
+
+
+def resolve_ppt_options(
+    expected_slides: Optional[int],
+    design_number: Optional[int],
+    generation_mode: Optional[str] = None,
+) -> tuple:
+    """使用配置文件的默认值补全页数、模板编号和生成模式"""
     if expected_slides is None or expected_slides <= 0:
         expected_slides = PPT_CONFIG["default_expected_slides"]
     if design_number is None or design_number <= 0:
         design_number = PPT_CONFIG["default_design_number"]
-    if base_url is None:
-        base_url = OPENAI_CONFIG["base_url"]
-    if api_key is None:
-        api_key = OPENAI_CONFIG["api_key"]
-    if model_path is None:
-        model_path = OPENAI_CONFIG["model_path"]
+    if not generation_mode:
+        generation_mode = PPT_CONFIG["generation_mode"]
+    if generation_mode not in PPT_GENERATION_MODES:
+        raise ValueError(
+            f"未知的生成模式: {generation_mode}，可用模式: {PPT_GENERATION_MODES}"
+        )
+    return expected_slides, design_number, generation_mode
+
+
+def generate_ppt_from_user_input(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    custom_filename: Optional[str] = None,
+    design_number: Optional[int] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model_path: Optional[str] = None,
+    generation_mode: Optional[str] = None,
+    use_cache: bool = True,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """根据用户输入生成PPT的完整流程
+
+    chinese_variant 为简繁转换目标（"s2hk" | "s2tw" | "none"），为空时使用配置默认值
+
+    Returns:
+        Union[str, GeneratedFile]: 生成的PPT文件的绝对路径, eg:"E:\\UnityProjects\\AI-PPT-Generator\\Output\\test.pptx"；
+        in_memory 为True时不写磁盘，返回内存中的文件
+    """
+    expected_slides, design_number, generation_mode = resolve_ppt_options(
+        expected_slides, design_number, generation_mode
+    )
+    chinese_variant = resolve_chinese_variant(chinese_variant)
 
     if LOGGING_CONFIG["show_progress"]:
-        print(
-            f"🚀 正在根据用户需求生成PPT... 📝 传入内容: {user_input} | 📊 期望页数: {expected_slides}页 | 🎨 模板: Design-{design_number}.pptx"
+        logger.info(
+            "🚀 正在根据用户需求生成PPT...",
+            input_chars=len(user_input),
+            expected_slides=expected_slides,
+            design_number=design_number,
+            generation_mode=generation_mode,
+        )
+    # 过长的内容先分块摘要，用提要代替原文写入提示词
+    user_input = digest_content(user_input, use_cache, "ppt", model_path, base_url, api_key)
+
+    if generation_mode == "stream":
+        return generate_ppt_streaming(
+            user_input, expected_slides, custom_filename, design_number,
+            base_url, api_key, model_path, use_cache, in_memory, chinese_variant,
+        )
+    if generation_mode == "outline":
+        ppt_data = generate_ppt_data_outline(
+            user_input, expected_slides, base_url, api_key, model_path, use_cache
+        )
+        return create_presentation_from_data(
+            ppt_data, design_number, custom_filename, in_memory, chinese_variant
         )
 
     # 生成内容
     content = generate_ppt_content(
-        user_input, expected_slides, base_url, api_key, model_path
+        user_input, expected_slides, base_url, api_key, model_path, use_cache
+    )
+    return create_presentation_from_content(
+        content, design_number, custom_filename, in_memory, chinese_variant
     )
-    # 如果是简体，那么转换为繁体
-    content = converter_hk.convert(content)
-    if LOGGING_CONFIG["show_progress"]:
-        print("✅ GPT内容生成完成！")
 
-    # 解析内容
-    ppt_data = parse_content(content)
-    if LOGGING_CONFIG["show_progress"]:
-        print("✅ 内容解析完成！")
 
-    # 创建PPT
-    saved_filename = create_presentation(ppt_data, design_number, custom_filename)
+async def generate_ppt_from_user_input_async(
+    user_input: str,
+    expected_slides: Optional[int] = None,
+    custom_filename: Optional[str] = None,
+    design_number: Optional[int] = None,
+    base_url: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model_path: Optional[str] = None,
+    generation_mode: Optional[str] = None,
+    use_cache: bool = True,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """generate_ppt_from_user_input 的异步版本
+
+    大模型调用直接在事件循环中等待，只有解析和渲染PPT放到线程池中执行
+    """
+    expected_slides, design_number, generation_mode = resolve_ppt_options(
+        expected_slides, design_number, generation_mode
+    )
+    chinese_variant = resolve_chinese_variant(chinese_variant)
+
     if LOGGING_CONFIG["show_progress"]:
-        print(f"✅ PPT文件已创建：{saved_filename}")
+        logger.info(
+            "🚀 正在根据用户需求生成PPT...",
+            input_chars=len(user_input),
+            expected_slides=expected_slides,
+            design_number=design_number,
+            generation_mode=generation_mode,
+        )
+    # 过长的内容先分块摘要，用提要代替原文写入提示词
+    user_input = await digest_content_async(user_input, use_cache, "ppt", model_path, base_url, api_key)
+
+    if generation_mode == "stream":
+        # 在事件循环中接收流式输出，只有逐页渲染和保存放到线程池中
+        return await generate_ppt_streaming_async(
+            user_input, expected_slides, custom_filename, design_number,
+            base_url, api_key, model_path, use_cache, in_memory, chinese_variant,
+        )
+    if generation_mode == "outline":
+        # 各章节调用在事件循环中并发等待，只有渲染放到线程池中
+        ppt_data = await generate_ppt_data_outline_async(
+            user_input, expected_slides, base_url, api_key, model_path, use_cache
+        )
+        return await asyncio.to_thread(
+            create_presentation_from_data,
+            ppt_data, design_number, custom_filename, in_memory, chinese_variant,
+        )
 
-    return saved_filename
+    content = await generate_ppt_content_async(
+        user_input, expected_slides, base_url, api_key, model_path, use_cache
+    )
+    return await asyncio.to_thread(
+        create_presentation_from_content,
+        content, design_number, custom_filename, in_memory, chinese_variant,
+    )
@@ -1,59 +1,58 @@
 """
 PPT生成相關嘅提示詞模板
+固定嘅規則同JSON格式放喺系統提示詞，用戶內容只放喺其後嘅用戶提示詞，
+令唔同請求嘅消息開頭完全相同，可以命中模型服務商嘅前綴緩存（prompt caching）
 """
 
-from typing import Optional
+from typing import Any, Dict, List, Optional
 
 
-def get_ppt_generation_prompt(user_input: str, expected_slides: Optional[int] = 8) -> str:
-    """獲取PPT內容生成嘅提示詞"""
-    return f"""
-用戶傳入嘅ppt內容：{user_input}
-期望嘅幻燈片數量：{expected_slides}頁
-
+def get_ppt_system_prompt() -> str:
+    """獲取PPT內容生成嘅系統提示詞（固定嘅規則同JSON格式，唔包含任何用戶輸入）"""
+    return """
 請根據用戶嘅需求分析主題、內容，然後生成一個幻燈片嘅演示文稿,一定要是書面語言，不要口語化。
 嚴格根據知識點嘅語言，使用**繁體中文**或**英語**，不要使用**簡體中文**。
 
 請按照以下JSON格式返回：
-{{
+{
     "title": "演示文稿標題",
     "filename": "建議嘅文件名（唔包含.pptx擴展名）",
     "slides": [
-        {{
+        {
             "type": "title",
             "title": "主標題",
             "subtitle": "副標題"
-        }},
-        {{
+        },
+        {
             "type": "content",
             "title": "第一部分標題",
             "content_type": "bullet_list",
             "content": ["要點1", "要點2", "要點3"],
             "has_image": true
-        }},
-        {{
+        },
+        {
             "type": "content",
             "title": "第二部分標題",
             "content_type": "paragraph",
             "content": "呢係一段完整嘅文字描述，可以詳細闡述某個概念或者觀點。"
-        }},
-        {{
+        },
+        {
             "type": "content",
             "title": "第N部分標題",
             "content_type": "title_paragraph",
-            "content": {{
+            "content": {
                 "subtitle": "小標題",
                 "text": "呢係小標題下嘅詳細說明文字。"
-            }}
-        }},
-        {{
+            }
+        },
+        {
             "type": "content",
             "title": "總結部分標題",
             "content_type": "paragraph",
             "content": "呢係一段完整嘅文字描述，闡述成個ppt嘅內容。文字應該簡潔明瞭，同時包含足夠嘅信息。"
-        }},
+        },
     ]
-}}
+}
 
 內容類型說明：
 - "bullet_list": 項目符號列表
@@ -61,7 +60,7 @@ def get_ppt_generation_prompt(user_input: str, expected_slides: Optional[int] =
 - "title_paragraph": 小標題加段落組合
 
 要求：
-1. 嚴格按照期望嘅{expected_slides}頁數量生成內容（包括標題頁同目錄頁）!!!
+1. 嚴格按照用戶指定嘅期望頁數生成內容（包括標題頁同目錄頁）!!!
 2. 確保每個content slide都有明確嘅標題，用於自動生成目錄
 3. 根據內容性質揀合適嘅content_type
 4. 為演示文稿同文件名揀恰當嘅標題
@@ -72,3 +71,134 @@ def get_ppt_generation_prompt(user_input: str, expected_slides: Optional[int] =
 
 確保返回有效嘅JSON格式，唔好添加任何其他文字說明。
 """
+
+
+def get_ppt_generation_prompt(user_input: str, expected_slides: Optional[int] = 8) -> str:
+    """獲取PPT內容生成嘅用戶提示詞（只包含每次請求唔同嘅內容）"""
+    return f"""
+用戶傳入嘅ppt內容：{user_input}
+期望嘅幻燈片數量：{expected_slides}頁
+"""
+
+
+def get_ppt_outline_system_prompt() -> str:
+    """獲取PPT大綱嘅系統提示詞（outline模式第一步：只生成每頁嘅標題同內容類型）"""
+    return """
+請根據用戶嘅需求分析主題，先為演示文稿設計大綱，暫時唔需要生成每頁嘅具體內容。一定要是書面語言，不要口語化。
+嚴格根據知識點嘅語言，使用**繁體中文**或**英語**，不要使用**簡體中文**。
+
+請按照以下JSON格式返回：
+{
+    "title": "演示文稿標題",
+    "filename": "建議嘅文件名（唔包含.pptx擴展名）",
+    "slides": [
+        {
+            "type": "title",
+            "title": "主標題",
+            "subtitle": "副標題"
+        },
+        {
+            "type": "content",
+            "title": "第一部分標題",
+            "content_type": "bullet_list",
+            "summary": "一句說明呢頁要講嘅重點",
+            "has_image": true
+        },
+        {
+            "type": "content",
+            "title": "第N部分標題",
+            "content_type": "paragraph",
+            "summary": "一句說明呢頁要講嘅重點"
+        }
+    ]
+}
+
+內容類型說明：
+- "bullet_list": 項目符號列表
+- "paragraph": 完整段落文字
+- "title_paragraph": 小標題加段落組合
+
+要求：
+1. 嚴格按照用戶指定嘅期望頁數設計大綱（包括標題頁同目錄頁，目錄頁會自動生成，唔需要列出）!!!
+2. 每個content slide都要有明確而唔重複嘅標題，用於自動生成目錄
+3. 根據內容性質揀合適嘅content_type，summary只寫一句
+4. 確保JSON格式完整正確，唔好添加任何其他文字說明
+"""
+
+
+def get_ppt_outline_prompt(user_input: str, expected_slides: Optional[int] = 8) -> str:
+    """獲取PPT大綱嘅用戶提示詞"""
+    return f"""
+用戶傳入嘅ppt內容：{user_input}
+期望嘅幻燈片數量：{expected_slides}頁
+"""
+
+
+def get_ppt_section_system_prompt() -> str:
+    """獲取PPT章節內容嘅系統提示詞（outline模式第二步：按大綱生成其中幾頁嘅具體內容）"""
+    return """
+用戶會提供演示文稿嘅內容、標題、成個大綱，同埋本次需要生成嘅幻燈片。
+請只為本次需要生成嘅幻燈片生成具體內容，唔好重複大綱中其他頁面嘅內容。一定要是書面語言，不要口語化。
+嚴格根據知識點嘅語言，使用**繁體中文**或**英語**，不要使用**簡體中文**。
+
+請按照以下JSON格式返回，slides嘅數量同順序要同本次需要生成嘅幻燈片一致，標題同content_type保持不變：
+{
+    "slides": [
+        {
+            "type": "content",
+            "title": "頁面標題",
+            "content_type": "bullet_list",
+            "content": ["要點1", "要點2", "要點3"],
+            "has_image": true
+        },
+        {
+            "type": "content",
+            "title": "頁面標題",
+            "content_type": "paragraph",
+            "content": "呢係一段完整嘅文字描述。"
+        },
+        {
+            "type": "content",
+            "title": "頁面標題",
+            "content_type": "title_paragraph",
+            "content": {
+                "subtitle": "小標題",
+                "text": "呢係小標題下嘅詳細說明文字。"
+            }
+        }
+    ]
+}
+
+要求：
+1. 內容要充實且符合用戶需求
+2. 確保JSON格式完整正確，唔好有語法錯誤；反斜槓喺LaTeX公式中必須使用雙反斜槓（\\\\）表示；如果內容涉及公式，使用LaTeX格式
+3. 唔好添加任何其他文字說明
+"""
+
+
+def get_ppt_section_prompt(
+    user_input: str,
+    presentation_title: str,
+    outline_titles: List[str],
+    section_slides: List[Dict[str, Any]],
+) -> str:
+    """
+    獲取PPT章節內容嘅用戶提示詞
+
+    同一份演示文稿各章節共用嘅內容（用戶內容、標題、大綱）放喺前面，章節各自嘅頁面放喺最後
+    """
+    outline_text = "\n".join(f"{i}. {title}" for i, title in enumerate(outline_titles, 1))
+    section_text = "\n".join(
+        f"- 標題：{slide.get('title', '')}；內容類型：{slide.get('content_type', 'bullet_list')}；重點：{slide.get('summary', '')}"
+        for slide in section_slides
+    )
+    return f"""
+用戶傳入嘅ppt內容：{user_input}
+演示文稿標題：{presentation_title}
+
+成個演示文稿嘅大綱：
+{outline_text}
+
+本次需要生成嘅幻燈片：{len(section_slides)}頁
+{section_text}
+"""
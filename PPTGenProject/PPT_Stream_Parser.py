@@ -0,0 +1,96 @@
+"""
+流式JSON解析器
+边接收大模型输出边从 "slides" 数组中切出已经完整的幻灯片对象
+"""
+from typing import List, Optional
+
+
+class SlideStreamParser:
+    """
+    增量解析 {"title": ..., "slides": [{...}, {...}]} 结构
+
+    每次 :meth:`feed` 传入新收到的文本片段，返回其中新完成的幻灯片JSON文本（未解析），
+    调用方可以立即 json.loads 并渲染，无需等待整个响应结束。
+    """
+
+    def __init__(self, array_key: str = "slides"):
+        self.array_key = array_key
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string: Optional[str] = None
+        self._in_array = False
+        self._array_depth = 0
+        self._item_start: Optional[int] = None
+        self._pos = 0
+        self._text = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        """输入新的文本片段，返回新完成的数组元素JSON文本列表"""
+        completed: List[str] = []
+        self._text += chunk
+
+        while self._pos < len(self._text):
+            ch = self._text[self._pos]
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._last_string = self._text[self._string_start + 1 : self._pos]
+            elif ch == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif ch in "{[":
+                if (
+                    ch == "["
+                    and not self._in_array
+                    and self._depth == 1
+                    and self._last_string == self.array_key
+                ):
+                    self._in_array = True
+                    self._array_depth = self._depth + 1
+                elif (
+                    ch == "{" and self._in_array and self._depth == self._array_depth
+                ):
+                    self._item_start = self._pos
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._in_array:
+                    if (
+                        ch == "}"
+                        and self._depth == self._array_depth
+                        and self._item_start is not None
+                    ):
+                        completed.append(self._text[self._item_start : self._pos + 1])
+                        self._item_start = None
+                    elif ch == "]" and self._depth == self._array_depth - 1:
+                        self._in_array = False
+
+            self._pos += 1
+
+        self._compact()
+        return completed
+
+    def _compact(self):
+        """丢弃已经处理完且不再需要的前缀，避免文本无限增长"""
+        if self._in_string:
+            keep_from = self._string_start
+            if self._item_start is not None:
+                keep_from = min(keep_from, self._item_start)
+        elif self._item_start is not None:
+            keep_from = self._item_start
+        else:
+            keep_from = self._pos
+
+        if keep_from > 0:
+            self._text = self._text[keep_from:]
+            self._pos -= keep_from
+            self._string_start -= keep_from
+            if self._item_start is not None:
+                self._item_start -= keep_from
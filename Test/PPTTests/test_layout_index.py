@@ -0,0 +1,53 @@
+"""
+测试设计模板布局索引的缓存
+
+模板文件被替换后，布局索引应随模板版本重新构建，不能继续使用旧模板的占位符idx
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+from pptx import Presentation
+
+from FileRequestServer.config import PATHS
+from PPTGenProject import PPT_Gen_functions
+from PPTGenProject.PPT_Gen_functions import build_layout_index, get_design_layout_index
+
+DESIGN_NUMBER = 9999
+
+
+def _design_path(n):
+    return os.path.join(ROOT_DIR, "Designs", f"Design-{n}.pptx")
+
+
+@pytest.fixture
+def template_path(tmp_path, monkeypatch):
+    monkeypatch.setitem(PATHS, "ppt_template_path_format", str(tmp_path / "Design-{}.pptx"))
+    monkeypatch.setattr(PPT_Gen_functions, "_design_layout_index", {})
+    return str(tmp_path / f"Design-{DESIGN_NUMBER}.pptx")
+
+
+def test_index_is_cached_while_template_unchanged(template_path):
+    shutil.copyfile(_design_path(1), template_path)
+    first = get_design_layout_index(DESIGN_NUMBER)
+    assert first == build_layout_index(Presentation(_design_path(1)))
+    assert get_design_layout_index(DESIGN_NUMBER) is first
+
+
+def test_index_rebuilt_after_template_replaced(template_path):
+    shutil.copyfile(_design_path(1), template_path)
+    before = get_design_layout_index(DESIGN_NUMBER)
+
+    shutil.copyfile(_design_path(3), template_path)
+    # 保证修改时间确实改变（部分文件系统的时间精度较低）
+    stat = os.stat(template_path)
+    os.utime(template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    after = get_design_layout_index(DESIGN_NUMBER)
+    expected = build_layout_index(Presentation(_design_path(3)))
+    assert before != expected
+    assert after == expected
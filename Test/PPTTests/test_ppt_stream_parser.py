@@ -0,0 +1,98 @@
+"""
+测试流式JSON解析器 SlideStreamParser
+
+同一份文档按不同的随机切分方式分段输入，切出的幻灯片应与 json.loads 得到的 slides 完全一致
+"""
+import json
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from PPTGenProject.PPT_Stream_Parser import SlideStreamParser
+
+# 最后一页独有的文本，用于构造截断的响应
+LAST_SLIDE_MARKER = "最後一頁"
+
+DOCUMENT = {
+    "title": "含有 {特殊} [字符] 嘅標題 \"引號\"",
+    "filename": "C:\\path\\to\\file",
+    "meta": {"slides": "唔係數組", "nested": [{"slides": [1, 2]}]},
+    "slides": [
+        {"type": "title", "title": "主標題", "subtitle": "副標題 }]"},
+        {
+            "type": "content",
+            "title": "大括號 { 同 } 喺字符串入面",
+            "content_type": "bullet_list",
+            "content": ["要點 {a}", "要點 [b]", "要點 \"c\""],
+            "has_image": True,
+        },
+        {
+            "type": "content",
+            "title": "LaTeX 公式",
+            "content_type": "paragraph",
+            "content": "\\frac{a}{b} + \\left( x \\right) 同反斜槓結尾 \\",
+        },
+        {
+            "type": "content",
+            "title": "嵌套對象",
+            "content_type": "title_paragraph",
+            "content": {"subtitle": "小標題 \\\"轉義\\\"", "text": "換行\n同製表符\t"},
+        },
+        {"type": "content", "title": LAST_SLIDE_MARKER, "content_type": "paragraph", "content": "}}}]]]"},
+    ],
+}
+
+
+def _serialize(indent, ensure_ascii):
+    return json.dumps(DOCUMENT, indent=indent, ensure_ascii=ensure_ascii)
+
+
+def _random_chunks(text, rng, max_size):
+    chunks = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, max_size)
+        chunks.append(text[pos:pos + size])
+        pos += size
+    return chunks
+
+
+def _parse(chunks):
+    parser = SlideStreamParser()
+    slides = []
+    for chunk in chunks:
+        slides.extend(json.loads(slide_text) for slide_text in parser.feed(chunk))
+    return slides
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+@pytest.mark.parametrize("seed", range(20))
+def test_random_chunkings_match_json_loads(indent, ensure_ascii, seed):
+    text = _serialize(indent, ensure_ascii)
+    rng = random.Random(seed)
+    chunks = _random_chunks(text, rng, rng.choice([1, 3, 16, 200]))
+    assert _parse(chunks) == json.loads(text)["slides"]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_single_characters(indent):
+    text = _serialize(indent, False)
+    assert _parse(list(text)) == DOCUMENT["slides"]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_truncated_tail_emits_only_complete_slides(seed):
+    text = _serialize(2, False)
+    # 截断在最后一页中间，模型输出被 max_tokens 截断时的情况
+    truncated = text[: text.rindex(LAST_SLIDE_MARKER) + 2]
+    rng = random.Random(seed)
+    assert _parse(_random_chunks(truncated, rng, 8)) == DOCUMENT["slides"][:-1]
+
+
+def test_no_slides_key():
+    text = json.dumps({"title": "slides", "items": [{"a": 1}]}, ensure_ascii=False)
+    assert _parse([text]) == []
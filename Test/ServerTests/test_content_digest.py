@@ -0,0 +1,76 @@
+"""
+测试长内容分块 split_chunks
+
+修改某一节的内容后，其他顶层章节切出的块应保持逐字节不变，才能继续命中LLM响应缓存
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer.config import TOKEN_BUDGET_CONFIG
+from FileRequestServer.content_digest import split_chunks
+
+
+def _notes(sections, edited=None, extra="補充內容。" * 40):
+    parts = []
+    for index in range(sections):
+        body = f"第{index}節嘅內容，包括定義、例子同結論。" * 12
+        if index == edited:
+            body += extra
+        parts.append(f"## 第{index}節 標題\n{body}\n\n")
+    return "前言：課程簡介。\n\n" + "".join(parts)
+
+
+def _nested_notes(edited=None):
+    parts = []
+    for chapter in range(1, 9):
+        parts.append(f"# 第{chapter}部分\n")
+        for section in range(1, 6):
+            body = f"{chapter}.{section} 嘅內容，包括公式 \\frac{{a}}{{b}}。" * 8
+            if (chapter, section) == edited:
+                body += "新增一段說明。" * 30
+            parts.append(f"## {chapter}.{section} 小節\n{body}\n\n")
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("edited", [0, 1, 20, 39])
+def test_editing_one_section_keeps_other_chunks(edited):
+    before = split_chunks(_notes(40), chunk_tokens=1000)
+    after = split_chunks(_notes(40, edited=edited), chunk_tokens=1000)
+    assert len(after) == len(before)
+    changed = [index for index, (old, new) in enumerate(zip(before, after)) if old != new]
+    # 第一块是前言，第 edited 节在第 edited + 1 块
+    assert changed == [edited + 1]
+
+
+def test_small_subsections_merge_within_top_level_heading():
+    text = _nested_notes()
+    chunks = split_chunks(text, chunk_tokens=1000)
+    assert "".join(chunks) == text
+    # 每个顶层章节内的小节合并，块不跨顶层章节
+    assert len(chunks) < 40
+    for chunk in chunks:
+        assert chunk.count("# 第") - chunk.count("## ") <= 1
+        assert chunk.startswith("# 第") or chunk.startswith("## ")
+
+
+def test_editing_subsection_only_changes_its_top_level_chunks():
+    before = split_chunks(_nested_notes(), chunk_tokens=1000)
+    after = split_chunks(_nested_notes(edited=(3, 2)), chunk_tokens=1000)
+    in_chapter_3 = lambda chunk: "# 第3部分" in chunk or "## 3." in chunk
+    unchanged_before = [chunk for chunk in before if not in_chapter_3(chunk)]
+    unchanged_after = [chunk for chunk in after if not in_chapter_3(chunk)]
+    assert unchanged_before == unchanged_after
+    assert len(unchanged_before) < len(before)
+
+
+def test_oversized_section_respects_limit():
+    text = "## 長章節\n" + "一句好長嘅說明。\n" * 2000
+    chunks = split_chunks(text, chunk_tokens=1000)
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+    max_chars = int(1000 * TOKEN_BUDGET_CONFIG["cjk_chars_per_token"])
+    assert all(len(chunk) <= max_chars for chunk in chunks)
+    assert all(chunk.strip() for chunk in chunks)
@@ -0,0 +1,112 @@
+"""
+测试 /download 的缓存协商、分段下载和路径校验
+
+ETag / If-None-Match / If-Modified-Since 命中时返回304，过期时返回200；Range 请求返回206；
+通过 "../" 访问用户目录以外的文件返回404
+"""
+import os
+import sys
+from email.utils import formatdate
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT_DIR)
+sys.path.append(os.path.dirname(ROOT_DIR))
+from AIFileGenerator.FileRequestServer import services
+from AIFileGenerator.FileRequestServer.server_main import app
+
+CONTENT = b"PK\x03\x04" + bytes(range(256)) * 8
+
+
+@pytest.fixture
+def output_dir(tmp_path, monkeypatch):
+    output = tmp_path / "Output"
+    monkeypatch.setattr(services, "get_user_output_dir", lambda user_id: str((output / user_id).resolve()))
+    (output / "alice").mkdir(parents=True)
+    (output / "alice" / "report.docx").write_bytes(CONTENT)
+    (output / "bob").mkdir()
+    (output / "bob" / "secret.docx").write_bytes(b"bob only")
+    (tmp_path / "outside.txt").write_bytes(b"outside")
+    return output
+
+
+@pytest.fixture
+def client(output_dir):
+    # 不进入 lifespan，避免启动任务队列和预加载模板
+    return TestClient(app)
+
+
+def _download(client, filename="report.docx", user_id="alice", **headers):
+    return client.get("/download", params={"userID": user_id, "filename": filename}, headers=headers)
+
+
+def test_download_returns_file_with_validators(client):
+    response = _download(client)
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["last-modified"]
+    assert response.headers["content-type"] == (
+        "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    )
+    assert "report.docx" in response.headers["content-disposition"]
+
+
+def test_matching_etag_returns_304(client):
+    etag = _download(client).headers["etag"]
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = _download(client, **{"If-None-Match": if_none_match})
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["etag"] == etag
+
+
+def test_stale_etag_returns_200(client, output_dir):
+    etag = _download(client).headers["etag"]
+    assert _download(client, **{"If-None-Match": '"stale"'}).status_code == 200
+
+    # 文件内容改变后旧ETag失效
+    (output_dir / "alice" / "report.docx").write_bytes(CONTENT + b"v2")
+    response = _download(client, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.content == CONTENT + b"v2"
+    assert response.headers["etag"] != etag
+
+
+def test_if_modified_since(client, output_dir):
+    mtime = os.stat(output_dir / "alice" / "report.docx").st_mtime
+    later = formatdate(mtime + 60, usegmt=True)
+    earlier = formatdate(mtime - 60, usegmt=True)
+    assert _download(client, **{"If-Modified-Since": later}).status_code == 304
+    assert _download(client, **{"If-Modified-Since": earlier}).status_code == 200
+    assert _download(client, **{"If-Modified-Since": "not a date"}).status_code == 200
+    # If-None-Match 存在时忽略 If-Modified-Since
+    response = _download(client, **{"If-None-Match": '"stale"', "If-Modified-Since": later})
+    assert response.status_code == 200
+
+
+def test_range_returns_206(client):
+    response = _download(client, Range="bytes=4-13")
+    assert response.status_code == 206
+    assert response.content == CONTENT[4:14]
+    assert response.headers["content-range"] == f"bytes 4-13/{len(CONTENT)}"
+
+
+@pytest.mark.parametrize(
+    "user_id, filename",
+    [
+        ("alice", "../bob/secret.docx"),
+        ("alice", "../../outside.txt"),
+        ("alice", "/etc/passwd"),
+        ("..", "outside.txt"),
+    ],
+)
+def test_path_traversal_returns_404(client, user_id, filename):
+    response = _download(client, filename=filename, user_id=user_id)
+    assert response.status_code == 404
+
+
+def test_missing_file_returns_404(client):
+    assert _download(client, filename="missing.pptx").status_code == 404
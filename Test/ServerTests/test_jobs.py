@@ -0,0 +1,182 @@
+"""
+测试SQLite任务存储和后台任务工作池
+
+覆盖 提交 → 处理中 → 完成/失败、重启后重新排队及 max_attempts 上限、旧数据库补充 attempts 列
+"""
+import asyncio
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer.jobs import JobManager, JobStore, QueueFullError
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+async def _wait_finished(manager, job_id, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await manager.get(job_id)
+        if job["status"] in ("completed", "failed"):
+            return job
+        assert asyncio.get_running_loop().time() < deadline, job
+        await asyncio.sleep(0.01)
+
+
+def test_submit_runs_job_to_completion(db_path):
+    store = JobStore(db_path)
+    seen = []
+
+    async def runner(payload):
+        # 执行期间任务处于 processing 状态，执行次数已累加
+        seen.append((payload, [(job["status"], job["attempts"]) for job in store.list_unfinished()]))
+        return {"filename": "a.pptx"}
+
+    async def main():
+        manager = JobManager(store, {"ppt": runner}, max_workers=1)
+        await manager.start()
+        queued = await manager.submit("ppt", {"user_input": "光合作用"})
+        assert (await manager.get(queued))["status"] in ("queued", "processing")
+        job = await _wait_finished(manager, queued)
+        await manager.stop()
+        return job
+
+    job = asyncio.run(main())
+    assert seen == [({"user_input": "光合作用"}, [("processing", 1)])]
+    assert job["status"] == "completed"
+    assert job["result"] == {"filename": "a.pptx"}
+    assert job["attempts"] == 1
+
+
+def test_runner_error_marks_job_failed(db_path):
+    async def runner(payload):
+        raise RuntimeError("模型返回空内容")
+
+    async def main():
+        manager = JobManager(JobStore(db_path), {"word": runner}, max_workers=1)
+        await manager.start()
+        job = await _wait_finished(manager, await manager.submit("word", {}))
+        await manager.stop()
+        return job
+
+    job = asyncio.run(main())
+    assert job["status"] == "failed"
+    assert "模型返回空内容" in job["message"]
+    assert job["result"] is None
+
+
+def test_submit_rejects_unknown_kind_and_full_queue(db_path):
+    async def main():
+        release = asyncio.Event()
+
+        async def runner(payload):
+            await release.wait()
+            return {}
+
+        manager = JobManager(JobStore(db_path), {"ppt": runner}, max_workers=1, max_queue_size=1)
+        await manager.start()
+        with pytest.raises(ValueError):
+            await manager.submit("excel", {})
+        first = await manager.submit("ppt", {})
+        # 等worker取走第一个任务，第二个任务留在队列中
+        while (await manager.get(first))["status"] != "processing":
+            await asyncio.sleep(0.01)
+        await manager.submit("ppt", {})
+        with pytest.raises(QueueFullError):
+            await manager.submit("ppt", {})
+        release.set()
+        await manager.stop()
+
+    asyncio.run(main())
+
+
+def _interrupted_job(store, job_id, attempts):
+    """模拟服务在任务执行中途退出：任务停留在 processing 状态"""
+    store.create(job_id, "ppt", {"n": job_id}, "任务已提交到队列")
+    for _ in range(attempts):
+        store.start_attempt(job_id, "正在生成文件...")
+
+
+def test_restart_requeues_unfinished_jobs(db_path):
+    store = JobStore(db_path)
+    _interrupted_job(store, "interrupted", attempts=1)
+    store.create("waiting", "ppt", {"n": "waiting"}, "任务已提交到队列")
+    ran = []
+
+    async def runner(payload):
+        ran.append(payload["n"])
+        return {"ok": True}
+
+    async def main():
+        manager = JobManager(JobStore(db_path), {"ppt": runner}, max_workers=1, max_attempts=3)
+        await manager.start()
+        jobs = [await _wait_finished(manager, job_id) for job_id in ("interrupted", "waiting")]
+        await manager.stop()
+        return jobs
+
+    interrupted, waiting = asyncio.run(main())
+    assert sorted(ran) == ["interrupted", "waiting"]
+    assert interrupted["status"] == waiting["status"] == "completed"
+    assert interrupted["attempts"] == 2
+    assert waiting["attempts"] == 1
+
+
+def test_restart_fails_jobs_that_reached_max_attempts(db_path):
+    store = JobStore(db_path)
+    _interrupted_job(store, "crashy", attempts=3)
+    _interrupted_job(store, "retry", attempts=2)
+    ran = []
+
+    async def runner(payload):
+        ran.append(payload["n"])
+        return {}
+
+    async def main():
+        manager = JobManager(JobStore(db_path), {"ppt": runner}, max_workers=1, max_attempts=3)
+        await manager.start()
+        retry = await _wait_finished(manager, "retry")
+        crashy = await manager.get("crashy")
+        await manager.stop()
+        return crashy, retry
+
+    crashy, retry = asyncio.run(main())
+    assert ran == ["retry"]
+    assert crashy["status"] == "failed"
+    assert crashy["attempts"] == 3
+    assert retry["status"] == "completed"
+    assert retry["attempts"] == 3
+
+
+def test_store_adds_attempts_column_to_old_database(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE jobs (
+            job_id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            message TEXT,
+            payload TEXT NOT NULL,
+            result TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("INSERT INTO jobs VALUES ('old', 'word', 'processing', '', '{}', NULL, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = JobStore(db_path)
+    assert store.get("old")["attempts"] == 0
+    assert [job["task_id"] for job in store.list_unfinished()] == ["old"]
+    assert store.start_attempt("old", "正在生成文件...") == 1
+    store.create("new", "ppt", {}, "任务已提交到队列")
+    assert store.get("new")["attempts"] == 0
+    assert store.get("new")["status"] == "queued"
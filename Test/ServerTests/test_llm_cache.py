@@ -0,0 +1,152 @@
+"""
+测试两级LLM响应缓存 LLMResponseCache
+
+覆盖TTL过期、内存层字节上限与LRU淘汰、磁盘层容量淘汰、覆盖写入时的磁盘占用统计
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer import llm_cache
+from FileRequestServer.llm_cache import LLMResponseCache, make_cache_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(llm_cache, "time", SimpleNamespace(time=fake.time))
+    return fake
+
+
+def _key(name):
+    return make_cache_key([{"role": "user", "content": name}], "model", {})
+
+
+def _memory_cache(**kwargs):
+    return LLMResponseCache(enabled=True, disk_enabled=False, **kwargs)
+
+
+def _disk_cache(tmp_path, **kwargs):
+    return LLMResponseCache(enabled=True, disk_enabled=True, disk_dir=str(tmp_path / "cache"), **kwargs)
+
+
+def test_cache_key_depends_on_messages_model_and_params():
+    messages = [{"role": "user", "content": "光合作用"}]
+    assert make_cache_key(messages, "m", {"temperature": 0.7}) == make_cache_key(messages, "m", {"temperature": 0.7})
+    assert make_cache_key(messages, "m", {}) != make_cache_key(messages, "other", {})
+    assert make_cache_key(messages, "m", {}) != make_cache_key(messages, "m", {"temperature": 0.7})
+
+
+def test_memory_entry_expires_after_ttl(clock):
+    cache = _memory_cache(ttl_seconds=60)
+    cache.put(_key("a"), "value")
+    clock.now += 59
+    assert cache.get(_key("a")) == "value"
+    clock.now += 2
+    assert cache.get(_key("a")) is None
+    assert cache.stats()["memory_entries"] == 0
+    assert cache.stats()["misses"] == 1
+
+
+def test_memory_byte_cap_evicts_least_recently_used(clock):
+    cache = _memory_cache(memory_max_bytes=30, ttl_seconds=60)
+    for name in ("a", "b", "c"):
+        cache.put(_key(name), name * 10)
+    # 访问 a 后，最久未使用的是 b
+    assert cache.get(_key("a")) == "a" * 10
+    cache.put(_key("d"), "d" * 10)
+
+    assert cache.get(_key("b")) is None
+    assert [cache.get(_key(name)) for name in ("a", "c", "d")] == ["a" * 10, "c" * 10, "d" * 10]
+    stats = cache.stats()
+    assert stats["memory_bytes"] == 30
+    assert stats["memory_evictions"] == 1
+
+
+def test_oversized_value_replaces_older_memory_value(clock, tmp_path):
+    cache = _disk_cache(tmp_path, memory_max_bytes=20, ttl_seconds=60)
+    cache.put(_key("a"), "old")
+    cache.put(_key("a"), "new" * 10)
+    # 新值放不进内存层，应从磁盘层读到新值，而不是内存中的旧值
+    assert cache.get(_key("a")) == "new" * 10
+    assert cache.stats()["memory_bytes"] == 0
+
+    memory_only = _memory_cache(memory_max_bytes=20, ttl_seconds=60)
+    memory_only.put(_key("a"), "old")
+    memory_only.put(_key("a"), "new" * 10)
+    assert memory_only.get(_key("a")) is None
+
+
+def test_disk_hit_backfills_memory(clock, tmp_path):
+    _disk_cache(tmp_path, ttl_seconds=60).put(_key("a"), "value")
+
+    cache = _disk_cache(tmp_path, ttl_seconds=60)
+    assert cache.get(_key("a")) == "value"
+    assert cache.get(_key("a")) == "value"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_disk_entry_expires_after_ttl(clock, tmp_path):
+    _disk_cache(tmp_path, ttl_seconds=60).put(_key("a"), "value")
+    path = _disk_cache(tmp_path)._disk_path(_key("a"))
+    assert os.path.exists(path)
+
+    clock.now += 61
+    assert _disk_cache(tmp_path, ttl_seconds=60).get(_key("a")) is None
+    assert not os.path.exists(path)
+
+
+def _age(cache, key, seconds):
+    path = cache._disk_path(key)
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_disk_size_limit_evicts_oldest_files(clock, tmp_path):
+    cache = _disk_cache(tmp_path, disk_max_bytes=250, ttl_seconds=3600)
+    cache.put(_key("a"), "a" * 100)
+    _age(cache, _key("a"), 30)
+    cache.put(_key("b"), "b" * 100)
+    _age(cache, _key("b"), 20)
+    cache.put(_key("c"), "c" * 100)
+
+    # 超出容量后删除最旧的文件，降到容量的90%以内
+    assert not os.path.exists(cache._disk_path(_key("a")))
+    assert os.path.exists(cache._disk_path(_key("b")))
+    assert os.path.exists(cache._disk_path(_key("c")))
+    stats = cache.stats()
+    assert stats["disk_bytes"] == 200
+    assert stats["disk_evictions"] == 1
+
+
+def test_overwriting_disk_entry_counts_size_difference(clock, tmp_path):
+    cache = _disk_cache(tmp_path, disk_max_bytes=250, ttl_seconds=3600)
+    cache.put(_key("a"), "a" * 100)
+    cache.put(_key("b"), "b" * 100)
+    for size in (100, 120, 40, 100):
+        cache.put(_key("b"), "b" * size)
+        assert cache.stats()["disk_bytes"] == cache._scan_disk_bytes() == 100 + size
+
+    # 反复覆盖同一个键不会被误算成超出容量
+    assert cache.stats()["disk_evictions"] == 0
+    assert os.path.exists(cache._disk_path(_key("a")))
+
+
+def test_disabled_cache_stores_nothing(tmp_path):
+    cache = LLMResponseCache(enabled=False, disk_enabled=True, disk_dir=str(tmp_path / "cache"))
+    cache.put(_key("a"), "value")
+    assert cache.get(_key("a")) is None
+    assert not os.path.exists(tmp_path / "cache")
@@ -0,0 +1,187 @@
+"""
+测试LLM限流：令牌桶按到达顺序放行，AIMD并发上限的加性增加与乘性减少，流式调用按首token耗时判断
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer.config import LLM_RATE_LIMIT_CONFIG
+from FileRequestServer.llm_limiter import AdaptiveConcurrencyLimiter, LLMRateLimiter, TokenBucket
+
+
+class OverloadedError(Exception):
+    status_code = 429
+
+
+def _aimd(initial=4, minimum=1, maximum=8, latency_target=1.0, first_token_target=None):
+    return AdaptiveConcurrencyLimiter(
+        initial=initial,
+        minimum=minimum,
+        maximum=maximum,
+        latency_target=latency_target,
+        decrease_factor=0.5,
+        first_token_target=first_token_target,
+    )
+
+
+def _rate_limiter(**overrides):
+    config = {
+        **LLM_RATE_LIMIT_CONFIG,
+        "enabled": True,
+        "requests_per_minute": 0,
+        "tokens_per_minute": 0,
+        "initial_concurrency": 4,
+        **overrides,
+    }
+    return LLMRateLimiter(config)
+
+
+def test_token_bucket_serves_waiters_in_arrival_order():
+    async def main():
+        # 每秒补充1000个令牌，容量50
+        bucket = TokenBucket(60_000, capacity=50)
+        await bucket.acquire(50)
+        order = []
+
+        async def take(name, amount):
+            await bucket.acquire(amount)
+            order.append(name)
+
+        tasks = [asyncio.create_task(take("large", 50))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(take(f"small-{i}", 1)) for i in range(3)]
+        await asyncio.gather(*tasks)
+        return order
+
+    # 小请求不能在先到的大请求之前插队
+    assert asyncio.run(main()) == ["large", "small-0", "small-1", "small-2"]
+
+
+def test_token_bucket_clamps_oversized_request_and_refunds():
+    async def main():
+        bucket = TokenBucket(60_000, capacity=50)
+        # 超过容量的请求按满桶处理，不会永远等待
+        await asyncio.wait_for(bucket.acquire(500), timeout=1)
+        assert bucket.available < 5
+        bucket.adjust(30)
+        assert bucket.available >= 30
+        bucket.adjust(1000)
+        assert bucket.available == 50
+
+    asyncio.run(main())
+
+
+def test_token_bucket_without_quota_never_waits():
+    async def main():
+        bucket = TokenBucket(0)
+        for _ in range(1000):
+            await bucket.acquire(10**9)
+
+    asyncio.run(asyncio.wait_for(main(), timeout=1))
+
+
+def test_aimd_increases_additively_on_fast_success():
+    async def main():
+        limiter = _aimd(initial=4)
+        for _ in range(4):
+            epoch = await limiter.acquire()
+            await limiter.release(epoch, latency=0.1, overloaded=False)
+        # 每次 +1/limit，满并发一轮约 +1
+        assert 4.9 < limiter._limit < 5
+        assert limiter.limit == 4
+        epoch = await limiter.acquire()
+        await limiter.release(epoch, latency=0.1, overloaded=False)
+        assert limiter.limit == 5
+
+    asyncio.run(main())
+
+
+def test_aimd_keeps_limit_when_slow_and_clamps_to_maximum():
+    async def main():
+        limiter = _aimd(initial=8, maximum=8)
+        epoch = await limiter.acquire()
+        await limiter.release(epoch, latency=5.0, overloaded=False)
+        assert limiter._limit == 8
+        for _ in range(20):
+            epoch = await limiter.acquire()
+            await limiter.release(epoch, latency=0.1, overloaded=False)
+        assert limiter._limit == 8
+
+    asyncio.run(main())
+
+
+def test_aimd_decreases_once_per_epoch_on_overload():
+    async def main():
+        limiter = _aimd(initial=8)
+        epochs = [await limiter.acquire() for _ in range(4)]
+        # 同一批并发中的多个429只减少一次
+        for epoch in epochs:
+            await limiter.release(epoch, latency=None, overloaded=True)
+        assert limiter.limit == 4
+        epoch = await limiter.acquire()
+        await limiter.release(epoch, latency=None, overloaded=True)
+        assert limiter.limit == 2
+        for _ in range(5):
+            epoch = await limiter.acquire()
+            await limiter.release(epoch, latency=None, overloaded=True)
+        assert limiter.limit == 1
+
+    asyncio.run(main())
+
+
+def test_aimd_blocks_beyond_limit_until_release():
+    async def main():
+        limiter = _aimd(initial=2)
+        epochs = [await limiter.acquire() for _ in range(2)]
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await limiter.release(epochs[0], latency=5.0, overloaded=False)
+        await asyncio.wait_for(waiter, timeout=1)
+        assert limiter.in_flight == 2
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("streamed", [False, True])
+def test_slot_judges_streams_by_first_token_latency(streamed):
+    async def main():
+        limiter = _rate_limiter(latency_target_seconds=0.02, first_token_target_seconds=1.0)
+        async with limiter.slot(100) as permit:
+            if streamed:
+                permit.record_first_token()
+            # 整个响应的耗时超过 latency_target
+            await asyncio.sleep(0.05)
+        return limiter.concurrency._limit
+
+    limit = asyncio.run(main())
+    # 流式调用首token很快，并发上限增加；非流式调用整体耗时超标，保持不变
+    assert limit == (4.25 if streamed else 4)
+
+
+def test_slot_slow_first_token_does_not_increase():
+    async def main():
+        limiter = _rate_limiter(latency_target_seconds=10.0, first_token_target_seconds=0.02)
+        async with limiter.slot(100) as permit:
+            await asyncio.sleep(0.05)
+            permit.record_first_token()
+        return limiter.concurrency._limit
+
+    assert asyncio.run(main()) == 4
+
+
+def test_slot_overload_error_halves_limit():
+    async def main():
+        limiter = _rate_limiter()
+        with pytest.raises(OverloadedError):
+            async with limiter.slot(100):
+                raise OverloadedError()
+        return limiter
+
+    limiter = asyncio.run(main())
+    assert limiter.concurrency.limit == 2
+    assert limiter.stats()["overloaded"] == 1
+    assert limiter.concurrency.in_flight == 0
@@ -0,0 +1,229 @@
+"""
+测试LLM重试与对冲 RetryPolicy
+
+错误分类、Retry-After、退避重试次数以及对冲请求的触发条件；退避等待通过替换 asyncio.sleep 记录，不实际等待
+"""
+import asyncio
+import os
+import sys
+
+import httpx
+import openai
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer import llm_retry
+from FileRequestServer.config import LLM_RETRY_CONFIG
+from FileRequestServer.llm_retry import (
+    MalformedResponseError,
+    RetryPolicy,
+    classify_error,
+    validate_json_content,
+)
+
+REQUEST = httpx.Request("POST", "https://llm.example/v1/chat/completions")
+
+
+def _status_error(status_code, headers=None):
+    response = httpx.Response(status_code, headers=headers, request=REQUEST)
+    return openai.APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+def _rate_limit_error(retry_after=None):
+    headers = {"retry-after": retry_after} if retry_after is not None else None
+    response = httpx.Response(429, headers=headers, request=REQUEST)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def _policy(**overrides):
+    return RetryPolicy({**LLM_RETRY_CONFIG, **overrides})
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """记录退避等待时长，不实际等待"""
+    recorded = []
+
+    async def fake_sleep(seconds):
+        recorded.append(seconds)
+
+    monkeypatch.setattr(llm_retry.asyncio, "sleep", fake_sleep)
+    return recorded
+
+
+@pytest.mark.parametrize(
+    "exc, kind",
+    [
+        (_rate_limit_error(), "rate_limit"),
+        (_status_error(500), "server_error"),
+        (_status_error(503), "server_error"),
+        (openai.APITimeoutError(request=REQUEST), "timeout"),
+        (httpx.ReadTimeout("read timed out", request=REQUEST), "timeout"),
+        (asyncio.TimeoutError(), "timeout"),
+        (openai.APIConnectionError(request=REQUEST), "connection"),
+        (httpx.ConnectError("connection refused", request=REQUEST), "connection"),
+        (MalformedResponseError("AI响应JSON解析失败"), "malformed_json"),
+        (_status_error(400), None),
+        (_status_error(401), None),
+        (ValueError("参数错误"), None),
+    ],
+)
+def test_classify_error(exc, kind):
+    assert classify_error(exc) == kind
+
+
+def test_validate_json_content():
+    validate_json_content('前言 {"slides": [{"title": "一"}]} 結尾')
+    for content in (None, "", "冇JSON", '{"slides": [}'):
+        with pytest.raises(MalformedResponseError):
+            validate_json_content(content)
+
+
+def test_backoff_honours_retry_after(monkeypatch):
+    monkeypatch.setattr(llm_retry.random, "uniform", lambda low, high: high)
+    policy = _policy(base_delay=1.0, max_delay=30.0)
+    assert policy.backoff(1, _status_error(500)) == 1.0
+    assert policy.backoff(3, _status_error(500)) == 4.0
+    # 不少于服务端要求的 Retry-After，但不超过 max_delay
+    assert policy.backoff(1, _rate_limit_error("7")) == 7.0
+    assert policy.backoff(1, _rate_limit_error("120")) == 30.0
+    assert policy.backoff(1, _rate_limit_error("soon")) == 1.0
+    assert policy.backoff(10, _status_error(500)) == 30.0
+
+
+def test_run_retries_rate_limit_after_retry_after(sleeps):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        if len(calls) == 1:
+            raise _rate_limit_error("5")
+        return "ok"
+
+    policy = _policy(base_delay=0.1)
+    assert asyncio.run(policy.run(call)) == "ok"
+    assert len(calls) == 2
+    assert sleeps == [5.0]
+    assert policy.stats()["retry_rate_limit"] == 1
+
+
+def test_run_gives_up_after_max_attempts(sleeps):
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise _status_error(502)
+
+    policy = _policy(max_attempts=3)
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(policy.run(call))
+    assert len(calls) == 3
+    assert len(sleeps) == 2
+    assert policy.stats()["exhausted"] == 1
+
+
+def test_run_does_not_retry_client_errors_or_vetoed_errors(sleeps):
+    calls = []
+
+    async def bad_request():
+        calls.append(1)
+        raise _status_error(400)
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(_policy().run(bad_request))
+
+    async def timeout():
+        calls.append(1)
+        raise openai.APITimeoutError(request=REQUEST)
+
+    # 流式输出已经开始时调用方不允许重试
+    with pytest.raises(openai.APITimeoutError):
+        asyncio.run(_policy().run(timeout, should_retry=lambda exc: False))
+    assert len(calls) == 2
+    assert sleeps == []
+
+
+def _hedge_policy(**overrides):
+    return _policy(hedge_enabled=True, hedge_default_delay=0.05, hedge_min_delay=0.0, **overrides)
+
+
+class SlowThenFast:
+    """第一次调用很慢，之后的调用立即返回"""
+
+    def __init__(self):
+        self.calls = 0
+        self.first_cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        call = self.calls
+        if call == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                self.first_cancelled = True
+                raise
+        return f"result-{call}"
+
+
+def test_hedge_fires_after_delay_and_takes_first_result():
+    policy = _hedge_policy()
+    call = SlowThenFast()
+
+    async def main():
+        result = await policy.run(call, key="ppt", hedge=True)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(main()) == "result-2"
+    assert call.calls == 2
+    # 落后的请求被取消
+    assert call.first_cancelled
+    assert policy.stats()["hedges"] == policy.stats()["hedge_wins"] == 1
+
+
+def test_hedge_not_fired_for_fast_calls_or_without_capacity():
+    policy = _hedge_policy()
+    calls = []
+
+    async def fast():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(policy.run(fast, key="word", hedge=True)) == "ok"
+    assert len(calls) == 1
+
+    slow = SlowThenFast()
+
+    async def without_capacity():
+        task = asyncio.ensure_future(policy.run(slow, key="word", hedge=True, can_hedge=lambda: False))
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(without_capacity())
+    # 上游没有空闲并发名额时不发出对冲请求
+    assert slow.calls == 1
+    assert policy.stats()["hedges"] == 0
+
+
+def test_hedge_delay_uses_recent_latency_percentile():
+    policy = _policy(hedge_enabled=True, hedge_min_samples=5, hedge_default_delay=60.0, hedge_min_delay=2.0)
+    assert policy.hedge_delay("ppt") == 60.0
+    for seconds in (3, 4, 5, 6, 30):
+        policy.latency.record("ppt", seconds)
+    assert policy.hedge_delay("ppt") == 30
+    assert policy.hedge_delay("word") == 60.0
+    for _ in range(200):
+        policy.latency.record("fast", 0.1)
+    assert policy.hedge_delay("fast") == 2.0
+    assert _policy(hedge_enabled=False).hedge_delay("ppt") is None
+
+
+def test_hedge_reports_error_when_all_attempts_fail(sleeps):
+    policy = _hedge_policy(max_attempts=1)
+
+    async def failing():
+        raise _status_error(500)
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(policy.run(failing, key="ppt", hedge=True))
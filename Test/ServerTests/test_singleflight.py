@@ -0,0 +1,140 @@
+"""
+测试请求合并 SingleFlight
+
+相同键的并发调用只执行一次生成；第一个调用者被取消不影响其他等待者；失败会传递给所有参与者
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer.singleflight import SingleFlight
+
+
+class FakeGenerator:
+    """模拟一次LLM生成：记录调用次数，等到 release 后返回结果或抛出异常"""
+
+    def __init__(self, error=None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return f"result-{self.calls}"
+
+
+async def _call(flight, key, generator, cleaned=None):
+    cleanup = cleaned.append if cleaned is not None else None
+    async with flight.join(key, generator, cleanup) as (result, sole):
+        return result, sole
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_concurrent_identical_requests_call_generator_once():
+    async def main():
+        flight = SingleFlight()
+        generator = FakeGenerator()
+        cleaned = []
+        callers = [asyncio.create_task(_call(flight, "same", generator, cleaned)) for _ in range(5)]
+        await _settle()
+        assert flight.in_flight() == 1
+        generator.release.set()
+        results = await asyncio.gather(*callers)
+        return generator, results, cleaned, flight
+
+    generator, results, cleaned, flight = asyncio.run(main())
+    assert generator.calls == 1
+    assert results == [("result-1", False)] * 5
+    # 结果被共享时，所有参与者退出后只释放一次
+    assert cleaned == ["result-1"]
+    assert flight.in_flight() == 0
+
+
+def test_different_keys_and_later_calls_run_separately():
+    async def main():
+        flight = SingleFlight()
+        generator = FakeGenerator()
+        generator.release.set()
+        first = await asyncio.gather(_call(flight, "a", generator), _call(flight, "b", generator))
+        later = await _call(flight, "a", generator)
+        return generator, first, later
+
+    generator, first, later = asyncio.run(main())
+    assert generator.calls == 3
+    assert sorted(first) == [("result-1", True), ("result-2", True)]
+    assert later == ("result-3", True)
+
+
+def test_sole_participant_owns_result_without_cleanup():
+    async def main():
+        generator = FakeGenerator()
+        generator.release.set()
+        cleaned = []
+        result = await _call(SingleFlight(), "only", generator, cleaned)
+        return result, cleaned
+
+    result, cleaned = asyncio.run(main())
+    assert result == ("result-1", True)
+    assert cleaned == []
+
+
+def test_cancelled_first_caller_does_not_cancel_waiters():
+    async def main():
+        flight = SingleFlight()
+        generator = FakeGenerator()
+        cleaned = []
+        first = asyncio.create_task(_call(flight, "same", generator, cleaned))
+        await _settle()
+        waiters = [asyncio.create_task(_call(flight, "same", generator, cleaned)) for _ in range(2)]
+        await _settle()
+
+        # 发起生成的调用者断开（例如客户端关闭连接）
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert not generator.cancelled
+
+        generator.release.set()
+        results = await asyncio.gather(*waiters)
+        return generator, results, cleaned
+
+    generator, results, cleaned = asyncio.run(main())
+    assert generator.calls == 1
+    assert not generator.cancelled
+    assert results == [("result-1", False)] * 2
+    assert cleaned == ["result-1"]
+
+
+def test_failure_reaches_every_participant():
+    async def main():
+        flight = SingleFlight()
+        generator = FakeGenerator(error=RuntimeError("上游返回500"))
+        cleaned = []
+        callers = [asyncio.create_task(_call(flight, "same", generator, cleaned)) for _ in range(3)]
+        await _settle()
+        generator.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        return generator, results, cleaned, flight
+
+    generator, results, cleaned, flight = asyncio.run(main())
+    assert generator.calls == 1
+    assert len(results) == 3
+    assert all(isinstance(error, RuntimeError) and str(error) == "上游返回500" for error in results)
+    assert cleaned == []
+    # 失败后不保留该键，之后的请求会重新生成
+    assert flight.in_flight() == 0
@@ -0,0 +1,199 @@
+"""
+测试token预算 TokenAccountant
+
+plan 按 output_profiles 计算 max_tokens、放不下时给出 fit_units、require_fit 拒绝请求、observe 校准；
+对冲时只用最终返回的响应校准一次
+"""
+import asyncio
+import math
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat.chat_completion import Choice
+from openai.types.completion_usage import CompletionUsage
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from FileRequestServer import llm_gateway
+from FileRequestServer.config import LLM_RETRY_CONFIG, TOKEN_BUDGET_CONFIG
+from FileRequestServer.llm_cache import response_cache
+from FileRequestServer.token_budget import TokenAccountant, TokenBudgetError
+
+MODEL = "test-model-32k"
+MESSAGES = [
+    {"role": "system", "content": "你是一位教師。" * 20},
+    {"role": "user", "content": "Photosynthesis 光合作用 " * 30},
+]
+
+
+@pytest.fixture
+def accountant():
+    return TokenAccountant()
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return SimpleNamespace(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+
+def test_plan_sets_max_tokens_from_output_profile(accountant):
+    budget = accountant.plan(MESSAGES, "ppt", units=10, model=MODEL)
+    base, per_unit = TOKEN_BUDGET_CONFIG["output_profiles"]["ppt"]
+    expected = base + per_unit * 10
+    assert budget.expected_output_tokens == expected
+    assert budget.max_tokens == math.ceil(expected * TOKEN_BUDGET_CONFIG["safety_margin"])
+    assert budget.fits and budget.fit_units == 10
+    assert budget.prompt_tokens == accountant.estimate_messages(MESSAGES, MODEL)
+    budget.require_fit()
+
+
+def test_context_window_from_config_or_model_suffix(accountant, monkeypatch):
+    monkeypatch.setitem(TOKEN_BUDGET_CONFIG, "context_windows", {"custom": 4096})
+    assert accountant.context_window("custom") == 4096
+    assert accountant.context_window("moonshot-v1-128k") == 128 * 1024
+    assert accountant.context_window("unknown") == TOKEN_BUDGET_CONFIG["default_context_window"]
+
+
+def test_plan_downgrades_units_when_context_is_small(accountant, monkeypatch):
+    monkeypatch.setitem(TOKEN_BUDGET_CONFIG, "context_windows", {"tiny": 3000})
+    budget = accountant.plan(MESSAGES, "ppt", units=20, model="tiny")
+    cap = 3000 - budget.prompt_tokens - TOKEN_BUDGET_CONFIG["context_reserve_tokens"]
+    base, per_unit = TOKEN_BUDGET_CONFIG["output_profiles"]["ppt"]
+    assert not budget.fits
+    assert budget.fit_units == (cap - base) // per_unit
+    assert budget.max_tokens == cap
+    with pytest.raises(TokenBudgetError):
+        budget.require_fit()
+
+    # 按 fit_units 重新规划后放得下
+    downgraded = accountant.plan(MESSAGES, "ppt", units=budget.fit_units, model="tiny")
+    assert downgraded.fits
+
+
+def test_plan_rejects_prompt_larger_than_context(accountant, monkeypatch):
+    monkeypatch.setitem(TOKEN_BUDGET_CONFIG, "context_windows", {"tiny": 600})
+    with pytest.raises(TokenBudgetError):
+        accountant.plan(MESSAGES, "word", units=5, model="tiny")
+
+
+def test_disabled_budget_leaves_max_tokens_unset(accountant, monkeypatch):
+    monkeypatch.setitem(TOKEN_BUDGET_CONFIG, "enabled", False)
+    budget = accountant.plan(MESSAGES, "ppt", units=1000, model=MODEL)
+    assert budget.max_tokens is None
+    assert budget.fits
+
+
+def test_observe_calibrates_prompt_and_output_estimates(accountant):
+    alpha = TOKEN_BUDGET_CONFIG["calibration_alpha"]
+    budget = accountant.plan(MESSAGES, "ppt", units=10, model=MODEL)
+    raw_prompt = accountant._raw_message_tokens(MESSAGES)
+
+    accountant.observe(MODEL, MESSAGES, _usage(2 * raw_prompt, 2 * budget.raw_output_tokens), "stop", budget)
+    stats = accountant.stats()
+    assert stats["prompt_factors"][MODEL] == pytest.approx(1 + alpha)
+    assert stats["output_factors"][(MODEL, "ppt")] == pytest.approx(1 + alpha)
+
+    recalibrated = accountant.plan(MESSAGES, "ppt", units=10, model=MODEL)
+    assert recalibrated.prompt_tokens > budget.prompt_tokens
+    assert recalibrated.max_tokens > budget.max_tokens
+    # 其他模型、其他输出类型不受影响
+    assert accountant.plan(MESSAGES, "ppt", units=10, model="other-32k").max_tokens == budget.max_tokens
+    assert accountant.plan(MESSAGES, "word", units=10, model=MODEL).expected_output_tokens == (
+        accountant.plan(MESSAGES, "word", units=10, model="other-32k").expected_output_tokens
+    )
+
+
+def test_observe_clamps_ratio_and_boosts_truncated_output(accountant):
+    alpha = TOKEN_BUDGET_CONFIG["calibration_alpha"]
+    low, high = TOKEN_BUDGET_CONFIG["calibration_bounds"]
+    budget = accountant.plan(MESSAGES, "ppt", units=10, model=MODEL)
+    accountant.observe(MODEL, MESSAGES, _usage(None, 100 * budget.raw_output_tokens), "stop", budget)
+    assert accountant.stats()["output_factors"][(MODEL, "ppt")] == pytest.approx(1 + alpha * (high - 1))
+    assert accountant.stats()["prompt_factors"] == {}
+
+    truncated = accountant.plan(MESSAGES, "word", units=5, model=MODEL)
+    max_tokens = truncated.max_tokens
+    accountant.observe(MODEL, MESSAGES, _usage(None, truncated.raw_output_tokens), "length", truncated)
+    growth = TOKEN_BUDGET_CONFIG["truncation_growth"]
+    assert accountant.stats()["output_factors"][(MODEL, "word")] == pytest.approx(1 + alpha * (growth - 1))
+    # observe 只校准，不改变本次预算
+    assert truncated.max_tokens == max_tokens
+
+
+def test_record_truncation_expands_budget_once_per_attempted_max_tokens(accountant):
+    budget = accountant.plan(MESSAGES, "ppt", units=10, model=MODEL)
+    attempted = budget.max_tokens
+    accountant.record_truncation(budget, attempted)
+    expanded = budget.max_tokens
+    assert expanded == math.ceil(attempted * TOKEN_BUDGET_CONFIG["truncation_growth"])
+    # 对冲的另一个尝试用的是同一个 max_tokens，不再重复放大
+    accountant.record_truncation(budget, attempted)
+    assert budget.max_tokens == expanded
+    accountant.record_truncation(budget, expanded)
+    assert budget.max_tokens > expanded
+
+
+def _completion(content, finish_reason="stop", completion_tokens=100):
+    return ChatCompletion(
+        id="test",
+        object="chat.completion",
+        created=0,
+        model=MODEL,
+        choices=[
+            Choice(
+                index=0,
+                finish_reason=finish_reason,
+                message=ChatCompletionMessage(role="assistant", content=content),
+            )
+        ],
+        usage=CompletionUsage(prompt_tokens=500, completion_tokens=completion_tokens, total_tokens=500 + completion_tokens),
+    )
+
+
+class FakeClient:
+    """第一次请求较慢且返回被截断的JSON，对冲发出的第二次请求稍后返回有效结果"""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if len(self.requests) == 1:
+            await asyncio.sleep(0.05)
+            return _completion('{"slides": [', finish_reason="length")
+        await asyncio.sleep(0.1)
+        return _completion('{"slides": []}')
+
+
+def test_hedged_call_calibrates_only_from_returned_response(monkeypatch):
+    client = FakeClient()
+    observed = []
+    truncations = []
+    monkeypatch.setattr(llm_gateway, "get_async_client", lambda base_url, api_key: client)
+    monkeypatch.setattr(llm_gateway.token_accountant, "observe", lambda *args, **kwargs: observed.append(args))
+    real_record_truncation = llm_gateway.token_accountant.record_truncation
+    monkeypatch.setattr(
+        llm_gateway.token_accountant,
+        "record_truncation",
+        lambda budget, max_tokens: (truncations.append(max_tokens), real_record_truncation(budget, max_tokens)),
+    )
+    monkeypatch.setattr(response_cache, "enabled", False)
+    monkeypatch.setitem(LLM_RETRY_CONFIG, "hedge_enabled", True)
+    monkeypatch.setitem(LLM_RETRY_CONFIG, "hedge_default_delay", 0.01)
+    monkeypatch.setitem(LLM_RETRY_CONFIG, "hedge_min_delay", 0.0)
+    monkeypatch.setitem(LLM_RETRY_CONFIG, "hedge_min_samples", 10**6)
+
+    budget = TokenAccountant().plan(MESSAGES, "ppt", units=10, model=MODEL)
+    response = llm_gateway.chat_completion(
+        MESSAGES, model=MODEL, token_budget=budget, response_format={"type": "json_object"}
+    )
+
+    assert response.choices[0].message.content == '{"slides": []}'
+    assert len(client.requests) == 2
+    # 被截断的尝试只放大预算，不参与校准；校准只按最终返回的响应做一次
+    assert truncations == [client.requests[0]["max_tokens"]]
+    assert len(observed) == 1
+    assert observed[0][2] is response.usage
+    assert observed[0][3] == "stop"
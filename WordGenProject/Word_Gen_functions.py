@@ -3,54 +3,143 @@ Word文档生成核心功能模块
 使用OpenAI API生成内容，然后使用docxtpl填充模板
 """
 
+import asyncio
+import io
 import json
 import os
+import re
 import datetime
-from typing import Dict, Any, Optional
-from docxtpl import DocxTemplate
-from openai import OpenAI
+from typing import Dict, Any, List, Optional, Union
 from WordGenProject.Word_Prompt import (
     get_word_generation_prompt,
-    get_agent_system_prompt,
+    get_word_generation_system_prompt,
+    get_word_component_prompt,
+    get_word_component_system_prompt,
+    get_word_summary_prompt,
+    get_word_summary_system_prompt,
 )
-from FileRequestServer.config import LOGGING_CONFIG, OPENAI_CONFIG, WORD_CONFIG, PATHS
-import opencc
-converter_hk = opencc.OpenCC('s2hk')
+from FileRequestServer.config import LOGGING_CONFIG, WORD_CONFIG, PATHS
+from FileRequestServer.content_digest import digest_content, digest_content_async
+from FileRequestServer.generated_file import GeneratedFile
+from FileRequestServer.llm_gateway import achat_completion, chat_completion, run_sync
+from FileRequestServer.metrics import stage_timer
+from FileRequestServer.progress import report_progress
+from FileRequestServer.structured_logging import get_logger
+from FileRequestServer.template_registry import template_registry
+from FileRequestServer.text_converter import resolve_chinese_variant, text_converter
+from FileRequestServer.token_budget import TokenBudget, token_accountant
+
+logger = get_logger(__name__)
+
+# "single": 一次调用生成全部内容；"parallel": 先生成摘要，再并发生成各组成部分
+WORD_GENERATION_MODES = ("single", "parallel")
+# parallel模式下并发生成的组成部分，与 prepare_template_context 中的字段对应
+WORD_PARALLEL_COMPONENTS = ("multiple_choice", "short_answer_questions", "quiz_data", "teaching_suggestions")
+# 需要照搬原文的组成部分直接使用完整学习内容，不等待摘要
+_VERBATIM_COMPONENTS = ("quiz_data",)
+# 用户要求中的题数，如 "5道选择题"、"3 questions"
+_QUESTION_COUNT_PATTERN = re.compile(r"(\d+)\s*(?:道|條|条|題|题|questions?)", re.IGNORECASE)
+# 按题数估算输出规模的组成部分
+_COUNTED_COMPONENTS = ("multiple_choice", "short_answer_questions")
+
+def _build_word_messages(prompt: str, system_prompt: str) -> List[Dict[str, str]]:
+    """构建Word内容生成的对话消息：固定的系统提示词在前，便于命中服务商的前缀缓存"""
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def estimate_question_count(user_requirements: Optional[str]) -> int:
+    """从用户要求中估算题目总数，没有写明题数时使用配置的默认值"""
+    counts = [int(count) for count in _QUESTION_COUNT_PATTERN.findall(user_requirements or "")]
+    return sum(counts) or WORD_CONFIG["default_question_count"]
+
+
+def _quiz_output_tokens(learning_content: str) -> int:
+    """学习内容片段照搬原文，输出规模随学习内容增长（有上限）"""
+    return min(
+        int(token_accountant.estimate_text(learning_content) * WORD_CONFIG["quiz_content_ratio"]),
+        WORD_CONFIG["quiz_max_tokens"],
+    )
+
+
+def _plan_word_budget(
+    prompt: str, system_prompt: str, kind: str = "word", units: int = 1, extra_output_tokens: int = 0
+) -> TokenBudget:
+    """为一次Word内容生成调用规划输出预算"""
+    return token_accountant.plan(
+        _build_word_messages(prompt, system_prompt), kind, units, extra_output_tokens=extra_output_tokens
+    )
+
+
+def _extract_content(response) -> str:
+    """从模型响应中提取文本内容"""
+    content = response.choices[0].message.content
+    if content is None:
+        raise ValueError("AI响应内容为空")
 
-def call_openai_api(prompt: str, system_prompt: str) -> str:
+    return content.strip()
+
+
+def call_openai_api(
+    prompt: str,
+    system_prompt: str,
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+) -> str:
     """
     调用OpenAI API生成内容
 
     Args:
         prompt (str): 发送给AI的提示词
+        system_prompt (str): 系统提示词
+        use_cache (bool): 是否读取LLM响应缓存
+        token_budget (Optional[TokenBudget]): 输出预算，为空时按完整文档（"word"）规划
 
     Returns:
         str: AI生成的内容
     """
     try:
-        client = OpenAI(
-            base_url=OPENAI_CONFIG["base_url"], api_key=OPENAI_CONFIG["api_key"]
-        )
-
-        response = client.chat.completions.create(
-            model=OPENAI_CONFIG["model_path"],
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt},
-            ],
+        if token_budget is None:
+            token_budget = _plan_word_budget(prompt, system_prompt)
+            token_budget.require_fit()
+        response = chat_completion(
+            _build_word_messages(prompt, system_prompt),
+            use_cache=use_cache,
+            token_budget=token_budget,
             temperature=0.7,
-            max_tokens=4000,
             response_format={"type": "json_object"},
         )
+        return _extract_content(response)
+
+    except Exception as e:
+        logger.error("❌ OpenAI API调用失败", error=str(e))
+        raise e
 
-        content = response.choices[0].message.content
-        if content is None:
-            raise ValueError("AI响应内容为空")
 
-        return content.strip()
+async def call_openai_api_async(
+    prompt: str,
+    system_prompt: str,
+    use_cache: bool = True,
+    token_budget: Optional[TokenBudget] = None,
+) -> str:
+    """call_openai_api 的异步版本，可直接在FastAPI事件循环中await"""
+    try:
+        if token_budget is None:
+            token_budget = _plan_word_budget(prompt, system_prompt)
+            token_budget.require_fit()
+        response = await achat_completion(
+            _build_word_messages(prompt, system_prompt),
+            use_cache=use_cache,
+            token_budget=token_budget,
+            temperature=0.7,
+            response_format={"type": "json_object"},
+        )
+        return _extract_content(response)
 
     except Exception as e:
-        print(f"❌ OpenAI API调用失败: {e}")
+        logger.error("❌ OpenAI API调用失败", error=str(e))
         raise e
 
 
@@ -77,11 +166,10 @@ def parse_ai_response(ai_content: str) -> Dict[str, Any]:
             raise ValueError("未找到有效的JSON格式")
 
     except json.JSONDecodeError as e:
-        print(f"❌ JSON解析失败: {e}")
-        print(f"原始内容: {ai_content}")
+        logger.error("❌ JSON解析失败", error=str(e), content=ai_content)
         raise e
     except Exception as e:
-        print(f"❌ 内容解析失败: {e}")
+        logger.error("❌ 内容解析失败", error=str(e))
         raise e
 
 
@@ -114,88 +202,327 @@ def prepare_template_context(parsed_data: Dict[str, Any]) -> Dict[str, Any]:
     return context
 
 
+def _process_ai_response(ai_response: str, chinese_variant: Optional[str] = None) -> Dict[str, Any]:
+    """解析AI响应，并把其中的字符串值转换为繁体"""
+    logger.payload("🔍 AI原始响应", content=ai_response)
+
+    # 解析AI响应
+    with stage_timer("word", "parse"):
+        parsed_data = parse_ai_response(ai_response)
+    # 如果是简体，那么转换为繁体（只转换字符串值，已是繁体时跳过）
+    with stage_timer("word", "convert"):
+        parsed_data = text_converter.convert_data(parsed_data, chinese_variant, source=ai_response)
+    report_progress("parsed")
+
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ AI内容生成完成", chars=len(ai_response))
+    return parsed_data
+
+
+def _plan_single_budget(
+    prompt: str, learning_content: str, user_requirements: Optional[str]
+) -> TokenBudget:
+    """
+    规划single模式的输出预算（按题数和学习内容片段估算）
+
+    上下文窗口放不下完整文档时记录降级，由调用方改用parallel模式；
+    parallel模式每次调用的输出更小，仍放不下时由各组成部分的预算拒绝请求
+    """
+    budget = _plan_word_budget(
+        prompt,
+        get_word_generation_system_prompt(),
+        "word",
+        estimate_question_count(user_requirements),
+        _quiz_output_tokens(learning_content),
+    )
+    if not budget.fits:
+        logger.warning(
+            "⚠️ 上下文窗口放不下完整文档，改为parallel模式",
+            prompt_tokens=budget.prompt_tokens,
+            expected_output_tokens=budget.expected_output_tokens,
+        )
+        report_progress("budget_downgraded", generation_mode="parallel")
+    return budget
+
+
 def generate_document_content(
-    learning_content: str, user_requirements: Optional[str] = None
+    learning_content: str,
+    user_requirements: Optional[str] = None,
+    use_cache: bool = True,
+    chinese_variant: Optional[str] = None,
 ) -> Dict[str, Any]:
     """
     根据用户输入生成文档内容
 
     Args:
         learning_content (str): 用户输入
+        user_requirements (Optional[str]): 用户要求
+        use_cache (bool): 是否读取LLM响应缓存
+        chinese_variant (Optional[str]): 简繁转换目标（"s2hk" | "s2tw" | "none"），为空时使用配置默认值
 
     Returns:
         Dict[str, Any]: 生成的文档内容数据
     """
-    print("🤖 正在调用AI生成word...")
+    # 在调用模型之前检查转换目标，避免无效参数浪费一次调用
+    chinese_variant = resolve_chinese_variant(chinese_variant)
+    prompt = get_word_generation_prompt(learning_content, user_requirements)
+    budget = _plan_single_budget(prompt, learning_content, user_requirements)
+    if not budget.fits:
+        # 单次调用放不下完整文档，改为各组成部分分别生成
+        return generate_document_content_parallel(
+            learning_content, user_requirements, use_cache, chinese_variant
+        )
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("🤖 正在调用AI生成word...", learning_content_chars=len(learning_content))
+    report_progress("llm_started")
 
     # 调用AI生成内容
-    ai_response = call_openai_api(
-        get_word_generation_prompt(learning_content, user_requirements),
-        get_agent_system_prompt(),
-    )
-    # 如果是简体，那么转换为繁体
-    ai_response = converter_hk.convert(ai_response)
-    if LOGGING_CONFIG.get("show_ai_response", True):
-        print(f"🔍 AI原始响应: {ai_response}")
+    with stage_timer("word", "llm"):
+        ai_response = call_openai_api(prompt, get_word_generation_system_prompt(), use_cache, budget)
+    report_progress("llm_finished", chars=len(ai_response))
+    return _process_ai_response(ai_response, chinese_variant)
 
-    # 解析AI响应
-    parsed_data = parse_ai_response(ai_response)
 
-    print("✅ AI内容生成完成")
+async def generate_document_content_async(
+    learning_content: str,
+    user_requirements: Optional[str] = None,
+    use_cache: bool = True,
+    chinese_variant: Optional[str] = None,
+) -> Dict[str, Any]:
+    """generate_document_content 的异步版本"""
+    # 在调用模型之前检查转换目标，避免无效参数浪费一次调用
+    chinese_variant = resolve_chinese_variant(chinese_variant)
+    prompt = get_word_generation_prompt(learning_content, user_requirements)
+    budget = _plan_single_budget(prompt, learning_content, user_requirements)
+    if not budget.fits:
+        return await generate_document_content_parallel_async(
+            learning_content, user_requirements, use_cache, chinese_variant
+        )
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("🤖 正在调用AI生成word...", learning_content_chars=len(learning_content))
+    report_progress("llm_started")
+
+    with stage_timer("word", "llm"):
+        ai_response = await call_openai_api_async(
+            prompt, get_word_generation_system_prompt(), use_cache, budget
+        )
+    report_progress("llm_finished", chars=len(ai_response))
+    # 解析和简繁转换在长工作表上耗时明显，放到线程池中，避免阻塞事件循环上的其他请求
+    return await asyncio.to_thread(_process_ai_response, ai_response, chinese_variant)
+
+
+def resolve_word_generation_mode(generation_mode: Optional[str] = None) -> str:
+    """使用配置文件的默认值补全生成模式，并检查是否可用"""
+    if not generation_mode:
+        generation_mode = WORD_CONFIG["generation_mode"]
+    if generation_mode not in WORD_GENERATION_MODES:
+        raise ValueError(
+            f"未知的生成模式: {generation_mode}，可用模式: {WORD_GENERATION_MODES}"
+        )
+    return generation_mode
+
+
+async def _generate_component_async(
+    component: str, reference: str, user_requirements: Optional[str], use_cache: bool
+) -> List[Any]:
+    """生成一个组成部分，返回对应字段的列表"""
+    prompt = get_word_component_prompt(reference, user_requirements)
+    system_prompt = get_word_component_system_prompt(component)
+    units = estimate_question_count(user_requirements) if component in _COUNTED_COMPONENTS else 1
+    extra = _quiz_output_tokens(reference) if component in _VERBATIM_COMPONENTS else 0
+    budget = _plan_word_budget(prompt, system_prompt, f"word_{component}", units, extra)
+    budget.require_fit()
+    ai_response = await call_openai_api_async(prompt, system_prompt, use_cache, budget)
+    logger.payload("🔍 AI原始响应", component=component, content=ai_response)
+    value = (await asyncio.to_thread(parse_ai_response, ai_response)).get(component)
+    if not isinstance(value, list):
+        raise ValueError(f"组成部分响应中缺少 {component} 数组")
+    return value
+
+
+async def generate_document_content_parallel_async(
+    learning_content: str,
+    user_requirements: Optional[str] = None,
+    use_cache: bool = True,
+    chinese_variant: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    parallel模式：各组成部分分别调用模型并发生成，再组装成与单次调用相同的数据结构
+
+    先用一次调用生成基本信息和知识点摘要（提示词只包含学习内容，不同要求的请求可以共用LLM响应缓存），
+    选择题、简答题和教学建议在摘要完成后并发生成；学习内容片段需要照搬原文，与摘要同时开始。
+    每个组成部分有独立的 max_tokens，总耗时约为 摘要 + 最慢的组成部分。
+    任一调用失败时取消其余调用并抛出异常。
+
+    Returns:
+        Dict[str, Any]: 生成的文档内容数据（已转换繁体）
+    """
+    chinese_variant = resolve_chinese_variant(chinese_variant)
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info(
+            "🤖 正在并发调用AI生成word...",
+            learning_content_chars=len(learning_content),
+            components=len(WORD_PARALLEL_COMPONENTS),
+        )
+    report_progress("llm_started")
+    finished = 0
+
+    async def _summary() -> Dict[str, Any]:
+        prompt = get_word_summary_prompt(learning_content)
+        system_prompt = get_word_summary_system_prompt()
+        budget = _plan_word_budget(prompt, system_prompt, "word_summary")
+        budget.require_fit()
+        with stage_timer("word", "llm_summary"):
+            ai_response = await call_openai_api_async(prompt, system_prompt, use_cache, budget)
+        logger.payload("🔍 AI原始响应", component="summary", content=ai_response)
+        data = await asyncio.to_thread(parse_ai_response, ai_response)
+        report_progress("summary_ready")
+        return data
+
+    async def _component(component: str) -> List[Any]:
+        nonlocal finished
+        if component in _VERBATIM_COMPONENTS:
+            reference = learning_content
+        else:
+            reference = (await summary_task).get("summary") or learning_content
+        value = await _generate_component_async(component, reference, user_requirements, use_cache)
+        finished += 1
+        report_progress(
+            "component_finished", component=component,
+            finished=finished, components=len(WORD_PARALLEL_COMPONENTS),
+        )
+        return value
+
+    with stage_timer("word", "llm"):
+        summary_task = asyncio.ensure_future(_summary())
+        tasks = [summary_task, *(asyncio.ensure_future(_component(c)) for c in WORD_PARALLEL_COMPONENTS)]
+        try:
+            summary, *values = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+    report_progress("llm_finished")
+
+    parsed_data = {key: value for key, value in summary.items() if key != "summary"}
+    parsed_data.update(zip(WORD_PARALLEL_COMPONENTS, values))
+    # 如果是简体，那么转换为繁体（只转换字符串值，已是繁体时跳过）
+    with stage_timer("word", "convert"):
+        parsed_data = await asyncio.to_thread(text_converter.convert_data, parsed_data, chinese_variant)
+    report_progress("parsed")
+
+    if LOGGING_CONFIG["show_progress"]:
+        logger.info("✅ AI内容生成完成", components=len(WORD_PARALLEL_COMPONENTS))
     return parsed_data
 
 
-def create_word_document(context_data: Dict[str, Any], output_filename: str) -> str:
+def generate_document_content_parallel(
+    learning_content: str,
+    user_requirements: Optional[str] = None,
+    use_cache: bool = True,
+    chinese_variant: Optional[str] = None,
+) -> Dict[str, Any]:
+    """generate_document_content_parallel_async 的同步版本（在LLM网关事件循环上执行）"""
+    return run_sync(
+        generate_document_content_parallel_async(
+            learning_content, user_requirements, use_cache, chinese_variant
+        )
+    )
+
+
+def create_word_document(
+    context_data: Dict[str, Any], output_filename: str, in_memory: bool = False
+) -> Union[str, GeneratedFile]:
     """
     使用模板创建Word文档
 
     Args:
         context_data (Dict[str, Any]): 模板上下文数据
         output_filename (str): 输出文件名
+        in_memory (bool): 为True时保存到内存，不写磁盘
 
     Returns:
-        str: 生成的文档路径
+        Union[str, GeneratedFile]: 生成的文档路径；in_memory 为True时返回内存中的文件
     """
     try:
-        print("📝 正在生成Word文档...")
+        logger.debug("📝 正在生成Word文档...")
 
         # 获取模板路径
         template_path = os.path.join(
             PATHS["word_template_folder"], WORD_CONFIG["default_template"]
         )
 
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"模板文件不存在: {template_path}")
+        with stage_timer("word", "render"):
+            # 加载模板（模板内容缓存在内存中）
+            doc = template_registry.open_docx_template(template_path)
+            if doc is None:
+                raise FileNotFoundError(f"模板文件不存在: {template_path}")
+
+            # 渲染模板
+            doc.render(context_data)
+
+        buffer = io.BytesIO()
+        with stage_timer("word", "serialize"):
+            doc.save(buffer)
+        generated = GeneratedFile(f"{output_filename}.docx", buffer.getvalue())
+        if in_memory:
+            report_progress("saved", filename=generated.filename)
+            if LOGGING_CONFIG["show_progress"]:
+                logger.info("✅ 文档已生成", filename=generated.filename, size=len(generated.data))
+            return generated
+
+        # 保存文档：先写临时文件再原子替换，同名文件已存在时使用带版本号的文件名
+        with stage_timer("word", "write"):
+            abs_output_path = generated.save(PATHS["output_folder"])
+        report_progress("saved", filename=os.path.basename(abs_output_path))
+        if LOGGING_CONFIG["show_progress"]:
+            logger.info("✅ 文档已保存", path=abs_output_path)
 
-        # 加载模板
-        doc = DocxTemplate(template_path)
+        return abs_output_path
 
-        # 渲染模板
-        doc.render(context_data)
+    except Exception as e:
+        logger.error("❌ 创建Word文档失败", error=str(e))
+        raise e
 
-        # 保存文档
-        output_path = os.path.join(PATHS["output_folder"], f"{output_filename}.docx")
 
-        # 确保输出目录存在
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+def create_word_document_from_data(
+    parsed_data: Dict[str, Any],
+    custom_filename: Optional[str] = None,
+    in_memory: bool = False,
+) -> Union[str, GeneratedFile]:
+    """
+    根据解析后的AI数据渲染Word文档
+
+    Args:
+        parsed_data (Dict[str, Any]): 解析后的AI生成数据
+        custom_filename (Optional[str]): 自定义文件名
+        in_memory (bool): 为True时保存到内存，不写磁盘
 
-        doc.save(output_path)
-        # 返回绝对路径
-        abs_output_path = os.path.abspath(output_path)
-        print(f"✅ 文档已保存: {abs_output_path}")
+    Returns:
+        Union[str, GeneratedFile]: 生成的文档绝对路径；in_memory 为True时返回内存中的文件
+    """
+    # 准备模板上下文
+    context = prepare_template_context(parsed_data)
 
-        return abs_output_path
+    # 确定输出文件名
+    if custom_filename:
+        filename = custom_filename
+    else:
+        filename = parsed_data.get("filename", context.get("theme", "生成的文档"))
 
-    except Exception as e:
-        print(f"❌ 创建Word文档失败: {e}")
-        raise e
+    # 创建Word文档并返回绝对路径
+    return create_word_document(context, filename, in_memory)
 
 
 def generate_wordDoc_from_user_input(
     learning_content: str,
     user_requirements: Optional[str] = None,
     custom_filename: Optional[str] = None,
-) -> str:
+    use_cache: bool = True,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+    generation_mode: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
     """
     根据用户输入生成Word文档的主函数
 
@@ -203,28 +530,69 @@ def generate_wordDoc_from_user_input(
         learning_content (str): 用户输入内容
         user_requirements (Optional[str]): 用户要求
         custom_filename (Optional[str]): 自定义文件名
+        use_cache (bool): 是否读取LLM响应缓存
+        in_memory (bool): 为True时保存到内存，不写磁盘
+        chinese_variant (Optional[str]): 简繁转换目标（"s2hk" | "s2tw" | "none"），为空时使用配置默认值
+        generation_mode (Optional[str]): 生成模式（"single" | "parallel"），为空时使用 WORD_CONFIG 配置
 
     Returns:
-        str: 生成的文档绝对路径
+        Union[str, GeneratedFile]: 生成的文档绝对路径；in_memory 为True时返回内存中的文件
     """
     try:
+        generation_mode = resolve_word_generation_mode(generation_mode)
+        chinese_variant = resolve_chinese_variant(chinese_variant)
+        # 过长的学习内容先分块摘要，用提要代替原文写入提示词
+        learning_content = digest_content(learning_content, use_cache, "word")
+
         # 1. 生成文档内容
-        parsed_data = generate_document_content(learning_content, user_requirements)
+        if generation_mode == "parallel":
+            parsed_data = generate_document_content_parallel(
+                learning_content, user_requirements, use_cache, chinese_variant
+            )
+        else:
+            parsed_data = generate_document_content(
+                learning_content, user_requirements, use_cache, chinese_variant
+            )
 
-        # 2. 准备模板上下文
-        context = prepare_template_context(parsed_data)
+        # 2. 准备模板上下文并创建Word文档
+        return create_word_document_from_data(parsed_data, custom_filename, in_memory)
 
-        # 3. 确定输出文件名
-        if custom_filename:
-            filename = custom_filename
-        else:
-            filename = parsed_data.get("filename", context.get("theme", "生成的文档"))
+    except Exception as e:
+        logger.error("❌ 生成Word文档失败", error=str(e))
+        raise e
 
-        # 4. 创建Word文档并返回绝对路径
-        output_path = create_word_document(context, filename)
 
-        return output_path
+async def generate_wordDoc_from_user_input_async(
+    learning_content: str,
+    user_requirements: Optional[str] = None,
+    custom_filename: Optional[str] = None,
+    use_cache: bool = True,
+    in_memory: bool = False,
+    chinese_variant: Optional[str] = None,
+    generation_mode: Optional[str] = None,
+) -> Union[str, GeneratedFile]:
+    """
+    generate_wordDoc_from_user_input 的异步版本
+
+    大模型调用直接在事件循环中等待，只有模板渲染放到线程池中执行
+    """
+    try:
+        generation_mode = resolve_word_generation_mode(generation_mode)
+        chinese_variant = resolve_chinese_variant(chinese_variant)
+        # 过长的学习内容先分块摘要，用提要代替原文写入提示词
+        learning_content = await digest_content_async(learning_content, use_cache, "word")
+
+        if generation_mode == "parallel":
+            generate_content = generate_document_content_parallel_async
+        else:
+            generate_content = generate_document_content_async
+        parsed_data = await generate_content(
+            learning_content, user_requirements, use_cache, chinese_variant
+        )
+        return await asyncio.to_thread(
+            create_word_document_from_data, parsed_data, custom_filename, in_memory
+        )
 
     except Exception as e:
-        print(f"❌ 生成Word文档失败: {e}")
+        logger.error("❌ 生成Word文档失败", error=str(e))
         raise e
@@ -1,5 +1,7 @@
 """
 Word文檔生成相關嘅提示詞模板
+固定嘅規則同JSON格式放喺系統提示詞，學習內容同用戶要求只放喺其後嘅用戶提示詞，
+令唔同請求嘅消息開頭完全相同，可以命中模型服務商嘅前綴緩存（prompt caching）
 """
 from typing import Optional
 
@@ -8,10 +10,10 @@ def get_agent_system_prompt() -> str:
     """獲取AI代理嘅系統提示詞"""
     return """你係一個專業嘅教育內容生成助手，擅長根據提供嘅知識內容創建高質量嘅教學材料。"""
 
-def get_word_generation_prompt(learning_content: str, user_requirements: Optional[str] = None) -> str:
-    """獲取Word內容生成嘅提示詞"""
-    return f"""
-請根據用戶嘅需求分析並生成一份教學工作表嘅內容，要求學生掌握嘅內容知識點：{learning_content}
+def get_word_generation_system_prompt() -> str:
+    """獲取Word內容生成嘅系統提示詞（固定嘅規則同JSON格式，唔包含任何用戶輸入）"""
+    return f"""{get_agent_system_prompt()}
+請根據用戶嘅需求分析並生成一份教學工作表嘅內容，用戶會提供要求學生掌握嘅內容知識點同額外需求。
 嚴格根據知識點嘅語言，使用**繁體中文**或**英語**，不要使用**簡體中文**，並且內容要準確、專業、適合教學使用的書面語，唔好口語化。
 要求：
 1. 內容要準確、專業、適合教學使用，唔好口語化，嚴格按照內容知識點內容生成
@@ -25,7 +27,7 @@ def get_word_generation_prompt(learning_content: str, user_requirements: Optiona
 9. 公式使用LaTeX格式，確保數學公式清晰可讀，括號使用雙斜杠（\\\\left( 同 \\\\right) 等）；用戶要求需要有公式考核，因此喺quiz_data或者問題中加入相關LaTeX公式示例（如數學表達或者適配內容嘅相關公式）
 10. 驗證生成嘅JSON是否可解析，避免Invalid \\escape錯誤
 
-請你注意用戶嘅額外需求：{user_requirements}
+請你注意用戶嘅額外需求。
 
 請直接返回JSON格式嘅內容，唔好添加其他說明文字。
 請確保內容專業、準確，並符合教育領域嘅標準。
@@ -89,3 +91,113 @@ def get_word_generation_prompt(learning_content: str, user_requirements: Optiona
     "filename": "建議嘅文件名（唔包含.docx擴展名）"
 }}
 """
+
+
+def get_word_generation_prompt(learning_content: str, user_requirements: Optional[str] = None) -> str:
+    """獲取Word內容生成嘅用戶提示詞（只包含每次請求唔同嘅內容）"""
+    return f"""
+要求學生掌握嘅內容知識點：{learning_content}
+
+用戶嘅額外需求：{user_requirements}
+"""
+
+
+def get_word_summary_system_prompt() -> str:
+    """獲取並行生成模式嘅基本信息同知識點摘要系統提示詞"""
+    return f"""{get_agent_system_prompt()}
+請閱讀用戶提供嘅教學資料，為教學工作表整理基本信息同知識點摘要。
+嚴格根據資料嘅語言，使用**繁體中文**或**英語**，不要使用**簡體中文**，並且內容要準確、專業、適合教學使用的書面語，唔好口語化。
+要求：
+1. 摘要要覆蓋資料入面全部關鍵概念、定義、公式同結論，後續出題同教學建議只會參考呢份摘要
+2. 學習重點要突出關鍵概念
+3. 公式使用LaTeX格式，反斜杠必須使用雙反斜杠（\\\\）表示
+4. 確保JSON格式完整正確，唔好有語法錯誤
+
+請直接返回JSON格式嘅內容，唔好添加其他說明文字，唔好有中文標點符號喺json格式中：
+{{
+    "theme": "文檔主題標題",
+    "topic": "具體主題內容",
+    "learning_focus": "學習重點內容",
+    "learning_outcome": "學習成果描述",
+    "worksheet_title": "工作表標題",
+    "answer": "綜合答案或者總結性內容",
+    "summary": "知識點摘要，逐點列出概念、定義、公式同結論",
+    "filename": "建議嘅文件名（唔包含.docx擴展名）"
+}}
+"""
+
+
+def get_word_summary_prompt(learning_content: str) -> str:
+    """獲取並行生成模式嘅摘要用戶提示詞（只取決於學習內容，唔同要求嘅請求可以共用緩存）"""
+    return f"""
+教學資料：{learning_content}
+"""
+
+
+# 並行生成模式下各組成部分嘅名稱、要求同JSON示例
+_WORD_COMPONENT_SPECS = {
+    "multiple_choice": (
+        "選擇題",
+        "選擇題要有合理嘅選項同正確答案，並必要時根據用戶需求提供多選或者單選；"
+        "題目數量按用戶需求調整，唔使帶編號或者字母；correct 為正確選項嘅序號（由0開始）",
+        """[
+        {"q": "選擇題題目1", "choices": ["選項A", "選項B", "選項C", "選項D"], "correct": [0]},
+        {"q": "選擇題題目2", "choices": ["選項A", "選項B", "選項C", "選項D"], "correct": [1, 2]}
+    ]""",
+    ),
+    "short_answer_questions": (
+        "簡答題",
+        "簡答題嘅答案要點要清晰明確，題目數量按用戶需求調整",
+        """[
+        {"q": "簡答題題目1", "a": ["答案要點1", "答案要點2", "答案要點3"]},
+        {"q": "簡答題題目2", "a": ["答案要點1", "答案要點2"]}
+    ]""",
+    ),
+    "quiz_data": (
+        "學習內容片段",
+        "呢啲內容必須係需要學習掌握嘅知識點內容，直接照搬原文，必要時提供公式同示例",
+        """[
+        "學習內容片段1",
+        "學習內容片段2",
+        "學習內容片段3"
+    ]""",
+    ),
+    "teaching_suggestions": (
+        "教學建議",
+        "教學建議要實用可行，盡量具體，唔好過於籠統同簡潔",
+        """[
+        "教學建議1",
+        "教學建議2",
+        "教學建議3"
+    ]""",
+    ),
+}
+
+
+def get_word_component_system_prompt(component: str) -> str:
+    """獲取並行生成模式下單個組成部分嘅系統提示詞（每個組成部分固定不變）"""
+    name, requirement, example = _WORD_COMPONENT_SPECS[component]
+    return f"""{get_agent_system_prompt()}
+請根據用戶提供嘅知識點為教學工作表生成「{name}」。
+嚴格根據知識點嘅語言，使用**繁體中文**或**英語**，不要使用**簡體中文**，並且內容要準確、專業、適合教學使用的書面語，唔好口語化。
+要求：
+1. {requirement}
+2. 內容要準確、專業，嚴格按照知識點內容生成，所有內容要與用戶需求主題相關
+3. 公式使用LaTeX格式，括號使用雙斜杠（\\\\left( 同 \\\\right) 等）；反斜杠必須使用雙反斜杠（\\\\）表示，避免Invalid \\escape錯誤
+4. 確保JSON格式完整正確，唔好有語法錯誤
+5. 請你注意用戶嘅額外需求
+
+請直接返回JSON格式嘅內容，只包含 {component} 一個字段，唔好添加其他說明文字，唔好有中文標點符號喺json格式中：
+{{
+    "{component}": {example}
+}}
+"""
+
+
+def get_word_component_prompt(reference: str, user_requirements: Optional[str] = None) -> str:
+    """獲取並行生成模式下單個組成部分嘅用戶提示詞；reference 為知識點摘要（quiz_data 為原始學習內容）"""
+    return f"""
+知識點：{reference}
+
+用戶嘅額外需求：{user_requirements}
+"""